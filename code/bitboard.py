@@ -0,0 +1,140 @@
+# bitboard.py
+# BFS song song theo bit: cả bản đồ nằm trong một số nguyên Python, mỗi ô là một bit.
+# Một lớp BFS (frontier) được mở rộng cho toàn bản đồ cùng lúc bằng vài phép dịch bit thay vì lấy từng ô ra khỏi deque.
+import weakref
+from collections import deque
+
+# Thứ tự ô kề giống get_neighbors trong pathfinding_algorithms (thẳng trước, chéo sau)
+NEIGHBOR_OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+class GridBitboard:
+    """
+    Ảnh bit của một NavGrid. Bit của ô (x, y) nằm ở vị trí y * stride + x với stride = width + 1:
+    cột đệm cuối mỗi hàng luôn là 0 trong mặt nạ đi được nên phép dịch trái/phải không tràn sang hàng khác.
+    Mặt nạ được dựng lại khi NavGrid.version thay đổi.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.stride = grid.width + 1
+        self.free = 0  # Mặt nạ các ô đi được
+        self.version = -1
+        self.refresh()
+
+    def refresh(self):
+        grid = self.grid
+        if self.version == grid.version:
+            return
+        width = grid.width
+        stride = self.stride
+        bits = bytearray(b'0' * (stride * grid.height))
+        blocked = grid.blocked
+        for index in range(grid.size):
+            if not blocked[index]:
+                bits[(index // width) * stride + index % width] = ord('1')
+        self.free = int(bits[::-1].decode() or '0', 2)
+        self.version = grid.version
+
+    def bit(self, tile):
+        return 1 << (tile[1] * self.stride + tile[0])
+
+    def dilate(self, mask):
+        """Mọi ô cách mask tối đa một bước (8 hướng), kể cả chính mask. Có thể lẫn bit đệm, người gọi phải & free."""
+        row = mask | (mask << 1) | (mask >> 1)
+        return row | (row << self.stride) | (row >> self.stride)
+
+    def bfs_layers(self, start_tile, goal_bit=0):
+        """
+        Các lớp BFS từ start_tile: layers[k] là mặt nạ các ô cách start đúng k bước.
+        Dừng sớm khi lớp cuối chứa goal_bit. Ô bắt đầu không cần đi được, giống bfs_pathfinding.
+        """
+        self.refresh()
+        free = self.free
+        frontier = self.bit(start_tile)
+        visited = frontier
+        layers = [frontier]
+        while not frontier & goal_bit:
+            frontier = self.dilate(frontier) & free & ~visited
+            if not frontier:
+                break
+            visited |= frontier
+            layers.append(frontier)
+        return layers
+
+    def reachable_mask(self, start_tile):
+        """Mặt nạ mọi ô đi tới được từ start_tile (gồm cả start_tile)."""
+        self.refresh()
+        free = self.free
+        visited = self.bit(start_tile)
+        while True:
+            grown = self.dilate(visited) & free | visited
+            if grown == visited:
+                return visited
+            visited = grown
+
+    def shortest_path(self, start_tile, goal_tile, stats=None):
+        """
+        Đường đi ít bước nhất (deque, gồm ô bắt đầu) hoặc None. Hai ô phải nằm trong bản đồ.
+        stats (SearchStats): mỗi ô trong các lớp BFS tính là một lần mở rộng, lớp lớn nhất là tập mở lớn nhất,
+        số ô kề sinh ra là số ô mới của các lớp sau lớp đầu.
+        """
+        search_steps = self.shortest_path_steps(start_tile, goal_tile, stats)
+        while True:
+            try:
+                next(search_steps)
+            except StopIteration as finished:
+                return finished.value
+
+    def shortest_path_steps(self, start_tile, goal_tile, stats=None):
+        """Generator của shortest_path: yield sau mỗi lớp BFS, để PathJob chạy dần qua nhiều frame."""
+        if start_tile == goal_tile:
+            return deque([start_tile])
+        self.refresh()
+        free = self.free
+        goal_bit = self.bit(goal_tile)
+        frontier = self.bit(start_tile)
+        visited = frontier
+        layers = [frontier]
+        if stats is not None:
+            stats.expansions += 1
+            stats.peak_open = max(stats.peak_open, 1)
+        while not frontier & goal_bit:
+            frontier = self.dilate(frontier) & free & ~visited
+            if not frontier:
+                break
+            visited |= frontier
+            layers.append(frontier)
+            if stats is not None:
+                layer_size = bin(frontier).count('1')
+                stats.expansions += layer_size
+                stats.neighbors += layer_size
+                stats.peak_open = max(stats.peak_open, layer_size)
+            yield
+        if not layers[-1] & goal_bit:
+            return None
+        # Đi ngược từ đích: ở mỗi lớp chọn một ô kề thuộc lớp trước
+        grid = self.grid
+        stride = self.stride
+        path = deque([goal_tile])
+        x, y = goal_tile
+        for layer in reversed(layers[:-1]):
+            for dx, dy in NEIGHBOR_OFFSETS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < grid.width and 0 <= ny < grid.height and (layer >> (ny * stride + nx)) & 1:
+                    x, y = nx, ny
+                    break
+            path.appendleft((x, y))
+        return path
+
+
+_BITBOARDS = weakref.WeakKeyDictionary()
+
+
+def get_bitboard(grid):
+    """Bitboard dùng chung cho một NavGrid; tạo lần đầu khi cần."""
+    bitboard = _BITBOARDS.get(grid)
+    if bitboard is None:
+        bitboard = GridBitboard(grid)
+        _BITBOARDS[grid] = bitboard
+    return bitboard
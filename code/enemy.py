@@ -7,13 +7,22 @@ from pygame.math import Vector2
 from settings import *
 from entity import Entity
 from support import *
+from nav_grid import NavGrid
+from spatial_index import SpatialGrid
+from path_jobs import PathJob
 # --- THAY ĐỔI: Import các thuật toán từ pathfinding_algorithms.py ---
+# Lấy hàm qua PATHFINDING_ALGORITHMS để dùng chung bộ đệm đường đi (PATH_CACHE)
 from pathfinding_algorithms import (
-    a_star_pathfinding,
-    bfs_pathfinding as bfs_pathfinding_external,  # Sử dụng alias để tránh nhầm lẫn
-    ucs_pathfinding as ucs_pathfinding_external,  # Sử dụng alias
-    heuristic_diagonal  # Import heuristic để dùng cho A*
+    PATHFINDING_ALGORITHMS,
+    RESUMABLE_SEARCHES,
+    is_reachable,  # Kiểm tra liên thông bằng bitboard, bỏ qua các lần tìm chắc chắn thất bại
+    heuristic_diagonal,  # Import heuristic để dùng cho A*
+    SearchStats
 )
+from pathfinding_profiler import PATHFINDING_PROFILER
+
+# Các thuật toán trong registry cần truyền heuristic
+HEURISTIC_ALGORITHM_NAMES = ['A*', 'A* (Array)', 'JPS']
 
 
 class Enemy(Entity):
@@ -99,18 +108,21 @@ class Enemy(Entity):
 
         # --- THAY ĐỔI: Gán thuật toán tìm đường ---
         self.pathfinding_algorithm = None
+        self.pathfinding_algorithm_name = None
         # Gán hàm heuristic cho A* (nếu dùng A*)
         self.heuristic_func_for_a_star = heuristic_diagonal  # Sử dụng heuristic đã import
 
         if self.monster_name in ['bamboo', 'squid', 'spirit']:
-            self.pathfinding_algorithm = bfs_pathfinding_external
+            self.pathfinding_algorithm_name = 'BFS'
         elif self.monster_name in ['Minotaur_1', 'Minotaur_2', 'Minotaur_3', 'raccoon']:
-            self.pathfinding_algorithm = ucs_pathfinding_external
-        else:  # Các loại quái còn lại
-            self.pathfinding_algorithm = a_star_pathfinding
+            self.pathfinding_algorithm_name = 'UCS (Array)'  # A*/UCS dùng mảng phẳng, nhẹ hơn khi nhiều quái cùng đuổi
+        else:  # Các loại quái còn lại (trước đây dùng A*)
+            self.pathfinding_algorithm_name = 'JPS'  # JPS: cùng độ dài đường với A* nhưng mở rộng ít nút hơn
+        self.pathfinding_algorithm = PATHFINDING_ALGORITHMS[self.pathfinding_algorithm_name]
 
         self.path = deque()
         self.next_step = None
+        self.path_request = None  # PathRequest của PathService hoặc PathJob đang chạy dở (khi không dùng flow field)
         self.last_path_time = 0
         self.path_cooldown = 180  # Giảm cooldown một chút để phản ứng nhanh hơn
         self.path_cooldown_far = 500
@@ -125,20 +137,15 @@ class Enemy(Entity):
         self.separation_radius_sq = self.separation_radius ** 2
         self.separation_strength = 0.8
 
-        self.obstacle_tiles_cache = set()
-        if self.obstacle_sprites:
-            for sprite in self.obstacle_sprites:
-                if hasattr(sprite, 'rect') and hasattr(sprite, 'hitbox') and \
-                        hasattr(sprite.hitbox, 'width') and hasattr(sprite.hitbox, 'height') and \
-                        sprite.hitbox.width > 0 and sprite.hitbox.height > 0 and \
-                        getattr(sprite, 'sprite_type', '') != 'grass':
-                    start_col = sprite.hitbox.left // TILESIZE
-                    end_col = (sprite.hitbox.right - 1) // TILESIZE
-                    start_row = sprite.hitbox.top // TILESIZE
-                    end_row = (sprite.hitbox.bottom - 1) // TILESIZE
-                    for col in range(start_col, end_col + 1):
-                        for row in range(start_row, end_row + 1):
-                            self.obstacle_tiles_cache.add((col, row))
+        # --- Dùng chung lưới đi được của Level thay vì tự dựng tập ô vật cản cho từng quái ---
+        self.nav_grid = getattr(level_instance_ref, 'nav_grid', None)
+        if self.nav_grid is None:
+            self.nav_grid = NavGrid.from_obstacle_sprites(self.obstacle_sprites)
+
+        # Vào nhóm EnemyBatch của Level sau khi đã có đủ thuộc tính: nhóm cấp cho quái một hàng trong các mảng
+        self.enemy_batch = getattr(level_instance_ref, 'enemy_batch', None)
+        if self.enemy_batch is not None:
+            self.add(self.enemy_batch)
 
     def import_graphics(self, name):
         self.animations = {'idle': [], 'move': [], 'attack': []}
@@ -187,9 +194,21 @@ class Enemy(Entity):
         center = pixel_coords if pixel_coords else self.hitbox.center
         return (int(center[0] // TILESIZE), int(center[1] // TILESIZE)) if TILESIZE > 0 else (0, 0)
 
+    def get_enemy_batch(self):
+        """EnemyBatch của Level nếu nó đang di chuyển/tách bầy quái này theo lô, ngược lại None."""
+        enemy_batch = self.enemy_batch
+        if enemy_batch is not None and enemy_batch.handles(self):
+            return enemy_batch
+        return None
+
     def get_player_distance_direction(self, player):
         if not player or not hasattr(player, 'hitbox') or not hasattr(self, 'hitbox'):
             return (float('inf'), Vector2(0, 0))
+        enemy_batch = self.get_enemy_batch()
+        if enemy_batch is not None:  # Đã tính sẵn cho cả đàn trong frame này (chế độ theo lô)
+            batched = enemy_batch.player_distance_direction(self, player)
+            if batched is not None:
+                return batched
         try:
             enemy_vec = Vector2(self.hitbox.center)
             player_vec = Vector2(player.hitbox.center)
@@ -207,11 +226,73 @@ class Enemy(Entity):
     #         return float('inf')
 
     def is_walkable(self, tile_coords):
-        if not isinstance(tile_coords, tuple) or len(tile_coords) != 2:
-            return False
-        if tile_coords in self.obstacle_tiles_cache:
-            return False
-        return True
+        return self.nav_grid.is_walkable(tile_coords)
+
+    def get_flow_field(self):
+        """
+        Flow field dùng chung của Level hướng về ô của người chơi. Chỉ dùng ở chế độ hung hãn, khi mọi quái cùng đuổi
+        (trừ các loại trong ENEMY_FLOW_FIELD_EXCEPTIONS); ở chế độ thường trả về None để quái tự tìm đường.
+        """
+        level = self.level_ref
+        if level is None or not level.enemy_aggression_mode_enabled or self.monster_name in ENEMY_FLOW_FIELD_EXCEPTIONS:
+            return None
+        return getattr(level, 'flow_field', None)
+
+    def get_path_service(self):
+        """PathService của Level nếu đang chạy process pool, ngược lại None (tìm đường ngay trên luồng chính)."""
+        service = getattr(self.level_ref, 'path_service', None)
+        if service is not None and service.active and service.supports(self.pathfinding_algorithm_name):
+            return service
+        return None
+
+    def uses_path_jobs(self):
+        """Tìm đường không chặn frame: qua PathService nếu đang chạy, không thì PathJob chạy dần trên luồng chính."""
+        return self.get_path_service() is not None or self.pathfinding_algorithm_name in RESUMABLE_SEARCHES
+
+    def request_path(self, start_tile, goal_tile, current_time):
+        """
+        Gửi yêu cầu mới cho PathService, hoặc tạo PathJob nếu service không chạy; quái vẫn đi theo đường cũ
+        cho tới khi có kết quả.
+        """
+        self.recalculation_needed = False
+        self.last_path_time = current_time
+        if self.path_request is not None:
+            if self.path_request.goal == goal_tile:
+                return  # Yêu cầu tới cùng ô đích vẫn đang chạy
+            self.path_request.cancel()
+            self.path_request = None
+        if not (self.is_walkable(goal_tile) and is_reachable(start_tile, goal_tile, self.nav_grid)):
+            self.path.clear()
+            self.next_step = None
+            self.direction = Vector2()
+            return
+        heuristic_func = self.heuristic_func_for_a_star \
+            if self.pathfinding_algorithm_name in HEURISTIC_ALGORITHM_NAMES else None
+        path_service = self.get_path_service()
+        if path_service is not None:
+            self.path_request = path_service.request(self.pathfinding_algorithm_name, start_tile, goal_tile,
+                                                     heuristic_func)
+        else:
+            self.path_request = PathJob(self.pathfinding_algorithm_name, start_tile, goal_tile, self.nav_grid,
+                                        heuristic_func)
+
+    def apply_path_request(self):
+        """Thay đường cũ bằng kết quả của path_request (bỏ các ô đã đi qua)."""
+        calculated_path = self.path_request.result
+        PATHFINDING_PROFILER.record(self.monster_name, self.path_request.algo_name, self.path_request.stats)
+        self.path_request = None
+        self.path.clear()
+        self.next_step = None
+        if calculated_path:
+            current_tile = self.get_tile_coords()
+            if current_tile in calculated_path:
+                while calculated_path[0] != current_tile:
+                    calculated_path.popleft()
+                calculated_path.popleft()
+            self.path = calculated_path
+            self.next_step = self.path.popleft() if self.path else None
+        if not self.next_step:
+            self.direction = Vector2()
 
     # --- THAY ĐỔI: Loại bỏ các hàm rtaa_star, bfs_pathfinding, hill_climbing định nghĩa trong lớp Enemy ---
 
@@ -220,9 +301,7 @@ class Enemy(Entity):
             return True
         player_hitbox = player.hitbox
         player_tile = self.get_tile_coords(player_hitbox.center)
-        if player_tile in self.obstacle_tiles_cache:
-            return True
-        return False
+        return self.nav_grid.is_blocked(player_tile)
 
     def get_status(self, player):
         if not player:
@@ -315,12 +394,22 @@ class Enemy(Entity):
             distance_to_player, _ = self.get_player_distance_direction(player)
             current_path_cooldown = self.path_cooldown_far if distance_to_player > self.notice_radius * 0.8 else self.path_cooldown
 
-            needs_recalc_now = can_calculate_path_this_frame and (
+            # Flow field trả lời trong O(1) nên không cần chờ lượt round-robin của Level
+            flow_field = self.get_flow_field()
+            needs_recalc_now = (can_calculate_path_this_frame or flow_field is not None) and (
                     self.recalculation_needed or
                     (current_time - self.last_path_time >= current_path_cooldown) or
                     (not self.next_step and not self.path and self.pathfinding_algorithm)
             )
 
+            if needs_recalc_now and flow_field is None and self.uses_path_jobs() and \
+                    not self.check_player_on_obstacle(player):
+                needs_recalc_now = False
+                self.request_path(self.get_tile_coords(), self.get_tile_coords(player.hitbox.center), current_time)
+            # PathJob chạy tiếp một phần mỗi frame; PathRequest của PathService chỉ báo đã xong hay chưa
+            if self.path_request is not None and self.path_request.advance():
+                self.apply_path_request()
+
             if needs_recalc_now:
                 player_on_obstacle = self.check_player_on_obstacle(player)
                 if not player_on_obstacle:
@@ -332,20 +421,27 @@ class Enemy(Entity):
                     self.next_step = None
                     calculated_path = None  # --- THAY ĐỔI: Tên biến ---
 
-                    if self.is_walkable(goal_tile) and self.pathfinding_algorithm:
+                    if flow_field is not None:
+                        if self.is_walkable(goal_tile):
+                            self.next_step = flow_field.next_tile(start_tile)
+                    elif self.is_walkable(goal_tile) and self.pathfinding_algorithm and \
+                            is_reachable(start_tile, goal_tile, self.nav_grid):
+                        search_stats = SearchStats()
                         try:  # --- THÊM: Khối try-except để bắt lỗi tiềm ẩn ---
-                            if self.pathfinding_algorithm == a_star_pathfinding:
+                            if self.pathfinding_algorithm_name in HEURISTIC_ALGORITHM_NAMES:
                                 calculated_path = self.pathfinding_algorithm(
-                                    start_tile, goal_tile, self.is_walkable, self.heuristic_func_for_a_star
+                                    start_tile, goal_tile, self.nav_grid, self.heuristic_func_for_a_star,
+                                    stats=search_stats
                                 )
-                            elif self.pathfinding_algorithm in [bfs_pathfinding_external, ucs_pathfinding_external]:
+                            else:
                                 calculated_path = self.pathfinding_algorithm(
-                                    start_tile, goal_tile, self.is_walkable
+                                    start_tile, goal_tile, self.nav_grid, stats=search_stats
                                 )
                         except Exception as e:
                             print(
                                 f"Lỗi khi chạy thuật toán {self.pathfinding_algorithm.__name__} cho {self.monster_name}: {e}")
                             calculated_path = None
+                        PATHFINDING_PROFILER.record(self.monster_name, self.pathfinding_algorithm_name, search_stats)
 
                     # --- THAY ĐỔI: Xử lý calculated_path ---
                     if calculated_path and isinstance(calculated_path, deque):
@@ -375,8 +471,14 @@ class Enemy(Entity):
                 if distance_to_step_sq < close_enough_sq:
                     self.hitbox.center = target_pos
                     self.rect.center = self.hitbox.center
+                    enemy_batch = self.get_enemy_batch()
+                    if enemy_batch is not None:
+                        enemy_batch.moved(self)
                     if self.path:
                         self.next_step = self.path.popleft()
+                    elif flow_field is not None:
+                        self.next_step = flow_field.next_tile(self.next_step)
+                        self.recalculation_needed = self.next_step is None
                     else:
                         self.next_step = None
                         self.recalculation_needed = True
@@ -408,28 +510,34 @@ class Enemy(Entity):
     def apply_steering(self, all_enemies):
         if not self.apply_separation or self.is_stuck or not self.vulnerable:
             return Vector2(0, 0)
-        separation_vector = Vector2()
+        separation_x = separation_y = 0.0
         neighbor_count = 0
-        current_center = Vector2(self.hitbox.center)
+        center_x, center_y = self.hitbox.center
+        effective_separation_radius = max(self.hitbox.width, self.hitbox.height) * 1.2
+        effective_separation_radius_sq = effective_separation_radius ** 2
+        # SpatialGrid (Level dựng mỗi frame) chỉ trả về quái ở các ô lân cận thay vì toàn bộ danh sách
+        if isinstance(all_enemies, SpatialGrid):
+            all_enemies = all_enemies.query_radius((center_x, center_y), effective_separation_radius)
         for other_enemy in all_enemies:
             if other_enemy is self or not hasattr(other_enemy, 'hitbox') or \
                     (hasattr(other_enemy,
                              'monster_name') and other_enemy.monster_name != self.monster_name):
                 continue
 
-            other_center = Vector2(other_enemy.hitbox.center)
-            dist_sq = current_center.distance_squared_to(other_center)
-            effective_separation_radius_sq = (max(self.hitbox.width, self.hitbox.height) * 1.2) ** 2
+            other_x, other_y = other_enemy.hitbox.center
+            away_x = center_x - other_x
+            away_y = center_y - other_y
+            dist_sq = away_x * away_x + away_y * away_y
 
             if 0 < dist_sq < effective_separation_radius_sq:
-                away_vec = current_center - other_center
-                strength = 1.0 / (dist_sq + 0.0001)
-                separation_vector += away_vec.normalize() * strength
+                strength = 1.0 / (dist_sq + 0.0001) / math.sqrt(dist_sq)  # away_vec.normalize() * strength
+                separation_x += away_x * strength
+                separation_y += away_y * strength
                 neighbor_count += 1
 
         final_steering = Vector2()
         if neighbor_count > 0:
-            separation_vector /= neighbor_count
+            separation_vector = Vector2(separation_x / neighbor_count, separation_y / neighbor_count)
             if separation_vector.length_squared() > 0:
                 final_steering = separation_vector.normalize() * self.separation_strength
         return final_steering
@@ -524,6 +632,9 @@ class Enemy(Entity):
             self.frame_index = 0
             self.is_stuck = False
             self.last_pos_stuck_check = None
+            enemy_batch = self.get_enemy_batch()
+            if enemy_batch is not None:
+                enemy_batch.record(self)
 
     def check_death(self):
         if self.health <= 0:
@@ -541,7 +652,12 @@ class Enemy(Entity):
     def update(self):
         if self.check_death():
             return
+        if self.get_enemy_batch() is None:  # Chế độ theo lô: Level đã gọi EnemyBatch.move() cho cả đàn
+            self.check_stuck_and_move()
+        self.animate()
+        self.cooldowns()
 
+    def check_stuck_and_move(self):
         current_time_update = pygame.time.get_ticks()
         if current_time_update - self.last_stuck_check_time > self.stuck_check_interval:
             self.last_stuck_check_time = current_time_update
@@ -592,14 +708,15 @@ class Enemy(Entity):
         if effective_direction.length_squared() > 0.01 and current_move_speed > 0:
             self.move(current_move_speed)  # Entity.move sẽ dùng self.direction đã được cập nhật
 
-        self.animate()
-        self.cooldowns()
-
     def enemy_update(self, player, all_npcs, all_enemies_for_separation, can_calculate_path_this_frame):
         if self.vulnerable and not self.is_stuck:
             self.get_status(player)
             self.actions(player, can_calculate_path_this_frame)
 
+        enemy_batch = self.get_enemy_batch()
+        if enemy_batch is not None:  # Tách bầy và trộn hướng cho cả đàn ở EnemyBatch.steer()
+            enemy_batch.record(self)
+            return
         final_move_direction = self.direction.copy()
         if self.vulnerable and not self.is_stuck and \
                 not (self.status.startswith('attack') or self.status.startswith('idle')):
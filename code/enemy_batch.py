@@ -0,0 +1,442 @@
+# enemy_batch.py
+# Chế độ cập nhật quái theo lô (cần NumPy): vị trí, kích thước, tốc độ và trạng thái di chuyển của mọi quái nằm trong
+# các mảng (structure of arrays) suốt màn chơi. Hướng đi (trộn lực tách bầy), kiểm tra kẹt và di chuyển của cả đàn
+# được tính bằng vài phép toán mảng rồi ghi lại vào sprite trong một vòng.
+# Không có NumPy hoặc tắt trong settings thì Enemy tự tính từng con như cũ.
+import math
+
+import pygame
+from pygame.math import Vector2
+
+from settings import ENEMY_BATCH_ENABLED
+
+try:
+    import numpy as np
+except ImportError:  # NumPy là phụ thuộc tuỳ chọn
+    np = None
+
+# 3x3 ô lân cận: ô lưới có cạnh >= bán kính tách bầy lớn nhất nên mọi hàng xóm đều nằm trong đó
+NEIGHBOR_CELL_OFFSETS = tuple((d_col, d_row) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1))
+MIN_MOVE_DIRECTION_SQ = 0.01  # Giống Enemy.update: hướng ngắn hơn thì đứng yên
+DENSE_SEPARATION_MAX = 96  # Tới chừng này quái thì xét mọi cặp (ma trận n x n) nhanh hơn lấy cặp qua lưới
+
+# Các mảng của một hàng: (tên, số cột - 0 là mảng một chiều, kiểu)
+ROW_ARRAYS = (
+    ('positions', 2, 'float64'),  # Góc trên-trái hitbox (x, y)
+    ('sizes', 2, 'float64'),  # Chiều rộng, chiều cao hitbox
+    ('half_sizes', 2, 'float64'),  # sizes // 2: tâm = góc trên-trái + half_sizes, giống pygame.Rect.center
+    ('directions', 2, 'float64'),  # Enemy.direction
+    ('last_check_positions', 2, 'float64'),  # Tâm hitbox ở lần kiểm tra kẹt trước (last_pos_stuck_check)
+    ('speeds', 0, 'float64'),
+    ('resistances', 0, 'float64'),
+    ('strengths', 0, 'float64'),  # separation_strength, 0 nếu apply_separation tắt
+    ('stuck_thresholds_sq', 0, 'float64'),
+    ('stuck_intervals', 0, 'float64'),
+    ('last_check_times', 0, 'float64'),
+    ('type_codes', 0, 'int64'),  # Mã monster_name: chỉ tách bầy giữa quái cùng loại
+    ('used', 0, 'bool'),  # Hàng đang thuộc về một quái
+    ('alive', 0, 'bool'),  # health > 0 (quái hết máu bị kill() ở Enemy.update, không di chuyển nữa)
+    ('vulnerable', 0, 'bool'),
+    ('stuck', 0, 'bool'),  # is_stuck
+    ('moving', 0, 'bool'),  # Trạng thái không phải attack/idle: Enemy.update cho đi với speed
+    ('trying', 0, 'bool'),  # Trạng thái move/right/left: được tính là đang cố đi khi kiểm tra kẹt
+    ('has_goal', 0, 'bool'),  # Có next_step hoặc đang chờ tìm đường lại
+    ('has_last_check', 0, 'bool'),
+    ('steers', 0, 'bool'),  # Được trộn lực tách bầy ở steer() (giống điều kiện trong Enemy.enemy_update)
+)
+
+
+class EnemyBatch(pygame.sprite.Group):
+    """
+    Nhóm sprite giữ một hàng mảng cho mỗi quái trong suốt màn chơi: hàng được cấp khi quái vào nhóm (cuối
+    Enemy.__init__) và trả lại khi quái bị kill(). Vị trí trong mảng chỉ đổi khi quái di chuyển: move() tự cập nhật,
+    chỗ khác dời hitbox (Enemy.actions khi tới ô kế tiếp) gọi moved(). Trạng thái do logic Python quyết định được ghi
+    vào hàng bằng record(): cuối Enemy.enemy_update và khi quái trúng đòn.
+    Mỗi frame Level gọi:
+      move()    - trước visible_sprites.update(): kiểm tra kẹt và di chuyển cả đàn (phần đầu Enemy.update);
+      prepare() - trước vòng enemy_update: khoảng cách/hướng tới người chơi cho get_player_distance_direction();
+      steer()   - sau vòng enemy_update: trộn hướng đi với lực tách bầy (thay cho Enemy.apply_steering).
+    Từ steer() tới move() hướng đi đúng nằm trong mảng; move() ghi hướng và vị trí mới vào sprite.
+    """
+
+    def __init__(self, *sprites, enabled=ENEMY_BATCH_ENABLED, capacity=64):
+        self.enabled = enabled and np is not None
+        self.rows = {}  # Enemy -> hàng
+        self.row_enemies = []  # Hàng -> Enemy (None nếu hàng trống)
+        self.free_rows = []
+        self.capacity = 0
+        self.type_ids = {}  # monster_name -> mã loại
+        self.player = None
+        self.player_center = None
+        self.prepared_centers = None  # Tâm hitbox lúc prepare(), để biết kết quả còn đúng không
+        self.player_distances = None
+        self.player_directions = None  # Vectơ đơn vị tới người chơi ([0, 0] nếu trùng vị trí)
+        self.obstacle_token = None  # (id nhóm vật cản, version) lúc dựng bảng phủ vật cản
+        self.obstacle_xs = None  # Toạ độ x/y các cạnh hitbox vật cản (đã sắp xếp, không trùng)
+        self.obstacle_ys = None
+        self.obstacle_sums = None  # Tổng cộng dồn 2D của các ô nén bị vật cản phủ: đếm trong một khung = 4 phép tra
+        if self.enabled:
+            self.random = np.random.default_rng()
+            self._grow(capacity)
+        super().__init__(*sprites)
+
+    def _grow(self, capacity):
+        for name, columns, dtype in ROW_ARRAYS:
+            array = np.zeros((capacity, columns) if columns else capacity, dtype=dtype)
+            if self.capacity:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.free_rows.extend(range(capacity - 1, self.capacity - 1, -1))  # pop() lấy hàng nhỏ nhất trước
+        self.row_enemies.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    # --- THÊM / GỠ QUÁI ---
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        if not self.enabled or sprite in self.rows:
+            return
+        if not self.free_rows:
+            self._grow(self.capacity * 2)
+        row = self.free_rows.pop()
+        self.rows[sprite] = row
+        self.row_enemies[row] = sprite
+        self.positions[row] = sprite.hitbox.topleft
+        self.sizes[row] = sprite.hitbox.size
+        self.half_sizes[row] = (sprite.hitbox.width // 2, sprite.hitbox.height // 2)
+        self.speeds[row] = sprite.speed
+        self.resistances[row] = sprite.resistance
+        self.stuck_thresholds_sq[row] = sprite.stuck_move_threshold_sq
+        self.stuck_intervals[row] = sprite.stuck_check_interval
+        self.last_check_times[row] = sprite.last_stuck_check_time
+        if sprite.last_pos_stuck_check is not None:
+            self.last_check_positions[row] = sprite.last_pos_stuck_check
+        self.type_codes[row] = self.type_ids.setdefault(sprite.monster_name, len(self.type_ids))
+        self.used[row] = True
+        self.record(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        row = self.rows.pop(sprite, None)
+        if row is None:
+            return
+        self.used[row] = False
+        self.alive[row] = False
+        self.row_enemies[row] = None
+        self.free_rows.append(row)
+
+    def disable(self):
+        """Thôi tính theo lô, mọi quái tự tính từng con. Chỉ gọi lúc tải màn (trước frame đầu tiên)."""
+        self.enabled = False
+        self.empty()
+
+    def handles(self, enemy):
+        """Quái này có được di chuyển/tách bầy theo lô không (nếu không, Enemy tự làm như cũ)."""
+        return enemy in self.rows
+
+    def moved(self, enemy):
+        """Hitbox của quái bị dời ngoài move() (ví dụ bám vào tâm ô kế tiếp)."""
+        row = self.rows.get(enemy)
+        if row is not None:
+            self.positions[row] = enemy.hitbox.topleft
+
+    def record(self, enemy, with_direction=True):
+        """
+        Chép trạng thái Python của quái vào hàng của nó. with_direction=False giữ hướng đã có trong mảng (dùng khi chỉ
+        máu/vulnerable đổi sau steer(), lúc Enemy.direction chưa được ghi lại).
+        """
+        row = self.rows.get(enemy)
+        if row is None:
+            return
+        if with_direction:
+            direction = enemy.direction
+            self.directions[row] = (direction.x, direction.y)
+        status = enemy.status
+        moving = not (status.startswith('attack') or status.startswith('idle'))
+        self.moving[row] = moving
+        self.trying[row] = status.startswith(('move', 'right', 'left'))
+        self.vulnerable[row] = enemy.vulnerable
+        self.stuck[row] = enemy.is_stuck
+        self.alive[row] = enemy.health > 0
+        self.has_goal[row] = bool(enemy.next_step or enemy.recalculation_needed)
+        self.has_last_check[row] = enemy.last_pos_stuck_check is not None
+        self.steers[row] = moving and enemy.vulnerable and not enemy.is_stuck
+        self.strengths[row] = enemy.separation_strength if enemy.apply_separation else 0.0
+
+    def _centers(self):
+        return self.positions + self.half_sizes
+
+    # --- KHOẢNG CÁCH TỚI NGƯỜI CHƠI ---
+    def prepare(self, player):
+        """Khoảng cách và hướng từ mọi quái tới người chơi, dùng trong vòng enemy_update của frame này."""
+        self.player = player
+        self.player_distances = None
+        if not self.rows or player is None or not hasattr(player, 'hitbox'):
+            return
+        centers = self._centers()
+        self.player_center = player.hitbox.center
+        offsets = np.asarray(self.player_center, dtype=float) - centers
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        safe = np.where(distances > 0, distances, 1.0)
+        # Kết quả được đổi sang list Python một lần: tra từng phần tử của list nhanh hơn nhiều so với mảng NumPy
+        self.prepared_centers = centers.tolist()
+        self.player_distances = distances.tolist()
+        self.player_directions = np.where((distances > 0)[:, None], offsets / safe[:, None], 0.0).tolist()
+
+    def player_distance_direction(self, enemy, player):
+        """(khoảng cách, hướng) đã tính ở prepare(), hoặc None nếu quái/người chơi đã di chuyển từ lúc đó."""
+        if player is not self.player or self.player_distances is None or \
+                player.hitbox.center != self.player_center:
+            return None
+        row = self.rows.get(enemy)
+        if row is None or tuple(self.prepared_centers[row]) != enemy.hitbox.center:
+            return None
+        return self.player_distances[row], Vector2(self.player_directions[row])
+
+    # --- HƯỚNG ĐI ---
+    def steer(self):
+        """
+        Trộn hướng đi của mọi quái đang đuổi với lực tách bầy, cùng công thức với Enemy.enemy_update:
+        chuẩn hoá(hướng) * 0.7 + lực * 0.3 rồi chuẩn hoá; không có hướng thì đi theo lực tách bầy.
+        """
+        if not self.rows:
+            return
+        rows = np.flatnonzero(self.used)
+        steering = self.steers[rows]
+        if not steering.any():
+            return
+        forces = self.compute_separation(self._centers()[rows], self.sizes[rows].max(axis=1) * 1.2,
+                                         self.strengths[rows], self.type_codes[rows])
+        directions = self.directions[rows]
+        x = directions[:, 0]
+        y = directions[:, 1]
+        force_x = forces[:, 0]
+        force_y = forces[:, 1]
+        lengths = np.sqrt(x * x + y * y)
+        has_direction = lengths > 0
+        safe_lengths = np.where(has_direction, lengths, 1.0)
+        combined_x = x / safe_lengths * 0.7 + force_x * 0.3  # direction.normalize() * 0.7 + steering_force * 0.3
+        combined_y = y / safe_lengths * 0.7 + force_y * 0.3
+        combined_lengths = np.sqrt(combined_x * combined_x + combined_y * combined_y)
+        force_lengths = np.sqrt(force_x * force_x + force_y * force_y)
+        use_combined = steering & has_direction & (combined_lengths > 0)
+        use_force = steering & ~has_direction & (force_lengths > 0)
+        combined_lengths[~use_combined] = 1.0
+        force_lengths[~use_force] = 1.0
+        x[use_combined] = (combined_x / combined_lengths)[use_combined]
+        y[use_combined] = (combined_y / combined_lengths)[use_combined]
+        x[use_force] = (force_x / force_lengths)[use_force]
+        y[use_force] = (force_y / force_lengths)[use_force]
+        self.directions[rows] = directions
+
+    @staticmethod
+    def compute_separation(centers, radii, strengths, type_codes):
+        """
+        Lực tách bầy của mọi quái, cùng công thức với Enemy.apply_steering: chỉ tính giữa quái cùng loại,
+        0 < khoảng cách < bán kính của quái đang xét, trọng số 1 / khoảng cách^2, lấy trung bình rồi chuẩn hoá.
+        Đàn nhỏ xét mọi cặp trong một ma trận; đàn lớn lấy cặp ứng viên từ lưới đều (sắp xếp theo ô + searchsorted).
+        """
+        count = len(centers)
+        if count <= DENSE_SEPARATION_MAX:
+            neighbor_counts, sums = EnemyBatch._dense_separation_sums(centers, radii, type_codes)
+        else:
+            neighbor_counts, sums = EnemyBatch._grid_separation_sums(centers, radii, type_codes)
+        forces = np.zeros((count, 2))
+        averages = sums / np.maximum(neighbor_counts, 1)[:, None]
+        lengths = np.hypot(averages[:, 0], averages[:, 1])
+        has_force = (neighbor_counts > 0) & (lengths > 0)
+        forces[has_force] = averages[has_force] / lengths[has_force][:, None] * strengths[has_force][:, None]
+        return forces
+
+    @staticmethod
+    def _dense_separation_sums(centers, radii, type_codes):
+        """(số hàng xóm, tổng away.normalize() / khoảng cách^2) của mỗi quái, xét mọi cặp."""
+        xs = centers[:, 0]
+        ys = centers[:, 1]
+        away_x = xs[:, None] - xs  # Hàng i: vectơ từ mọi quái tới quái i
+        away_y = ys[:, None] - ys
+        dist_sq = away_x * away_x + away_y * away_y
+        keep = (type_codes[:, None] == type_codes) & (dist_sq > 0) & (dist_sq < (radii * radii)[:, None])
+        safe = np.where(keep, dist_sq, 1.0)
+        weights = 1.0 / (safe + 0.0001) / np.sqrt(safe) * keep
+        return keep.sum(axis=1), np.stack([(away_x * weights).sum(axis=1), (away_y * weights).sum(axis=1)], axis=1)
+
+    @staticmethod
+    def _grid_separation_sums(centers, radii, type_codes):
+        """Như _dense_separation_sums nhưng chỉ xét các cặp ở 3x3 ô lưới lân cận."""
+        count = len(centers)
+        cell_size = max(float(radii.max()), 1.0)
+        cells = np.floor(centers / cell_size).astype(np.int64)
+        cells -= cells.min(axis=0) - 1  # Chừa một ô đệm để ô lân cận không âm
+        columns = int(cells[:, 0].max()) + 2
+        keys = cells[:, 1] * columns + cells[:, 0]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        pair_self = []
+        pair_other = []
+        for d_col, d_row in NEIGHBOR_CELL_OFFSETS:
+            neighbor_keys = keys + d_row * columns + d_col
+            starts = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+            counts = np.searchsorted(sorted_keys, neighbor_keys, side='right') - starts
+            total = int(counts.sum())
+            if not total:
+                continue
+            owners = np.repeat(np.arange(count), counts)
+            offsets_in_cell = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_self.append(owners)
+            pair_other.append(order[np.repeat(starts, counts) + offsets_in_cell])
+        if not pair_self:
+            return np.zeros(count, dtype=np.int64), np.zeros((count, 2))
+        pair_self = np.concatenate(pair_self)
+        pair_other = np.concatenate(pair_other)
+
+        away = centers[pair_self] - centers[pair_other]
+        dist_sq = away[:, 0] ** 2 + away[:, 1] ** 2
+        keep = (type_codes[pair_self] == type_codes[pair_other]) & (dist_sq > 0) & \
+               (dist_sq < radii[pair_self] ** 2)
+        pair_self = pair_self[keep]
+        away = away[keep]
+        dist_sq = dist_sq[keep]
+        weights = 1.0 / (dist_sq + 0.0001) / np.sqrt(dist_sq)  # away.normalize() * 1 / (dist_sq + 0.0001)
+        sums = np.stack([np.bincount(pair_self, weights=away[:, 0] * weights, minlength=count),
+                         np.bincount(pair_self, weights=away[:, 1] * weights, minlength=count)], axis=1)
+        return np.bincount(pair_self, minlength=count), sums
+
+    # --- KIỂM TRA KẸT VÀ DI CHUYỂN ---
+    def sync_obstacles(self, obstacle_sprites):
+        """
+        Dựng lại bảng phủ vật cản khi nhóm vật cản đổi (Level gọi sẵn lúc tải màn). Các cạnh hitbox chia mặt phẳng
+        thành lưới ô không đều (nén toạ độ); mỗi ô nằm trọn trong hoặc ngoài mọi hitbox, nên đếm ô bị phủ bằng tổng
+        cộng dồn 2D là chính xác tới từng pixel.
+        """
+        version = getattr(obstacle_sprites, 'version', None)  # len() của pygame.sprite.Group phải dựng cả danh sách
+        token = (id(obstacle_sprites), version if version is not None else len(obstacle_sprites))
+        if token == self.obstacle_token:
+            return
+        self.obstacle_token = token
+        boxes = np.array([(hitbox.left, hitbox.top, hitbox.right, hitbox.bottom)
+                          for hitbox in (getattr(sprite, 'hitbox', None) for sprite in obstacle_sprites)
+                          if hitbox is not None and hitbox.width > 0 and hitbox.height > 0],
+                         dtype=float).reshape(-1, 4)
+        self.obstacle_xs = np.unique(boxes[:, [0, 2]])
+        self.obstacle_ys = np.unique(boxes[:, [1, 3]])
+        columns = len(self.obstacle_xs)
+        rows = len(self.obstacle_ys)
+        # Mảng hiệu 2D: +1/-1 ở bốn góc mỗi hitbox, cộng dồn hai chiều ra số hitbox phủ lên mỗi ô
+        coverage = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+        lefts = np.searchsorted(self.obstacle_xs, boxes[:, 0])
+        rights = np.searchsorted(self.obstacle_xs, boxes[:, 2])
+        tops = np.searchsorted(self.obstacle_ys, boxes[:, 1])
+        bottoms = np.searchsorted(self.obstacle_ys, boxes[:, 3])
+        np.add.at(coverage, (tops, lefts), 1)
+        np.add.at(coverage, (tops, rights), -1)
+        np.add.at(coverage, (bottoms, lefts), -1)
+        np.add.at(coverage, (bottoms, rights), 1)
+        covered = coverage.cumsum(axis=0).cumsum(axis=1)[:rows, :columns] > 0
+        self.obstacle_sums = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+        self.obstacle_sums[1:, 1:] = covered.cumsum(axis=0).cumsum(axis=1)
+
+    def clear_of_obstacles(self, lefts, tops, sizes):
+        """Hitbox (lefts, tops, sizes) không chạm (colliderect) hitbox vật cản nào - khi đó Entity.collision không đẩy lùi."""
+        xs = self.obstacle_xs
+        ys = self.obstacle_ys
+        if not len(xs):
+            return np.ones(len(lefts), dtype=bool)
+        # Các ô nén [xs[i], xs[i + 1]) có phần chung dương với [left, left + width)
+        first_cols = np.maximum(np.searchsorted(xs, lefts, side='right') - 1, 0)
+        end_cols = np.maximum(np.searchsorted(xs, lefts + sizes[:, 0], side='left'), first_cols)
+        first_rows = np.maximum(np.searchsorted(ys, tops, side='right') - 1, 0)
+        end_rows = np.maximum(np.searchsorted(ys, tops + sizes[:, 1], side='left'), first_rows)
+        sums = self.obstacle_sums
+        return sums[end_rows, end_cols] - sums[first_rows, end_cols] - sums[end_rows, first_cols] + \
+            sums[first_rows, first_cols] == 0
+
+    def move(self, obstacle_sprites, current_time):
+        """
+        Phần đầu Enemy.update cho cả đàn: kiểm tra kẹt (mỗi stuck_check_interval ms), chọn tốc độ rồi di chuyển.
+        obstacle_sprites là nhóm vật cản chung của các quái. Quái có hitbox sau khi đi (theo x, rồi theo y như
+        Entity.move) không chạm vật cản nào được dời thẳng trong mảng; con nào chạm thì đi bằng Entity.move để
+        va chạm được xử lý như cũ. Kết quả được ghi vào sprite trong một vòng.
+        """
+        if not self.rows:
+            return
+        live = self.used & self.alive
+        directions = self.directions
+        direction_sq = (directions * directions).sum(axis=1)
+
+        # Kiểm tra kẹt, cùng thứ tự điều kiện với Enemy.update
+        checked = live & (current_time - self.last_check_times > self.stuck_intervals)
+        changed_stuck = became_stuck = None
+        if checked.any():
+            self.last_check_times[checked] = current_time
+            trying = checked & self.trying & (direction_sq > MIN_MOVE_DIRECTION_SQ)
+            measuring = trying & self.vulnerable
+            centers = self._centers()
+            offsets = centers - self.last_check_positions
+            moved_sq = (offsets * offsets).sum(axis=1)
+            compared = measuring & self.has_last_check
+            blocked = compared & (moved_sq < self.stuck_thresholds_sq) & self.has_goal
+            reset = self.stuck & ((checked & ~trying) | (trying & ~self.vulnerable))
+            became_stuck = blocked & ~self.stuck
+            changed_stuck = became_stuck | (compared & ~blocked & self.stuck) | reset
+            self.last_check_positions[measuring] = centers[measuring]
+            self.has_last_check[measuring] = True
+            self.has_last_check[reset] = False
+            self.stuck ^= changed_stuck
+            stuck_count = int(became_stuck.sum())
+            if stuck_count:  # Kẹt thì thử một hướng ngẫu nhiên
+                angles = self.random.uniform(0, 2 * math.pi, stuck_count)
+                directions[became_stuck] = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+                direction_sq[became_stuck] = (directions[became_stuck] ** 2).sum(axis=1)
+
+        speeds = np.where(~self.vulnerable, self.resistances,
+                          np.where(self.stuck, self.speeds * 0.6, np.where(self.moving, self.speeds, 0.0)))
+        moving = live & (direction_sq > MIN_MOVE_DIRECTION_SQ) & (speeds > 0)
+        moving_rows = np.flatnonzero(moving)
+        raw_directions = directions[moving_rows]
+        units = raw_directions / np.sqrt(direction_sq[moving_rows])[:, None]  # Entity.move chuẩn hoá hướng trước
+        positions = self.positions[moving_rows]
+        # pygame.Rect làm tròn toạ độ thực ra xa số 0 (0.5 -> 1, -0.5 -> -1)
+        moved = positions + units * speeds[moving_rows][:, None]
+        moved = np.copysign(np.floor(np.abs(moved) + 0.5), moved)
+        sizes = self.sizes[moving_rows]
+        self.sync_obstacles(obstacle_sprites)
+        # Hitbox sau bước theo x (lúc Entity.collision('horizontal')) và sau cả bước theo y, kiểm tra chung một lần
+        count = len(moving_rows)
+        clear = self.clear_of_obstacles(np.concatenate([moved[:, 0], moved[:, 0]]),
+                                        np.concatenate([positions[:, 1], moved[:, 1]]),
+                                        np.concatenate([sizes, sizes]))
+        clear = clear[:count] & clear[count:]
+        self.positions[moving_rows[clear]] = moved[clear]
+        directions[moving_rows] = units
+
+        # Ghi kết quả vào sprite
+        if changed_stuck is not None:
+            for row in np.flatnonzero(checked).tolist():
+                enemy = self.row_enemies[row]
+                enemy.last_stuck_check_time = current_time
+                enemy.last_pos_stuck_check = Vector2(self.last_check_positions[row].tolist()) \
+                    if self.has_last_check[row] else None
+                if changed_stuck[row]:
+                    enemy.is_stuck = bool(self.stuck[row])
+                    if enemy.is_stuck:
+                        enemy.direction = Vector2(directions[row].tolist())
+                        enemy.next_step = None
+                        enemy.path.clear()
+                        enemy.recalculation_needed = True
+                        enemy.last_path_time = 0
+        row_enemies = self.row_enemies
+        for row, is_clear, (left, top), unit, raw_direction, speed in zip(
+                moving_rows.tolist(), clear.tolist(), moved.tolist(), units.tolist(), raw_directions.tolist(),
+                speeds[moving_rows].tolist()):
+            enemy = row_enemies[row]
+            if is_clear:
+                enemy.direction = Vector2(unit)
+                hitbox = enemy.hitbox
+                hitbox.topleft = (int(left), int(top))
+                enemy.rect.center = hitbox.center
+            else:
+                enemy.direction = Vector2(raw_direction)
+                enemy.move(speed)
+                self.positions[row] = enemy.hitbox.topleft
+                self.directions[row] = (enemy.direction.x, enemy.direction.y)
@@ -1,6 +1,7 @@
 # 
 import pygame
 from math import sin
+from spatial_index import SpatialHashGroup
 
 class Entity(pygame.sprite.Sprite):
 	def __init__(self,groups):
@@ -23,10 +24,21 @@ class Entity(pygame.sprite.Sprite):
 		self.collision('vertical')
 		self.rect.center = self.hitbox.center
 
+	def nearby_obstacles(self, direction_axis):
+		# Với SpatialHashGroup chỉ lấy vật cản trong các ô lưới quanh hitbox, nới thêm một hitbox theo trục đang xét
+		# vì khi bị đẩy lùi hitbox có thể dịch tối đa chừng đó
+		if isinstance(self.obstacle_sprites, SpatialHashGroup):
+			if direction_axis == 'horizontal':
+				area = self.hitbox.inflate(self.hitbox.width * 2, 0)
+			else:
+				area = self.hitbox.inflate(0, self.hitbox.height * 2)
+			return self.obstacle_sprites.query(area)
+		return self.obstacle_sprites
+
 	def collision(self,direction_axis):
 		# ## MODIFIED for better sliding ##
 		if direction_axis == 'horizontal':
-			for sprite in self.obstacle_sprites:
+			for sprite in self.nearby_obstacles(direction_axis):
 				if hasattr(sprite, 'hitbox') and sprite.hitbox.colliderect(self.hitbox):
 					if self.direction.x > 0: # moving right
 						self.hitbox.right = sprite.hitbox.left
@@ -34,7 +46,7 @@ class Entity(pygame.sprite.Sprite):
 						self.hitbox.left = sprite.hitbox.right
 
 		if direction_axis == 'vertical':
-			for sprite in self.obstacle_sprites:
+			for sprite in self.nearby_obstacles(direction_axis):
 				if hasattr(sprite, 'hitbox') and sprite.hitbox.colliderect(self.hitbox):
 					if self.direction.y > 0: # moving down
 						self.hitbox.bottom = sprite.hitbox.top
@@ -0,0 +1,93 @@
+# flow_field.py
+# Bản đồ khoảng cách (Dijkstra map / flow field) hướng về một ô đích, dùng chung cho mọi quái đang đuổi người chơi.
+import heapq
+
+from pathfinding_algorithms import get_search_engine
+
+
+class FlowField:
+    """
+    Trường hướng đi tới một ô đích trên NavGrid.
+    Chạy Dijkstra một lần từ ô đích (chi phí 1 / 1.414 giống A*/UCS), lưu cho mỗi ô bước kế tiếp về phía đích.
+    Trường chỉ được tính lại khi ô đích hoặc phiên bản lưới (NavGrid.version) thay đổi, và chỉ khi có người hỏi.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.goal = None
+        self.distance = [float('inf')] * grid.size
+        self.toward = [-1] * grid.size  # toward[i]: chỉ số ô kế tiếp trên đường ngắn nhất từ ô i về đích
+        self._computed_goal = None
+        self._computed_version = -1
+        self.rebuild_count = 0
+
+    def set_goal(self, goal_tile):
+        """Đặt ô đích mới. Việc tính lại được hoãn tới lần truy vấn đầu tiên."""
+        self.goal = goal_tile
+
+    def is_current(self):
+        return self._computed_goal == self.goal and self._computed_version == self.grid.version
+
+    def refresh(self):
+        if self.is_current():
+            return
+        grid = self.grid
+        size = grid.size
+        distance = [float('inf')] * size
+        toward = [-1] * size
+        self.distance = distance
+        self.toward = toward
+        self._computed_goal = self.goal
+        self._computed_version = grid.version
+        self.rebuild_count += 1
+
+        goal_index = grid.index(self.goal) if self.goal is not None else -1
+        if goal_index < 0 or grid.blocked[goal_index]:
+            return
+
+        blocked = grid.blocked
+        neighbors = get_search_engine(grid).neighbors
+        distance[goal_index] = 0.0
+        toward[goal_index] = goal_index
+        open_set = [(0.0, goal_index)]
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        while open_set:
+            current_distance, current = heappop(open_set)
+            if current_distance > distance[current]:
+                continue  # Mục cũ trong heap
+            for neighbor, cost in neighbors[current]:
+                if blocked[neighbor]:
+                    continue
+                new_distance = current_distance + cost
+                if new_distance < distance[neighbor]:
+                    distance[neighbor] = new_distance
+                    toward[neighbor] = current
+                    heappush(open_set, (new_distance, neighbor))
+
+    # --- TRUY VẤN ---
+    def distance_to_goal(self, tile):
+        self.refresh()
+        index = self.grid.index(tile)
+        return self.distance[index] if index >= 0 else float('inf')
+
+    def next_tile(self, tile):
+        """
+        Ô kế tiếp nên bước tới từ `tile` để về đích, hoặc None nếu không có đường (hoặc đã ở đích).
+        Nếu `tile` bị chặn (hitbox lấn vào vật cản) thì chọn ô kề đi được gần đích nhất, giống A* vẫn mở rộng ô xuất phát.
+        """
+        self.refresh()
+        grid = self.grid
+        index = grid.index(tile)
+        if index < 0:
+            return None
+        next_index = self.toward[index]
+        if next_index < 0:
+            best_distance = float('inf')
+            for neighbor, cost in get_search_engine(grid).neighbors[index]:
+                if self.distance[neighbor] + cost < best_distance:
+                    best_distance = self.distance[neighbor] + cost
+                    next_index = neighbor
+        if next_index < 0 or next_index == index:
+            return None
+        return grid.tile(next_index)
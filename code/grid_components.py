@@ -0,0 +1,190 @@
+# grid_components.py
+# Gán nhãn vùng liên thông (8 hướng, giống get_neighbors) cho các ô đi được của một NavGrid.
+# Hai ô khác nhãn thì không có đường nối: lời gọi tìm đường giữa chúng được trả về None ngay, không cần tìm kiếm.
+import weakref
+from array import array
+from collections import deque
+
+# Thứ tự ô kề giống get_neighbors trong pathfinding_algorithms (thẳng trước, chéo sau)
+NEIGHBOR_OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+BLOCKED_LABEL = -1
+
+
+class GridComponents:
+    """
+    Nhãn vùng liên thông của từng ô (BLOCKED_LABEL cho ô bị chặn), dựng một lần khi tải bản đồ.
+    Khi NavGrid.version đổi, chỉ các ô trong NavGrid.changes_since() được xử lý:
+    mở một ô thì gộp các vùng kề nó (đánh lại nhãn vùng nhỏ hơn), chặn một ô thì loang lại để tách vùng nếu bị cắt đôi.
+    Nếu nhật ký thay đổi không còn đủ dữ liệu thì gán nhãn lại toàn bộ.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.labels = array('i', [BLOCKED_LABEL]) * grid.size
+        self.sizes = {}  # nhãn -> số ô của vùng
+        self.next_label = 0
+        self.version = -1
+        self.full_relabels = 0
+        self.incremental_updates = 0
+        self.refresh()
+
+    # --- TRUY VẤN ---
+    def label(self, tile):
+        """Nhãn vùng của một ô, hoặc BLOCKED_LABEL nếu ô bị chặn / ngoài bản đồ."""
+        self.refresh()
+        index = self.grid.index(tile)
+        return self.labels[index] if index >= 0 else BLOCKED_LABEL
+
+    def start_labels(self, tile):
+        """
+        Các vùng mà một ô bắt đầu đi vào được. Ô bắt đầu không cần đi được (thực thể có thể đứng lấn lên vật cản),
+        giống bfs_pathfinding: khi đó là các vùng của những ô kề đi được.
+        """
+        own_label = self.label(tile)
+        if own_label != BLOCKED_LABEL:
+            return (own_label,)
+        x, y = tile
+        return {self.label((x + dx, y + dy)) for dx, dy in NEIGHBOR_OFFSETS} - {BLOCKED_LABEL}
+
+    def connected(self, start_tile, end_tile):
+        """Có thể có đường từ start_tile tới end_tile hay không, trong O(1)."""
+        if start_tile == end_tile:
+            return True
+        end_label = self.label(end_tile)
+        return end_label != BLOCKED_LABEL and end_label in self.start_labels(start_tile)
+
+    # --- CẬP NHẬT ---
+    def refresh(self):
+        grid = self.grid
+        if self.version == grid.version:
+            return
+        changed = grid.changes_since(self.version) if self.version >= 0 else None
+        if changed is None:
+            self.relabel_all()
+        else:
+            blocked = grid.blocked
+            labels = self.labels
+            for index in dict.fromkeys(changed):  # Bỏ trùng, giữ thứ tự
+                if blocked[index] and labels[index] != BLOCKED_LABEL:
+                    self._block(index)
+                elif not blocked[index] and labels[index] == BLOCKED_LABEL:
+                    self._unblock(index)
+            self.incremental_updates += 1
+        self.version = grid.version
+
+    def relabel_all(self):
+        grid = self.grid
+        labels = self.labels
+        for index in range(grid.size):
+            labels[index] = BLOCKED_LABEL
+        self.sizes.clear()
+        self.next_label = 0
+        for index in range(grid.size):
+            if not grid.blocked[index] and labels[index] == BLOCKED_LABEL:
+                self._flood(index, BLOCKED_LABEL, self._new_label())
+        self.full_relabels += 1
+
+    def _new_label(self):
+        label = self.next_label
+        self.next_label += 1
+        self.sizes[label] = 0
+        return label
+
+    def _neighbor_indices(self, index):
+        """Chỉ số các ô kề (trong bản đồ) của một ô."""
+        width = self.grid.width
+        height = self.grid.height
+        x, y = index % width, index // width
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                yield ny * width + nx
+
+    def _collect(self, start_index, label, stop_indices=None):
+        """
+        Loang từ start_index qua các ô mang label (BLOCKED_LABEL: các ô đi được chưa có nhãn).
+        Trả về (đã gặp hết stop_indices chưa, danh sách ô đã loang); dừng sớm ngay khi gặp hết stop_indices.
+        """
+        labels = self.labels
+        blocked = self.grid.blocked
+        remaining = set(stop_indices) if stop_indices else None
+        if remaining is not None:
+            remaining.discard(start_index)
+            if not remaining:
+                return True, [start_index]
+        visited = [start_index]
+        seen = {start_index}
+        queue = deque(visited)
+        while queue:
+            current = queue.popleft()
+            for neighbor in self._neighbor_indices(current):
+                if neighbor in seen or labels[neighbor] != label or (label == BLOCKED_LABEL and blocked[neighbor]):
+                    continue
+                seen.add(neighbor)
+                visited.append(neighbor)
+                queue.append(neighbor)
+                if remaining is not None:
+                    remaining.discard(neighbor)
+                    if not remaining:
+                        return True, visited
+        return False, visited
+
+    def _relabel(self, indices, old_label, new_label):
+        labels = self.labels
+        for index in indices:
+            labels[index] = new_label
+        if old_label != BLOCKED_LABEL:
+            self.sizes[old_label] -= len(indices)
+            if not self.sizes[old_label]:
+                del self.sizes[old_label]
+        self.sizes[new_label] += len(indices)
+
+    def _flood(self, start_index, old_label, new_label):
+        """Đổi nhãn cả vùng chứa start_index từ old_label sang new_label."""
+        self._relabel(self._collect(start_index, old_label)[1], old_label, new_label)
+
+    def _unblock(self, index):
+        """Ô vừa đi được: nối vào vùng kề lớn nhất và gộp các vùng kề còn lại vào đó."""
+        labels = self.labels
+        neighbor_labels = {labels[neighbor] for neighbor in self._neighbor_indices(index)} - {BLOCKED_LABEL}
+        if not neighbor_labels:
+            label = self._new_label()
+        else:
+            label = max(neighbor_labels, key=self.sizes.__getitem__)
+            for other in neighbor_labels - {label}:
+                other_start = next(neighbor for neighbor in self._neighbor_indices(index)
+                                   if labels[neighbor] == other)
+                self._flood(other_start, other, label)
+        labels[index] = label
+        self.sizes[label] += 1
+
+    def _block(self, index):
+        """Ô vừa bị chặn: nếu các ô kề cùng vùng không còn nối với nhau thì tách chúng thành vùng mới."""
+        labels = self.labels
+        label = labels[index]
+        labels[index] = BLOCKED_LABEL
+        self.sizes[label] -= 1
+        if not self.sizes[label]:
+            del self.sizes[label]
+            return
+        pending = [neighbor for neighbor in self._neighbor_indices(index) if labels[neighbor] == label]
+        while len(pending) > 1:
+            # Loang từ một ô kề; dừng sớm nếu gặp lại đủ các ô kề còn lại (trường hợp thường gặp: vùng không bị cắt)
+            found_all, visited = self._collect(pending[0], label, stop_indices=pending)
+            if found_all:
+                return
+            # Không gặp đủ: phần vừa loang là một vùng riêng, đổi sang nhãn mới
+            self._relabel(visited, label, self._new_label())
+            pending = [neighbor for neighbor in pending if labels[neighbor] == label]
+
+
+_COMPONENTS = weakref.WeakKeyDictionary()
+
+
+def get_components(grid):
+    """Nhãn vùng liên thông dùng chung cho một NavGrid; tạo lần đầu khi cần."""
+    components = _COMPONENTS.get(grid)
+    if components is None:
+        components = GridComponents(grid)
+        _COMPONENTS[grid] = components
+    return components
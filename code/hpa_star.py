@@ -0,0 +1,304 @@
+# hpa_star.py
+# HPA* (Hierarchical Pathfinding A*): chia bản đồ thành các cụm, tính sẵn đồ thị lối vào giữa các cụm,
+# tìm đường trên đồ thị trừu tượng rồi chỉ làm mịn (refine) đoạn đầu tiên thành từng ô.
+import heapq
+import math
+import time
+import weakref
+from collections import deque
+
+from settings import HPA_CLUSTER_SIZE
+
+INF = float('inf')
+DIAGONAL_COST = 1.414
+MIN_SPLIT_ENTRANCE = 6  # Lối vào dài từ số ô này trở lên được đặt 2 điểm chuyển ở hai đầu thay vì 1 ở giữa
+
+
+class ClusterGraph:
+    """
+    Đồ thị trừu tượng của một NavGrid. Nút là chỉ số ô phẳng của các điểm chuyển (transition) trên biên cụm.
+    Cạnh giữa hai cụm có chi phí 1 (hai ô kề nhau qua biên); cạnh trong cụm là chi phí đường ngắn nhất
+    chỉ đi trong cụm, tính sẵn khi dựng đồ thị. Đồ thị được dựng lại khi NavGrid.version thay đổi.
+    """
+
+    def __init__(self, grid, cluster_size=HPA_CLUSTER_SIZE):
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.clusters_x = math.ceil(grid.width / cluster_size)
+        self.clusters_y = math.ceil(grid.height / cluster_size)
+        self.edges = {}  # Nút -> {nút kề: chi phí}
+        self.cluster_nodes = {}  # Chỉ số cụm -> danh sách nút trừu tượng trong cụm
+        self.version = -1
+        self.build_ms = 0.0
+        # Số liệu của lần truy vấn gần nhất (cho pathfinding_benchmark)
+        self.last_abstract_ms = 0.0
+        self.last_refine_ms = 0.0
+        self.last_abstract_expansions = 0
+        self.last_refine_expansions = 0
+        self.build()
+
+    # --- CỤM ---
+    def cluster_of(self, index):
+        x, y = self.grid.tile(index)
+        return (y // self.cluster_size) * self.clusters_x + x // self.cluster_size
+
+    def cluster_bounds(self, cluster):
+        """(x0, y0, x1, y1) của cụm, x1/y1 không tính."""
+        cluster_x = cluster % self.clusters_x
+        cluster_y = cluster // self.clusters_x
+        x0 = cluster_x * self.cluster_size
+        y0 = cluster_y * self.cluster_size
+        return x0, y0, min(x0 + self.cluster_size, self.grid.width), min(y0 + self.cluster_size, self.grid.height)
+
+    # --- DỰNG ĐỒ THỊ ---
+    def build(self):
+        started = time.perf_counter()
+        grid = self.grid
+        self.edges = {}
+        self.cluster_nodes = {cluster: [] for cluster in range(self.clusters_x * self.clusters_y)}
+
+        # Lối vào giữa hai cụm kề nhau theo chiều ngang và chiều dọc
+        for cluster_y in range(self.clusters_y):
+            for cluster_x in range(self.clusters_x):
+                x0, y0, x1, y1 = self.cluster_bounds(cluster_y * self.clusters_x + cluster_x)
+                if x1 < grid.width:
+                    self._add_entrances([((x1 - 1, y), (x1, y)) for y in range(y0, y1)])
+                if y1 < grid.height:
+                    self._add_entrances([((x, y1 - 1), (x, y1)) for x in range(x0, x1)])
+
+        # Cạnh trong cụm: Dijkstra giới hạn trong cụm từ mỗi nút
+        for cluster, nodes in self.cluster_nodes.items():
+            bounds = self.cluster_bounds(cluster)
+            for node in nodes:
+                distance, _, _ = self._search_in_bounds(node, bounds)
+                for other in nodes:
+                    if other != node and other in distance:
+                        self.edges[node][other] = distance[other]
+
+        self.version = grid.version
+        self.build_ms = (time.perf_counter() - started) * 1000
+
+    def _add_entrances(self, border_pairs):
+        """border_pairs: các cặp ô (bên này, bên kia) dọc theo một đoạn biên chung của hai cụm."""
+        run = []
+        for side_a, side_b in border_pairs + [(None, None)]:
+            if side_a is not None and self.grid.is_walkable(side_a) and self.grid.is_walkable(side_b):
+                run.append((side_a, side_b))
+                continue
+            if run:
+                if len(run) >= MIN_SPLIT_ENTRANCE:
+                    transitions = [run[0], run[-1]]
+                else:
+                    transitions = [run[len(run) // 2]]
+                for tile_a, tile_b in transitions:
+                    self._link(self.grid.index(tile_a), self.grid.index(tile_b), 1)
+                run = []
+
+    def _link(self, node_a, node_b, cost):
+        for node in (node_a, node_b):
+            if node not in self.edges:
+                self.edges[node] = {}
+                self.cluster_nodes[self.cluster_of(node)].append(node)
+        self.edges[node_a][node_b] = cost
+        self.edges[node_b][node_a] = cost
+
+    # --- TÌM KIẾM CỤC BỘ ---
+    def _search_in_bounds(self, source, bounds, target=-1, stats=None):
+        """
+        Dijkstra (hoặc A* nếu có target) chỉ đi trong hình chữ nhật bounds.
+        Trả về (distance, parent, số nút đã mở rộng). Giống các thuật toán khác, chỉ ô đến mới cần đi được.
+        """
+        grid = self.grid
+        width = grid.width
+        blocked = grid.blocked
+        x0, y0, x1, y1 = bounds
+        target_x, target_y = (target % width, target // width) if target >= 0 else (0, 0)
+        distance = {source: 0.0}
+        parent = {source: -1}
+        open_set = [(0.0, source)]
+        closed = set()
+        expansions = 0
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current == target:
+                break
+            if current in closed:
+                continue  # Mục cũ trong heap
+            closed.add(current)
+            current_distance = distance[current]
+            expansions += 1
+            x, y = current % width, current // width
+            generated = 0
+            for dx, dy, cost in ((0, 1, 1), (0, -1, 1), (1, 0, 1), (-1, 0, 1),
+                                 (1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST),
+                                 (-1, 1, DIAGONAL_COST), (-1, -1, DIAGONAL_COST)):
+                nx, ny = x + dx, y + dy
+                if not (x0 <= nx < x1 and y0 <= ny < y1):
+                    continue
+                neighbor = ny * width + nx
+                if blocked[neighbor]:
+                    continue
+                generated += 1
+                new_distance = current_distance + cost
+                if new_distance < distance.get(neighbor, INF):
+                    distance[neighbor] = new_distance
+                    parent[neighbor] = current
+                    estimate = max(abs(nx - target_x), abs(ny - target_y)) if target >= 0 else 0
+                    heapq.heappush(open_set, (new_distance + estimate, neighbor))
+            if stats is not None:
+                stats.expand(len(open_set), generated)
+        return distance, parent, expansions
+
+    def _local_path(self, source, target, bounds, stats=None):
+        """(danh sách chỉ số ô từ source tới target, không gồm source; chi phí) trong bounds, hoặc (None, INF)."""
+        distance, parent, expansions = self._search_in_bounds(source, bounds, target, stats)
+        self.last_refine_expansions += expansions
+        if target not in distance:
+            return None, INF
+        steps = []
+        current = target
+        while current != source:
+            steps.append(current)
+            current = parent[current]
+        steps.reverse()
+        return steps, distance[target]
+
+    def _connect(self, index, stats=None):
+        """Chi phí từ một ô tới các nút trừu tượng trong cùng cụm (đi trong cụm)."""
+        nodes = self.cluster_nodes[self.cluster_of(index)]
+        distance, _, _ = self._search_in_bounds(index, self.cluster_bounds(self.cluster_of(index)), stats=stats)
+        return {node: distance[node] for node in nodes if node in distance and node != index}
+
+    # --- TRUY VẤN ---
+    def abstract_path(self, start, goal, stats=None):
+        """
+        A* trên đồ thị trừu tượng; start/goal được nối tạm vào các nút trong cụm của chúng.
+        Trả về (danh sách nút, chi phí) hoặc (None, INF).
+        """
+        coords_width = self.grid.width
+        goal_x, goal_y = goal % coords_width, goal // coords_width
+        start_links = self._connect(start, stats)
+        goal_links = self._connect(goal, stats)
+
+        def neighbors_of(node):
+            links = dict(self.edges.get(node, {}))
+            if node == start:
+                links.update(start_links)
+            if node in goal_links:
+                links[goal] = min(links.get(goal, INF), goal_links[node])
+            return links.items()
+
+        g_cost = {start: 0.0}
+        parent = {start: -1}
+        open_set = [(0.0, start)]
+        closed = set()
+        expansions = 0
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            if current == goal:
+                path = []
+                while current != -1:
+                    path.append(current)
+                    current = parent[current]
+                path.reverse()
+                self.last_abstract_expansions = expansions
+                return path, g_cost[goal]
+            closed.add(current)
+            expansions += 1
+            links = neighbors_of(current)
+            if stats is not None:
+                stats.expand(len(open_set) + 1, len(links))
+            for neighbor, cost in links:
+                new_cost = g_cost[current] + cost
+                if new_cost < g_cost.get(neighbor, INF):
+                    g_cost[neighbor] = new_cost
+                    parent[neighbor] = current
+                    estimate = max(abs(neighbor % coords_width - goal_x), abs(neighbor // coords_width - goal_y))
+                    heapq.heappush(open_set, (new_cost + estimate, neighbor))
+        self.last_abstract_expansions = expansions
+        return None, INF
+
+    def find_path(self, start_node, end_node, full_path=False, stats=None):
+        """
+        Đường đi từ start_node tới end_node (deque các ô, gồm ô bắt đầu), hoặc None.
+        Mặc định chỉ làm mịn các đoạn đầu cho tới khi đủ khoảng một cụm ô - người gọi tìm lại khi đi hết.
+        full_path=True làm mịn toàn bộ (dùng cho benchmark so sánh độ dài đường).
+        stats (SearchStats) nhận số liệu của cả tìm kiếm trừu tượng lẫn làm mịn.
+        """
+        search_steps = self.find_path_steps(start_node, end_node, full_path, stats)
+        while True:
+            try:
+                next(search_steps)
+            except StopIteration as finished:
+                return finished.value
+
+    def find_path_steps(self, start_node, end_node, full_path=False, stats=None):
+        """
+        Generator của find_path cho PathJob: yield sau tìm kiếm cục bộ, sau tìm kiếm trừu tượng và sau mỗi đoạn
+        được làm mịn. Thời gian last_*_ms chỉ tính lúc generator đang chạy.
+        """
+        grid = self.grid
+        if self.version != grid.version:
+            self.build()
+        self.last_abstract_ms = self.last_refine_ms = 0.0
+        self.last_abstract_expansions = self.last_refine_expansions = 0
+        start = grid.index(start_node)
+        goal = grid.index(end_node)
+        if start < 0 or goal < 0 or grid.blocked[goal]:
+            return None
+
+        started = time.perf_counter()
+        local_steps, local_cost = None, INF
+        local_ms = 0.0
+        start_bounds = self.cluster_bounds(self.cluster_of(start))
+        goal_bounds = self.cluster_bounds(self.cluster_of(goal))
+        if abs(start_bounds[0] - goal_bounds[0]) <= self.cluster_size and \
+                abs(start_bounds[1] - goal_bounds[1]) <= self.cluster_size:
+            # Cùng cụm hoặc cụm kề: thử tìm thẳng trong khung bao hai cụm, vẫn so với đường trừu tượng
+            bounds = (min(start_bounds[0], goal_bounds[0]), min(start_bounds[1], goal_bounds[1]),
+                      max(start_bounds[2], goal_bounds[2]), max(start_bounds[3], goal_bounds[3]))
+            local_steps, local_cost = self._local_path(start, goal, bounds, stats)
+            local_ms = (time.perf_counter() - started) * 1000
+            yield
+
+        abstract_started = time.perf_counter()
+        abstract, abstract_cost = self.abstract_path(start, goal, stats)
+        self.last_abstract_ms = (time.perf_counter() - abstract_started) * 1000
+        if local_steps is not None and local_cost <= abstract_cost:
+            self.last_refine_ms = local_ms
+            return deque([start_node] + [grid.tile(index) for index in local_steps])
+        if abstract is None:
+            return None
+        yield
+
+        path = deque([start_node])
+        for node_a, node_b in zip(abstract, abstract[1:]):
+            refine_started = time.perf_counter()
+            ax, ay = grid.tile(node_a)
+            bx, by = grid.tile(node_b)
+            if max(abs(ax - bx), abs(ay - by)) <= 1:
+                steps = [node_b]  # Cạnh giữa hai cụm
+            else:
+                steps, _ = self._local_path(node_a, node_b, self.cluster_bounds(self.cluster_of(node_a)), stats)
+                if steps is None:
+                    return None
+            path.extend(grid.tile(index) for index in steps)
+            self.last_refine_ms += (time.perf_counter() - refine_started) * 1000
+            if not full_path and len(path) > self.cluster_size:
+                break
+            yield
+        return path
+
+
+_CLUSTER_GRAPHS = weakref.WeakKeyDictionary()
+
+
+def get_cluster_graph(grid):
+    """Đồ thị cụm dùng chung cho một NavGrid; Level gọi lúc tải bản đồ để dựng sẵn."""
+    graph = _CLUSTER_GRAPHS.get(grid)
+    if graph is None:
+        graph = ClusterGraph(grid)
+        _CLUSTER_GRAPHS[grid] = graph
+    return graph
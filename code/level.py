@@ -1,4 +1,7 @@
 import pygame
+import bisect
+import heapq
+import itertools
 from settings import *
 from tile import Tile
 from player import Player
@@ -12,7 +15,16 @@ from npc import NPC
 from particles import AnimationPlayer
 from magic import MagicPlayer
 from upgrade import Upgrade
-from pathfinding_algorithms import PATHFINDING_ALGORITHMS
+from nav_grid import NavGrid
+from spatial_index import SpatialHashGroup, SpatialGrid
+from enemy_batch import EnemyBatch
+from flow_field import FlowField
+from hpa_star import get_cluster_graph
+from grid_components import get_components
+from pvs import load_pvs
+from path_service import PathService
+from pathfinding_profiler import PATHFINDING_PROFILER
+from pathfinding_algorithms import PATHFINDING_ALGORITHMS, get_search_engine
 
 
 class Level:
@@ -21,7 +33,13 @@ class Level:
         self.game_paused = False
 
         self.visible_sprites = YSortCameraGroup()
-        self.obstacle_sprites = pygame.sprite.Group()
+        self.obstacle_sprites = SpatialHashGroup()  # Vật cản được băm theo ô lưới khi create_map() thêm vào
+        self.enemy_grid = SpatialGrid()  # Vị trí quái, dựng lại mỗi frame cho tách bầy và truy vấn quái gần nhất của NPC
+        self.enemy_batch = EnemyBatch()  # Mảng vị trí/trạng thái của mọi quái: tách bầy, kẹt, di chuyển bằng NumPy (ENEMY_BATCH_ENABLED)
+        self.nav_grid = None  # Lưới đi được dùng chung, tạo trong create_map()
+        self.pvs = None  # Bảng tầm nhìn giữa các ô tính sẵn cho nav_grid (pvs.py), mở trong create_map()
+        self.flow_field = None  # Trường hướng đi về phía người chơi cho quái, tạo trong create_map()
+        self.path_service = None  # Tìm đường trên tiến trình con cho Enemy/NPC, tạo trong create_map()
 
         self.current_attack = None
         self.attack_sprites = pygame.sprite.Group()
@@ -30,11 +48,12 @@ class Level:
         self.player = None
         self.camera_target_npc = None
 
-        self.selected_npc_algorithm_name = 'Forward Checking BS'
+        self.selected_npc_algorithm_name = DEFAULT_NPC_ALGORITHM
         self.selected_npc_algorithm_func = PATHFINDING_ALGORITHMS[self.selected_npc_algorithm_name]
 
         self.partial_observability_enabled = DEFAULT_PARTIAL_OBSERVABILITY_ENABLED
         self.enemy_aggression_mode_enabled = ENEMY_AGGRESSION_MODE_ENABLED
+        self.show_pathfinding_profiler = False  # Bảng thời gian tìm đường p50/p95/max (phím F3)
 
         self.ui = None
         self.upgrade = None
@@ -78,6 +97,11 @@ class Level:
             'objects': import_folder('../graphics/objects')
         }
 
+        # Lưới đi được dùng chung cho mọi Enemy/NPC, kích thước theo file CSV của bản đồ
+        self.nav_grid = NavGrid.from_csv_layout(layouts['boundary'])
+        if ENEMY_FLOW_FIELD_ENABLED:
+            self.flow_field = FlowField(self.nav_grid)
+
         npc_creation_data = []
         self.initial_enemy_count = 0  # Reset khi tạo map mới (nếu có thể load nhiều map)
 
@@ -88,7 +112,9 @@ class Level:
                         x = col_index * TILESIZE
                         y = row_index * TILESIZE
                         if style == 'boundary':
-                            Tile((x, y), [self.obstacle_sprites], 'invisible', hitbox_inflation=(-10, None))
+                            boundary_tile = Tile((x, y), [self.obstacle_sprites], 'invisible',
+                                                 hitbox_inflation=(-10, None))
+                            self.nav_grid.add_obstacle_sprite(boundary_tile)
                         # elif style == 'grass':
                         #     random_grass_image = choice(graphics['grass'])
                         #     Tile(
@@ -98,8 +124,9 @@ class Level:
                         #         random_grass_image)
                         elif style == 'object':
                             surf = graphics['objects'][int(col)]
-                            Tile((x, y), [self.visible_sprites, self.obstacle_sprites], 'object',
-                                 surf)
+                            object_tile = Tile((x, y), [self.visible_sprites, self.obstacle_sprites], 'object',
+                                               surf)
+                            self.nav_grid.add_obstacle_sprite(object_tile)
                         elif style == 'entities':
                             if col == '394':
                                 if self.player is None:
@@ -131,6 +158,25 @@ class Level:
                                     level_instance_ref=self)
                                 self.initial_enemy_count += 1  # Đếm số lượng quái ban đầu
 
+        # Dựng sẵn đồ thị cụm HPA* để lần tìm đường dài đầu tiên không phải trả chi phí này
+        get_cluster_graph(self.nav_grid)
+        # Gán nhãn vùng liên thông một lần; sau đó chỉ cập nhật theo các ô đổi trạng thái
+        get_components(self.nav_grid)
+        # Danh sách ô kề của engine mảng (dùng bởi A*/UCS (Array), JPS và flow field) cũng dựng lúc tải màn
+        get_search_engine(self.nav_grid)
+        # Đàn nhỏ thì chi phí cố định của các lệnh NumPy mỗi frame lớn hơn phần tiết kiệm: để quái tự tính từng con
+        if self.initial_enemy_count < ENEMY_BATCH_MIN_ENEMIES:
+            self.enemy_batch.disable()
+        else:
+            self.enemy_batch.sync_obstacles(self.obstacle_sprites)  # Bảng phủ vật cản cho bước di chuyển theo lô
+        # Bảng tầm nhìn tính sẵn: NPC tra một bit cho mỗi mục tiêu trước khi phải tính trường nhìn hay duyệt tia
+        if PVS_ENABLED:
+            self.pvs = load_pvs(self.nav_grid)
+        # Tạo sau khi đã đặt hết vật cản để tiến trình con nhận lưới hoàn chỉnh ngay từ đầu.
+        # Khởi động sẵn các tiến trình con lúc tải màn để frame đầu tiên không phải chờ
+        self.path_service = PathService(self.nav_grid)
+        self.path_service.warm_up()
+
         if self.player:
             for npc_data_item in npc_creation_data:
                 npc = NPC(
@@ -146,6 +192,9 @@ class Level:
                 if self.camera_target_npc is None:
                     self.camera_target_npc = npc
 
+        # Gộp sẵn sàn và các vật tĩnh không bao giờ che sprite di chuyển vào các mảnh nền (sau khi mọi sprite đã có mặt)
+        self.visible_sprites.bake_static_layer(self.nav_grid)
+
     # ... (create_attack, create_magic, destroy_attack giữ nguyên) ...
     def create_attack(self):
         if self.player:
@@ -199,6 +248,7 @@ class Level:
                 enemy_sprite.health -= amount
                 enemy_sprite.vulnerable = False
                 enemy_sprite.hit_time = pygame.time.get_ticks()
+                self.enemy_batch.record(enemy_sprite, with_direction=False)
                 self.animation_player.create_particles(attack_type, enemy_sprite.rect.center, [self.visible_sprites])
 
     def trigger_death_particles(self, pos, particle_type):
@@ -229,10 +279,17 @@ class Level:
         mode_text = "Aggressive" if self.enemy_aggression_mode_enabled else "Normal"
         print(f"Enemy Aggression Mode: {mode_text}")
 
+    def toggle_pathfinding_profiler(self):
+        self.show_pathfinding_profiler = not self.show_pathfinding_profiler
+        if self.show_pathfinding_profiler:
+            PATHFINDING_PROFILER.clear()  # Bắt đầu một cửa sổ đo mới mỗi lần mở bảng
+
     def handle_input(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_m:
                 self.game_menu_toggle()
+            elif event.key == pygame.K_F3:
+                self.toggle_pathfinding_profiler()
             elif event.key == pygame.K_p:
                 self.toggle_partial_observability()
             elif event.key == pygame.K_g:
@@ -331,6 +388,8 @@ class Level:
                         self.enemy_aggression_mode_enabled,
                         show_victory_message_flag=should_show_victory,
                         pathfinding_alert_data=active_alert_display_data)  # Truyền cờ mới
+        if self.show_pathfinding_profiler:
+            self.ui.display_pathfinding_profiler(PATHFINDING_PROFILER)
 
         if should_show_victory:
             pass
@@ -341,23 +400,37 @@ class Level:
                 self.upgrade.display()
         else:
             if not self.ui.show_algo_menu:
+                # Kiểm tra kẹt và di chuyển cả đàn quái trước khi từng sprite cập nhật hoạt ảnh/hồi chiêu
+                self.enemy_batch.move(self.obstacle_sprites, pygame.time.get_ticks())
                 self.visible_sprites.update()
 
                 all_sprites_list = self.visible_sprites.sprites()
                 enemy_sprites_list = [sprite for sprite in all_sprites_list if isinstance(sprite, Enemy)]
                 npc_sprites_list = [sprite for sprite in all_sprites_list if isinstance(sprite, NPC)]
+                self.enemy_grid.rebuild(enemy_sprites_list)
+                self.visible_sprites.set_enemy_index(self.enemy_grid)  # Lọc quái trong màn hình lúc vẽ
+                # Khoảng cách tới người chơi cho cả đàn; quái nào bị dời trong vòng enemy_update thì tự tính lại
+                self.enemy_batch.prepare(self.player)
+
+                # Nhận các đường đi tiến trình con đã tìm xong trước khi Enemy/NPC cập nhật
+                self.path_service.poll()
+                if self.flow_field:
+                    # Chỉ đặt đích; trường được tính lại khi có quái hỏi và ô của người chơi đã đổi
+                    self.flow_field.set_goal((int(self.player.hitbox.centerx // TILESIZE),
+                                              int(self.player.hitbox.centery // TILESIZE)))
 
                 self.visible_sprites.enemy_update(
                     self.player,
                     npc_sprites_list,
-                    enemy_sprites_list,
+                    self.enemy_grid,  # Tách bầy chỉ xét quái ở các ô lưới lân cận
                     self.enemy_pathfinding_counter,
                     self.max_enemies_per_frame
                 )
+                self.enemy_batch.steer()  # Trộn hướng đi với lực tách bầy sau khi mọi quái đã chọn hướng
 
                 self.visible_sprites.npc_update(
                     self.player,
-                    enemy_sprites_list,  # Truyền danh sách enemy cho NPC update
+                    self.enemy_grid,  # NPC tìm quái gần nhất / trong tầm nhìn qua lưới thay vì duyệt cả danh sách
                     npc_sprites_list,  # Truyền danh sách NPC cho NPC update (để tách bầy)
                     self.npc_pathfinding_counter,
                     self.max_npcs_per_frame
@@ -372,8 +445,34 @@ class Level:
 
 
 class YSortCameraGroup(pygame.sprite.Group):
+    """
+    Nhóm vẽ theo thứ tự y. Tile (đứng yên) được xếp sẵn một lần vào các ngăn (hàng ô, khối cột) theo độ sâu vẽ,
+    nên mỗi frame chỉ đi qua các ngăn camera phủ lên mà không phải sắp xếp lại. Quái được lấy theo vùng màn hình từ
+    lưới vị trí quái của Level (set_enemy_index); các sprite di chuyển khác (người chơi, NPC, hiệu ứng...) nằm trong
+    dynamic_sprites. Chỉ những con trong màn hình được sắp xếp rồi trộn với dòng tile tĩnh.
+    Dấu vết đường đi của NPC được vẽ trong một lượt riêng ngay trên nền, không cần NPC nằm trong danh sách vẽ.
+    Thứ tự vẽ giống sorted() cũ trên cả nhóm: theo độ sâu, hoà nhau thì theo thứ tự thêm vào nhóm.
+    """
+
     def __init__(self):
         super().__init__()
+        self.order = {}  # sprite -> thứ tự thêm vào nhóm
+        self.insert_counter = itertools.count()
+        self.dynamic_sprites = {}  # sprite -> None, giữ thứ tự thêm vào
+        self.enemy_sprites = {}  # Quái (sprite -> None), không nằm trong dynamic_sprites
+        self.enemies_added = 0  # Số quái đã thêm vào nhóm, để biết enemy_index đã có đủ mọi quái chưa
+        self.enemy_index = None  # SpatialGrid vị trí quái của Level, xem set_enemy_index()
+        self.enemy_index_added = -1  # enemies_added lúc enemy_index được dựng
+        self.enemy_reach = 0  # Khoảng cách lớn nhất từ tâm hitbox của quái tới mép rect (cộng lề cho khung hoạt ảnh khác)
+        self.unmeasured_enemies = []  # Quái mới thêm, chưa có rect để đo enemy_reach
+        self.trail_owners = {}  # NPC (sprite -> None) có dấu vết đường đi cần vẽ
+        self.static_buckets = {}  # (hàng ô theo độ sâu, khối cột) -> [(độ sâu, thứ tự, tile, rect)] đã sắp xếp
+        self.static_bucket_keys = {}  # tile -> ngăn đang chứa nó
+        self.unbucketed = []  # Tile đã vào nhóm nhưng chưa có rect/hitbox lúc thêm (xếp ngăn ở frame vẽ kế tiếp)
+        # Độ lệch lớn nhất giữa rect của tile và (độ sâu, tâm x) dùng để xếp ngăn, để biết phải xét thêm bao nhiêu ngăn
+        self.static_reach_up = 0
+        self.static_reach_down = 0
+        self.static_reach_x = 0
         self.display_surface = pygame.display.get_surface()
         self.half_width = self.display_surface.get_size()[0] // 2
         self.half_height = self.display_surface.get_size()[1] // 2
@@ -385,6 +484,234 @@ class YSortCameraGroup(pygame.sprite.Group):
             self.floor_surf = pygame.Surface((WIDTH * 2, HEIGTH * 2))  # HEIGTH -> HEIGHT
             self.floor_surf.fill(WATER_COLOR)
         self.floor_rect = self.floor_surf.get_rect(topleft=(0, 0))
+        self.floor_chunks = self.split_into_chunks(self.floor_surf)  # (cột, hàng) -> mảnh nền FLOOR_CHUNK_SIZE
+        self.baked_sprites = []  # Tile đã được vẽ thẳng vào các mảnh nền (không còn trong nhóm)
+        self.trail_dots = {}  # (màu, bán kính) -> ảnh chấm cho từng mức alpha 0..alpha của màu
+
+    @staticmethod
+    def depth_key(sprite):
+        return sprite.hitbox.centery if hasattr(sprite, 'hitbox') else sprite.rect.centery
+
+    # --- QUẢN LÝ NGĂN TILE TĨNH ---
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        if sprite in self.order:
+            return
+        self.order[sprite] = next(self.insert_counter)
+        if isinstance(sprite, Tile):
+            self.unbucketed.append(sprite)
+        elif isinstance(sprite, Enemy):
+            self.enemy_sprites[sprite] = None
+            self.enemies_added += 1
+            self.unmeasured_enemies.append(sprite)
+        else:
+            self.dynamic_sprites[sprite] = None
+            if isinstance(sprite, NPC):
+                self.trail_owners[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        order = self.order.pop(sprite, None)
+        self.dynamic_sprites.pop(sprite, None)
+        self.enemy_sprites.pop(sprite, None)
+        self.trail_owners.pop(sprite, None)
+        bucket_key = self.static_bucket_keys.pop(sprite, None)
+        if bucket_key is None:
+            return
+        bucket = self.static_buckets[bucket_key]
+        del bucket[bisect.bisect_left(bucket, (self.depth_key(sprite), order))]
+        if not bucket:
+            del self.static_buckets[bucket_key]
+
+    def _bucket_pending(self):
+        for sprite in self.unbucketed:
+            if sprite not in self.order or sprite in self.static_bucket_keys or not hasattr(sprite, 'rect'):
+                continue
+            depth = self.depth_key(sprite)
+            rect = sprite.rect
+            bucket_key = (depth // TILESIZE, rect.centerx // RENDER_BUCKET_WIDTH)
+            bisect.insort(self.static_buckets.setdefault(bucket_key, []), (depth, self.order[sprite], sprite, rect))
+            self.static_bucket_keys[sprite] = bucket_key
+            self.static_reach_up = max(self.static_reach_up, depth - rect.top)
+            self.static_reach_down = max(self.static_reach_down, rect.bottom - depth)
+            self.static_reach_x = max(self.static_reach_x, rect.width)
+        self.unbucketed.clear()
+
+    def static_entries_on_screen(self, camera_rect):
+        """(độ sâu, thứ tự, tile, rect) của các tile tĩnh giao với camera_rect, theo thứ tự vẽ."""
+        if self.unbucketed:
+            self._bucket_pending()
+        buckets = self.static_buckets
+        collide = camera_rect.colliderect
+        first_row = (camera_rect.top - self.static_reach_down) // TILESIZE
+        last_row = (camera_rect.bottom + self.static_reach_up) // TILESIZE
+        columns = range((camera_rect.left - self.static_reach_x) // RENDER_BUCKET_WIDTH,
+                        (camera_rect.right + self.static_reach_x) // RENDER_BUCKET_WIDTH + 1)
+        visible = []
+        for row in range(first_row, last_row + 1):
+            # Độ sâu của mọi tile trong một hàng nằm trong [row * TILESIZE, (row + 1) * TILESIZE) nên các hàng nối tiếp
+            # nhau đã đúng thứ tự; chỉ cần trộn các khối cột trong cùng hàng
+            row_buckets = [buckets[(row, column)] for column in columns if (row, column) in buckets]
+            if not row_buckets:
+                continue
+            if len(row_buckets) == 1:
+                entries = row_buckets[0]
+            else:
+                entries = [entry for bucket in row_buckets for entry in bucket]
+                entries.sort()  # Nối các đoạn đã sắp xếp: timsort chỉ trộn chúng, thời gian tuyến tính
+            visible.extend([entry for entry in entries if collide(entry[3])])
+        return visible
+
+    # --- QUÁI TRONG MÀN HÌNH ---
+    def set_enemy_index(self, enemy_grid):
+        """Gọi ngay sau khi Level dựng lại enemy_grid từ các quái của nhóm này."""
+        self.enemy_index = enemy_grid
+        self.enemy_index_added = self.enemies_added
+
+    def _measure_enemies(self):
+        pending = []
+        for sprite in self.unmeasured_enemies:
+            if sprite not in self.enemy_sprites:
+                continue
+            if not hasattr(sprite, 'rect') or not hasattr(sprite, 'hitbox'):
+                pending.append(sprite)  # Enemy chỉ có rect sau khi khởi tạo xong
+                continue
+            rect = sprite.rect
+            center_x, center_y = sprite.hitbox.center
+            reach = max(center_x - rect.left, rect.right - center_x, center_y - rect.top, rect.bottom - center_y)
+            # Các khung hoạt ảnh khác có thể lớn hơn khung đang dùng
+            self.enemy_reach = max(self.enemy_reach, reach + TILESIZE // 2)
+        self.unmeasured_enemies = pending
+
+    def enemies_on_screen(self, camera_rect):
+        """
+        Quái có rect giao với camera_rect. Hỏi enemy_index theo vùng màn hình (nới thêm enemy_reach); chỉ duyệt hết các quái
+        khi chưa có chỉ mục hoặc có quái mới thêm sau lần dựng chỉ mục gần nhất. Quái đã bị gỡ khỏi nhóm được bỏ qua.
+        """
+        if self.unmeasured_enemies:
+            self._measure_enemies()
+        enemies = self.enemy_sprites
+        collide = camera_rect.colliderect
+        if self.enemy_index is not None and self.enemy_index_added == self.enemies_added:
+            area = camera_rect.inflate(2 * self.enemy_reach, 2 * self.enemy_reach)
+            return [sprite for sprite in self.enemy_index.query_rect(area) if sprite in enemies and collide(sprite.rect)]
+        return [sprite for sprite in enemies if hasattr(sprite, 'rect') and collide(sprite.rect)]
+
+    def sprites_on_screen(self, camera_rect):
+        """
+        Các sprite cần vẽ trong camera_rect (toạ độ thế giới), theo thứ tự vẽ: sắp xếp riêng vài sprite di chuyển
+        trong màn hình rồi trộn một lượt với các tile tĩnh (đã theo thứ tự sẵn).
+        """
+        order = self.order
+        depth_key = self.depth_key
+        moving = [(depth_key(sprite), order[sprite], sprite) for sprite in self.dynamic_sprites
+                  if hasattr(sprite, 'rect') and sprite.rect.colliderect(camera_rect)]
+        moving.extend((depth_key(sprite), order[sprite], sprite) for sprite in self.enemies_on_screen(camera_rect))
+        moving.sort()
+        # Thứ tự thêm vào là duy nhất nên phép so sánh (độ sâu, thứ tự) không bao giờ đi tới phần tử sprite
+        return [entry[2] for entry in heapq.merge(self.static_entries_on_screen(camera_rect), moving)]
+
+    # --- LỚP NỀN TĨNH ---
+    @staticmethod
+    def split_into_chunks(surface):
+        """Cắt surface thành các mảnh vuông FLOOR_CHUNK_SIZE (bản sao riêng để có thể vẽ thêm lên từng mảnh)."""
+        chunks = {}
+        width, height = surface.get_size()
+        for top in range(0, height, FLOOR_CHUNK_SIZE):
+            for left in range(0, width, FLOOR_CHUNK_SIZE):
+                area = pygame.Rect(left, top, FLOOR_CHUNK_SIZE, FLOOR_CHUNK_SIZE).clip(surface.get_rect())
+                chunks[(left // FLOOR_CHUNK_SIZE, top // FLOOR_CHUNK_SIZE)] = surface.subsurface(area).copy()
+        return chunks
+
+    def chunk_keys(self, rect):
+        """Các mảnh nền (cột, hàng) giao với một hình chữ nhật toạ độ thế giới."""
+        left = rect.left - self.floor_rect.left
+        top = rect.top - self.floor_rect.top
+        return [(column, row)
+                for row in range(top // FLOOR_CHUNK_SIZE, (top + rect.height - 1) // FLOOR_CHUNK_SIZE + 1)
+                for column in range(left // FLOOR_CHUNK_SIZE, (left + rect.width - 1) // FLOOR_CHUNK_SIZE + 1)
+                if (column, row) in self.floor_chunks]
+
+    def bake_static_layer(self, nav_grid):
+        """
+        Vẽ thẳng vào các mảnh nền những tile 'object' không bao giờ bị sprite nào vẽ sau nó mà lẽ ra phải nằm dưới:
+        - không có ô đi được nào mà một sprite di chuyển (kích thước lớn nhất hiện có) đứng ở đó vừa chồng lên tile
+          vừa có độ sâu nhỏ hơn, tức là sprite đó luôn được vẽ sau tile, đúng như khi tile nằm trong nền;
+        - mọi tile tĩnh còn lại chồng lên nó đều có độ sâu lớn hơn (được vẽ sau nó).
+        Các tile này rời nhóm (chỉ còn là vật cản) nên không còn bị sắp xếp hay blit riêng mỗi frame.
+        Hiệu ứng tạm thời bay qua vùng tường (ví dụ phép lửa) vẫn có thể vẽ đè lên chúng.
+        """
+        if self.unbucketed:
+            self._bucket_pending()
+        moving = [sprite for sprite in itertools.chain(self.dynamic_sprites, self.enemy_sprites) if hasattr(sprite, 'rect')]
+        if not moving:
+            return
+        margin = TILESIZE // 8  # Khung hình hoạt ảnh có thể lớn hơn một chút so với lúc đo
+        reach_x = max(sprite.rect.width for sprite in moving) // 2 + margin
+        reach_down = max(sprite.rect.bottom - self.depth_key(sprite) for sprite in moving) + margin
+
+        def never_behind_moving(rect, depth):
+            # Tâm (độ sâu) của sprite di chuyển nằm trong vùng này thì sprite chồng lên rect và được vẽ trước tile
+            first_col = (rect.left - reach_x) // TILESIZE
+            last_col = (rect.right + reach_x - 1) // TILESIZE
+            for row in range((rect.top - reach_down) // TILESIZE, (depth - 1) // TILESIZE + 1):
+                for col in range(first_col, last_col + 1):
+                    if nav_grid.is_walkable((col, row)):
+                        return False
+            return True
+
+        entries = sorted(entry for bucket in self.static_buckets.values() for entry in bucket)
+        kept_rects = []  # rect của các tile tĩnh giữ lại trong nhóm, theo thứ tự vẽ
+        for depth, _, sprite, rect in entries:  # Theo thứ tự vẽ: mỗi tile chỉ phụ thuộc các tile đứng trước nó
+            bakeable = sprite.sprite_type == 'object' and self.floor_rect.contains(rect) and \
+                rect.collidelist(kept_rects) < 0 and never_behind_moving(rect, depth)
+            if not bakeable:
+                kept_rects.append(rect)
+                continue
+            for column, row in self.chunk_keys(rect):
+                self.floor_chunks[(column, row)].blit(sprite.image, (rect.left - self.floor_rect.left - column * FLOOR_CHUNK_SIZE,
+                                                                     rect.top - self.floor_rect.top - row * FLOOR_CHUNK_SIZE))
+            self.baked_sprites.append(sprite)
+        for sprite in self.baked_sprites:
+            self.remove(sprite)
+
+    # --- DẤU VẾT ĐƯỜNG ĐI CỦA NPC ---
+    def get_trail_dots(self, color, radius):
+        """Ảnh chấm tròn của dấu vết, vẽ sẵn một lần cho mỗi mức alpha (phần tử thứ a có alpha a)."""
+        key = (tuple(color), radius)
+        dots = self.trail_dots.get(key)
+        if dots is None:
+            dots = []
+            for alpha in range(color[3] + 1):
+                dot = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+                pygame.draw.circle(dot, (color[0], color[1], color[2], alpha), (radius, radius), radius)
+                dots.append(dot)
+            self.trail_dots[key] = dots
+        return dots
+
+    def draw_path_trail(self, sprite, camera_rect):
+        """
+        Vẽ path_history của sprite, điểm cũ mờ hơn điểm mới (alpha tỉ lệ với (i + 1) / số điểm).
+        Chỉ các điểm trong màn hình được vẽ, bằng ảnh chấm dựng sẵn và một lần blits() - không tạo Surface mỗi frame.
+        """
+        history = sprite.path_history
+        color = sprite.path_color if hasattr(sprite, 'path_color') else (0, 0, 255, 100)
+        radius = sprite.path_point_radius if hasattr(sprite, 'path_point_radius') else 3
+        dots = self.get_trail_dots(color, radius)
+        max_alpha = color[3]
+        count = len(history)
+        left, top = camera_rect.left + radius, camera_rect.top + radius  # Góc trên trái của chấm trên màn hình
+        min_x, max_x = camera_rect.left - radius, camera_rect.right + radius
+        min_y, max_y = camera_rect.top - radius, camera_rect.bottom + radius
+        self.display_surface.blits([(dots[max_alpha * (i + 1) // count], (x - left, y - top))
+                                    for i, (x, y) in enumerate(history)
+                                    if min_x < x < max_x and min_y < y < max_y], doreturn=False)
+
+    def draw_path_trails(self, camera_rect):
+        """Lượt vẽ dấu vết riêng (ngay trên nền, dưới mọi sprite): chỉ các điểm trong màn hình, NPC ở đâu cũng được."""
+        for sprite in self.trail_owners:
+            if getattr(sprite, 'path_history', None):
+                self.draw_path_trail(sprite, camera_rect)
 
     def custom_draw(self, target_entity):
         if target_entity and hasattr(target_entity, 'rect'):
@@ -393,51 +720,21 @@ class YSortCameraGroup(pygame.sprite.Group):
         else:
             pass
 
-        floor_offset_pos = self.floor_rect.topleft - self.offset
-        self.display_surface.blit(self.floor_surf, floor_offset_pos)
+        camera_rect = pygame.Rect((int(self.offset.x), int(self.offset.y)), self.display_surface.get_size())
+        floor_left = self.floor_rect.left - camera_rect.left
+        floor_top = self.floor_rect.top - camera_rect.top
+        self.display_surface.blits([(self.floor_chunks[key], (floor_left + key[0] * FLOOR_CHUNK_SIZE,
+                                                              floor_top + key[1] * FLOOR_CHUNK_SIZE))
+                                    for key in self.chunk_keys(camera_rect)], doreturn=False)
+        self.draw_path_trails(camera_rect)
 
-        try:
-            sorted_sprites = sorted(self.sprites(), key=lambda sprite: sprite.hitbox.centery if hasattr(sprite,
-                                                                                                        'hitbox') else sprite.rect.centery)
-        except AttributeError:
-            sorted_sprites = sorted(self.sprites(),
-                                    key=lambda sprite: sprite.rect.centery if hasattr(sprite, 'rect') else 0)
+        sorted_sprites = self.sprites_on_screen(camera_rect)
 
         for sprite in sorted_sprites:
             if hasattr(sprite, 'rect') and hasattr(sprite, 'image'):
                 offset_pos = sprite.rect.topleft - self.offset
                 self.display_surface.blit(sprite.image, offset_pos)
 
-            if hasattr(sprite, 'path_history') and sprite.path_history:
-                # ----- THÊM DÒNG PRINT Ở ĐÂY -----
-                # if isinstance(sprite, NPC): # Kiểm tra thêm nếu cần, nhưng hasattr là đủ nếu chỉ NPC có path_history
-                #    print(f"Đang vẽ đường đi cho {getattr(sprite, 'npc_name', 'NPC không tên')}, số điểm: {len(sprite.path_history)}, điểm đầu: {sprite.path_history[0]}, offset camera: {self.offset}")
-                # ----- KẾT THÚC DÒNG PRINT -----
-
-                path_color_from_npc = sprite.path_color if hasattr(sprite, 'path_color') else (0, 0, 255, 100)
-                path_radius_from_npc = sprite.path_point_radius if hasattr(sprite, 'path_point_radius') else 3
-
-                num_points = len(sprite.path_history)
-                for i, point_world_coords in enumerate(sprite.path_history):
-                    point_screen_coords = (point_world_coords[0] - self.offset.x,
-                                           point_world_coords[1] - self.offset.y)
-
-                    alpha = path_color_from_npc[3] * ((i + 1) / num_points)
-                    dynamic_color = (path_color_from_npc[0], path_color_from_npc[1], path_color_from_npc[2], int(alpha))
-
-                    # ----- CÓ THỂ THÊM PRINT Ở ĐÂY ĐỂ DEBUG TỪNG ĐIỂM -----
-                    # print(f"  Vẽ điểm {i}: World={point_world_coords}, Screen={point_screen_coords}, Màu={dynamic_color}, Bán kính={path_radius_from_npc}")
-                    # ----- KẾT THÚC PRINT ĐIỂM -----
-
-                    point_draw_surface = pygame.Surface((path_radius_from_npc * 2, path_radius_from_npc * 2),
-                                                        pygame.SRCALPHA)
-                    pygame.draw.circle(point_draw_surface, dynamic_color,
-                                       (path_radius_from_npc, path_radius_from_npc),
-                                       path_radius_from_npc)
-                    self.display_surface.blit(point_draw_surface,
-                                              (point_screen_coords[0] - path_radius_from_npc,
-                                               point_screen_coords[1] - path_radius_from_npc))
-
     def enemy_update(self, player_watcher, npc_list, all_enemies_for_separation, pathfinding_counter,
                      max_enemies_per_frame):
         current_enemy_sprites = [sprite for sprite in self.sprites() if
@@ -140,6 +140,8 @@ class Game:
                 # Xử lý tất cả sự kiện và chuyển tiếp cho Level xử lý
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
+                        if self.level and self.level.path_service:
+                            self.level.path_service.shutdown()
                         pygame.quit()
                         sys.exit()
 
@@ -0,0 +1,147 @@
+# nav_grid.py
+# Lưới đi được (walkability grid) dùng chung cho toàn bộ bản đồ.
+# Module này không phụ thuộc pygame để có thể dùng lại ở các tiến trình/công cụ không có cửa sổ.
+from collections import deque
+
+from settings import TILESIZE
+
+CHANGE_LOG_SIZE = 1024  # Số lần đổi trạng thái ô gần nhất được ghi lại cho các planner tăng dần (D* Lite)
+
+
+class NavGrid:
+    """
+    Lưới đi được gọn nhẹ, xây dựng một lần cho mỗi bản đồ.
+    Mỗi ô lưu số vật cản phủ lên nó trong một bytearray (0 = đi được), truy cập theo chỉ số phẳng y * width + x.
+    Các ô nằm ngoài bản đồ luôn bị coi là không đi được để các thuật toán tìm đường dừng lại khi không có đường.
+    """
+
+    def __init__(self, width, height, tilesize=TILESIZE):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.tilesize = tilesize
+        self.blocked = bytearray(self.size)  # Số vật cản phủ lên mỗi ô (tối đa 255)
+        self.version = 0  # Tăng mỗi khi trạng thái đi được của một ô thay đổi
+        self.change_log = deque(maxlen=CHANGE_LOG_SIZE)  # (version sau khi đổi, chỉ số ô)
+
+    @classmethod
+    def from_csv_layout(cls, layout, tilesize=TILESIZE):
+        """Tạo lưới rỗng có kích thước theo một layout CSV (danh sách các hàng)."""
+        height = len(layout)
+        width = max((len(row) for row in layout), default=0)
+        return cls(width, height, tilesize)
+
+    @classmethod
+    def from_obstacle_sprites(cls, obstacle_sprites, width=None, height=None, tilesize=TILESIZE):
+        """Tạo lưới từ một nhóm sprite vật cản. Nếu không có kích thước, suy ra từ phạm vi các hitbox."""
+        obstacles = [sprite for sprite in obstacle_sprites if cls.is_obstacle_sprite(sprite)]
+        if width is None or height is None:
+            max_right = max((sprite.hitbox.right for sprite in obstacles), default=0)
+            max_bottom = max((sprite.hitbox.bottom for sprite in obstacles), default=0)
+            width = width if width is not None else -(-max_right // tilesize)
+            height = height if height is not None else -(-max_bottom // tilesize)
+        grid = cls(width, height, tilesize)
+        for sprite in obstacles:
+            grid.block_rect(sprite.hitbox)
+        return grid
+
+    @staticmethod
+    def is_obstacle_sprite(sprite):
+        """Sprite có chặn đường tìm đường hay không (cỏ không được tính, giống logic cũ của Enemy/NPC)."""
+        hitbox = getattr(sprite, 'hitbox', None)
+        return hitbox is not None and hitbox.width > 0 and hitbox.height > 0 and \
+            getattr(sprite, 'sprite_type', '') != 'grass'
+
+    # --- TRUY VẤN ---
+    def in_bounds(self, tile):
+        x, y = tile
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def index(self, tile):
+        """Chỉ số phẳng của một ô, hoặc -1 nếu ô nằm ngoài bản đồ."""
+        x, y = tile
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return -1
+
+    def tile(self, index):
+        """Toạ độ ô (x, y) từ chỉ số phẳng."""
+        return index % self.width, index // self.width
+
+    def is_walkable(self, tile):
+        if not isinstance(tile, tuple) or len(tile) != 2:
+            return False
+        x, y = tile
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return not self.blocked[y * self.width + x]
+        return False
+
+    # Cho phép truyền thẳng lưới làm is_walkable_func cho các hàm trong pathfinding_algorithms
+    __call__ = is_walkable
+
+    def is_walkable_index(self, index):
+        return 0 <= index < self.size and not self.blocked[index]
+
+    def is_blocked(self, tile):
+        """Ngược với is_walkable: ô có vật cản hoặc nằm ngoài bản đồ."""
+        return not self.is_walkable(tile)
+
+    def changes_since(self, version):
+        """
+        Chỉ số các ô đã đổi trạng thái đi được sau `version`.
+        Trả về None nếu nhật ký không còn đủ dữ liệu (quá nhiều thay đổi) - khi đó người gọi nên tính lại từ đầu.
+        """
+        if version == self.version:
+            return []
+        if version > self.version or not self.change_log or self.change_log[0][0] > version + 1:
+            return None
+        return [index for changed_version, index in self.change_log if changed_version > version]
+
+    # --- CẬP NHẬT ---
+    def tiles_in_rect(self, rect):
+        """Các ô (x, y) trong bản đồ bị một hình chữ nhật (pixel) phủ lên."""
+        start_col = max(0, rect.left // self.tilesize)
+        end_col = min(self.width - 1, (rect.right - 1) // self.tilesize)
+        start_row = max(0, rect.top // self.tilesize)
+        end_row = min(self.height - 1, (rect.bottom - 1) // self.tilesize)
+        for row in range(start_row, end_row + 1):
+            for col in range(start_col, end_col + 1):
+                yield col, row
+
+    def block_rect(self, rect):
+        for tile in self.tiles_in_rect(rect):
+            self.add_blocker(tile)
+
+    def unblock_rect(self, rect):
+        for tile in self.tiles_in_rect(rect):
+            self.remove_blocker(tile)
+
+    def add_blocker(self, tile):
+        index = self.index(tile)
+        if index < 0:
+            return
+        count = self.blocked[index]
+        if count < 255:
+            self.blocked[index] = count + 1
+        if count == 0:
+            self._record_change(index)
+
+    def remove_blocker(self, tile):
+        index = self.index(tile)
+        if index < 0 or self.blocked[index] == 0:
+            return
+        self.blocked[index] -= 1
+        if self.blocked[index] == 0:
+            self._record_change(index)
+
+    def _record_change(self, index):
+        self.version += 1
+        self.change_log.append((self.version, index))
+
+    def add_obstacle_sprite(self, sprite):
+        if self.is_obstacle_sprite(sprite):
+            self.block_rect(sprite.hitbox)
+
+    def remove_obstacle_sprite(self, sprite):
+        if self.is_obstacle_sprite(sprite):
+            self.unblock_rect(sprite.hitbox)
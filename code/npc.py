@@ -6,10 +6,23 @@ import math
 from settings import *
 from entity import Entity
 from support import import_folder
+from nav_grid import NavGrid
 from pygame.math import Vector2
-from pathfinding_algorithms import a_star_pathfinding, heuristic_diagonal,PATHFINDING_ALGORITHMS
+from pathfinding_algorithms import a_star_pathfinding, heuristic_diagonal,PATHFINDING_ALGORITHMS, STATEFUL_PLANNERS, \
+    RESUMABLE_SEARCHES, SearchStats
+from path_jobs import PathJob
+from pathfinding_profiler import PATHFINDING_PROFILER
 from enemy import Enemy
+from spatial_index import SpatialGrid
+from visibility import has_line_of_sight, lines_of_sight, compute_fov, facing_octant
 
+# Các hàm tìm đường không nhận heuristic_func
+PATHFINDING_FUNCS_WITHOUT_HEURISTIC = ['bfs_pathfinding',
+                                       'dfs_pathfinding',
+                                       'ucs_pathfinding',
+                                       'backtracking_pathfinding',
+                                       'forward_checking_backtracking_pathfinding'
+                                       ]
 
 class NPC(Entity):
     def __init__(self, npc_name, pos, groups, obstacle_sprites, player, damage_enemy_callback,
@@ -54,6 +67,10 @@ class NPC(Entity):
 
         self.notice_radius = npc_info.get('notice_radius', TILESIZE * 7)
         self.sight_radius = npc_info.get('sight_radius', DEFAULT_SIGHT_RADIUS)
+        self.sight_angle = npc_info.get('sight_angle', DEFAULT_SIGHT_ANGLE)
+        self.awareness_radius = npc_info.get('awareness_radius', DEFAULT_AWARENESS_RADIUS)
+        self.visible_tiles = frozenset()  # Trường nhìn (shadowcasting) từ ô hiện tại, xem get_visible_tiles()
+        self.visible_tiles_key = None
         self.lkp_max_age = npc_info.get('lkp_max_age', DEFAULT_LKP_MAX_AGE)
         self.last_known_positions = {}
         self.pursuing_lkp_info = None
@@ -164,20 +181,16 @@ class NPC(Entity):
         self.last_guard_reposition_time = 0
         self.current_guard_target_tile = None
 
-        self.obstacle_tiles = set()
-        if obstacle_sprites:
-            for sprite in obstacle_sprites:
-                if hasattr(sprite, 'rect') and hasattr(sprite, 'hitbox') and \
-                        hasattr(sprite.hitbox, 'width') and hasattr(sprite.hitbox, 'height') and \
-                        sprite.hitbox.width > 0 and sprite.hitbox.height > 0 and \
-                        getattr(sprite, 'sprite_type', '') != 'grass':
-                    start_col = sprite.hitbox.left // TILESIZE
-                    end_col = (sprite.hitbox.right - 1) // TILESIZE
-                    start_row = sprite.hitbox.top // TILESIZE
-                    end_row = (sprite.hitbox.bottom - 1) // TILESIZE
-                    for col in range(start_col, end_col + 1):
-                        for row in range(start_row, end_row + 1):
-                            self.obstacle_tiles.add((col, row))
+        # --- Dùng chung lưới đi được của Level thay vì tự dựng tập ô vật cản cho từng NPC ---
+        self.nav_grid = getattr(level_instance_ref, 'nav_grid', None)
+        if self.nav_grid is None:
+            self.nav_grid = NavGrid.from_obstacle_sprites(obstacle_sprites)
+        # Planner có trạng thái (D* Lite) được giữ giữa các lần tìm đường; None với các thuật toán thường
+        self.path_planner = None
+        if self.current_algorithm_name_str in STATEFUL_PLANNERS:
+            self.path_planner = STATEFUL_PLANNERS[self.current_algorithm_name_str](self.nav_grid)
+        # Job tìm đường đang chạy dở qua nhiều frame (chỉ với thuật toán trong RESUMABLE_SEARCHES)
+        self.path_job = None
 
         # --- THUỘC TÍNH CHO DẤU VẾT ĐƯỜNG ĐI ---
         self.path_history = deque(maxlen=1000)
@@ -283,22 +296,109 @@ class NPC(Entity):
         if hasattr(target_entity, 'id') and target_entity.id is not None: return target_entity.id
         return id(target_entity)
 
+    def find_target_by_id(self, target_id):
+        """Mục tiêu còn sống ứng với target_id (ngược với get_target_id), hoặc None."""
+        if target_id == 'player':
+            return self.player
+        enemy_grid = getattr(self.level_ref, 'enemy_grid', None)
+        if enemy_grid is not None:
+            target = enemy_grid.get(target_id)
+            return target if target is not None and target.groups() else None
+        if self.level_ref and hasattr(self.level_ref, 'attackable_sprites'):
+            return next((s for s in self.level_ref.attackable_sprites if self.get_target_id(s) == target_id), None)
+        return None
+
+    def closest_enemy(self, point, enemy_sprites):
+        """Quái còn sống gần point nhất. Với SpatialGrid của Level chỉ xét các ô lưới quanh point."""
+        def is_candidate(enemy):
+            return enemy and enemy.groups() and hasattr(enemy, 'hitbox') and enemy != self
+
+        if isinstance(enemy_sprites, SpatialGrid):
+            found = enemy_sprites.nearest(point, predicate=is_candidate)
+            return found[0] if found else None
+        closest = None
+        min_dist_sq = float('inf')
+        for enemy in enemy_sprites:
+            if is_candidate(enemy):
+                dist_sq = Vector2(point).distance_squared_to(Vector2(enemy.hitbox.center))
+                if dist_sq < min_dist_sq:
+                    min_dist_sq = dist_sq
+                    closest = enemy
+        return closest
+
     def is_walkable(self, tile_coords):
-        if not isinstance(tile_coords, tuple) or len(tile_coords) != 2:
-            return False
-        if tile_coords in self.obstacle_tiles:
-            return False
-        return True
+        return self.nav_grid.is_walkable(tile_coords)
 
     def check_target_tile_on_obstacle(self, target_tile_coords):
-        return target_tile_coords in self.obstacle_tiles
+        return self.nav_grid.is_blocked(target_tile_coords)
+
+    def set_pathfinding_algorithm(self, algo_name):
+        """Đổi thuật toán tìm đường theo tên trong PATHFINDING_ALGORITHMS và bỏ đường đi hiện tại."""
+        self.pathfinding_func = PATHFINDING_ALGORITHMS[algo_name]
+        self.current_algorithm_name_str = algo_name
+        planner_class = STATEFUL_PLANNERS.get(algo_name)
+        self.path_planner = planner_class(self.nav_grid) if planner_class else None
+        if self.path_job is not None:
+            self.path_job.cancel()
+            self.path_job = None
+        self.recalculation_needed = True
+        self.path.clear()
+        self.next_step = None
+
+    def get_path_service(self):
+        """PathService của Level nếu đang chạy process pool và nhận được thuật toán hiện tại, ngược lại None."""
+        service = getattr(self.level_ref, 'path_service', None)
+        if service is not None and service.active and service.supports(self.current_algorithm_name_str):
+            return service
+        return None
+
+    def uses_path_jobs(self):
+        if self.path_planner is not None:
+            return False
+        return self.get_path_service() is not None or self.current_algorithm_name_str in RESUMABLE_SEARCHES
+
+    def start_path_job(self, target_tile):
+        """Gửi cho PathService nếu có, không thì tạo PathJob chạy dần trên luồng chính."""
+        service = self.get_path_service()
+        if service is not None:
+            uses_heuristic = getattr(self.pathfinding_func, '__name__', '') not in PATHFINDING_FUNCS_WITHOUT_HEURISTIC
+            return service.request(self.current_algorithm_name_str, self.get_tile_coords(), target_tile,
+                                   self.heuristic if uses_heuristic else None)
+        return PathJob(self.current_algorithm_name_str, self.get_tile_coords(), target_tile, self.nav_grid,
+                       self.heuristic)
+
+    def advance_path_job(self):
+        """Chạy tiếp job tìm đường; khi xong thì thay đường cũ bằng đường mới (bỏ các ô NPC đã đi qua)."""
+        job = self.path_job
+        if not job.advance():
+            return
+        self.path_job = None
+        self.last_path_calc_duration_ms = 0  # Mỗi frame chỉ tốn một phần nhỏ, không tính là chậm
+        PATHFINDING_PROFILER.record(self.npc_name, job.algo_name, job.stats)
+        if job.result:
+            new_path = deque(job.result)
+            current_tile = self.get_tile_coords()
+            if current_tile in new_path:
+                while new_path[0] != current_tile:
+                    new_path.popleft()
+            self.path = new_path
+            self.next_step = self.path.popleft() if self.path else None
+        else:
+            self.path.clear()
+            self.next_step = None
+            self.direction = Vector2()
+            self.recalculation_needed = True
+            if self.pursuing_lkp_info:
+                if self.pursuing_lkp_info['target_id'] in self.last_known_positions:
+                    del self.last_known_positions[self.pursuing_lkp_info['target_id']]
+                self.pursuing_lkp_info = None
 
     def target_tile_moved_significantly(self, new_target_tile):
         if self.last_target_tile_for_path is None or new_target_tile != self.last_target_tile_for_path:
             return True
         return False
 
-    def evaluate_guard_position(self, tile_coords, player_tile, nearby_enemies):
+    def evaluate_guard_position(self, tile_coords, player_tile, closest_enemy_to_player):
         score = 1000.0
         npc_pos_center = Vector2(tile_coords[0] * TILESIZE + TILESIZE // 2, tile_coords[1] * TILESIZE + TILESIZE // 2)
         player_pos_center = Vector2(player_tile[0] * TILESIZE + TILESIZE // 2,
@@ -309,25 +409,16 @@ class NPC(Entity):
             return -float('inf')
         score -= abs(dist_to_player - self.guard_ideal_dist_to_player) * 1.5
 
-        if nearby_enemies:
-            closest_enemy_to_player = None
-            min_dist_sq_to_player = float('inf')
-            for enemy in nearby_enemies:
-                if enemy and enemy.groups() and hasattr(enemy, 'hitbox'):
-                    dist_sq = player_pos_center.distance_squared_to(Vector2(enemy.hitbox.center))
-                    if dist_sq < min_dist_sq_to_player:
-                        min_dist_sq_to_player = dist_sq
-                        closest_enemy_to_player = enemy
-            if closest_enemy_to_player:
-                enemy_pos_center = Vector2(closest_enemy_to_player.hitbox.center)
-                vec_player_npc = npc_pos_center - player_pos_center
-                vec_player_enemy = enemy_pos_center - player_pos_center
-                if vec_player_npc.length_squared() > 0.1 and vec_player_enemy.length_squared() > 0.1:
-                    angle = vec_player_npc.angle_to(vec_player_enemy)
-                    if abs(angle) < 45:
-                        score += 200
-                    elif abs(angle) < 90:
-                        score += 100
+        if closest_enemy_to_player:
+            enemy_pos_center = Vector2(closest_enemy_to_player.hitbox.center)
+            vec_player_npc = npc_pos_center - player_pos_center
+            vec_player_enemy = enemy_pos_center - player_pos_center
+            if vec_player_npc.length_squared() > 0.1 and vec_player_enemy.length_squared() > 0.1:
+                angle = vec_player_npc.angle_to(vec_player_enemy)
+                if abs(angle) < 45:
+                    score += 200
+                elif abs(angle) < 90:
+                    score += 100
         open_neighbors = 0
         for dx_o in [-1, 0, 1]:
             for dy_o in [-1, 0, 1]:
@@ -374,10 +465,14 @@ class NPC(Entity):
                         if check_tile not in candidate_tiles:
                             candidate_tiles.append(check_tile)
         if not candidate_tiles: return None
+        # Quái gần người chơi nhất giống nhau với mọi ô ứng viên: chỉ tìm một lần
+        player_pos_center = (player_tile[0] * TILESIZE + TILESIZE // 2, player_tile[1] * TILESIZE + TILESIZE // 2)
+        closest_enemy_to_player = self.closest_enemy(player_pos_center, enemy_sprites_for_eval) \
+            if enemy_sprites_for_eval else None
         best_spot = None
         highest_score = -float('inf')
         for tile_candidate in candidate_tiles:
-            score = self.evaluate_guard_position(tile_candidate, player_tile, enemy_sprites_for_eval)
+            score = self.evaluate_guard_position(tile_candidate, player_tile, closest_enemy_to_player)
             if score > highest_score:
                 highest_score = score
                 best_spot = tile_candidate
@@ -395,11 +490,13 @@ class NPC(Entity):
 
         if self.level_ref and self.level_ref.partial_observability_enabled:
             visible_direct_targets = []
-            for entity in enemy_sprites:
-                if isinstance(entity, Enemy) and entity.groups() and self.can_see_target(entity):
-                    visible_direct_targets.append(entity)
-                    self.update_lkp(entity)
-                    self.target_is_visible = True
+            if isinstance(enemy_sprites, SpatialGrid):  # Chỉ quái trong tầm nhìn mới có thể thấy được
+                enemy_sprites = enemy_sprites.query_radius(self.hitbox.center, self.sight_radius)
+            candidates = [entity for entity in enemy_sprites if isinstance(entity, Enemy) and entity.groups()]
+            for entity in self.filter_line_of_sight(candidates):
+                visible_direct_targets.append(entity)
+                self.update_lkp(entity)
+                self.target_is_visible = True
 
             player_visible_this_frame = False
             if self.player and self.player.groups() and self.can_see_target(self.player):
@@ -444,9 +541,7 @@ class NPC(Entity):
                     self.current_target_entity = None
                     current_base_status = 'move'
                     if self.get_tile_coords() == self.pursuing_lkp_info['tile']:
-                        lkp_target_instance = self.player if best_lkp_target_id == 'player' else \
-                            next((s for s in (self.level_ref.attackable_sprites if self.level_ref else []) if
-                                  self.get_target_id(s) == best_lkp_target_id), None)
+                        lkp_target_instance = self.find_target_by_id(best_lkp_target_id)
                         if lkp_target_instance and self.can_see_target(lkp_target_instance):
                             self.current_target_entity = lkp_target_instance
                             self.target_is_visible = True
@@ -471,16 +566,9 @@ class NPC(Entity):
                 self.pursuing_lkp_info = None
         else:
             target_selected_for_omni_mode = None
-            min_dist_sq_omni = float('inf')
-            my_pos = Vector2(self.hitbox.center)
 
             if self.is_hunting_all_enemies and enemy_sprites:
-                for enemy in enemy_sprites:
-                    if enemy and enemy.groups() and hasattr(enemy, 'hitbox') and enemy != self:
-                        dist_sq = my_pos.distance_squared_to(Vector2(enemy.hitbox.center))
-                        if dist_sq < min_dist_sq_omni:
-                            min_dist_sq_omni = dist_sq
-                            target_selected_for_omni_mode = enemy
+                target_selected_for_omni_mode = self.closest_enemy(self.hitbox.center, enemy_sprites)
 
             if not target_selected_for_omni_mode and self.player and self.player.groups():
                 if not self.is_hunting_all_enemies or self.can_guard_player:
@@ -721,9 +809,6 @@ class NPC(Entity):
             if not self.path_history or self.path_history[-1] != current_center_tuple:
                 self.path_history.append(current_center_tuple)
                 self.last_path_record_time = current_time
-                # ----- THÊM DÒNG PRINT Ở ĐÂY -----
-                print(f"NPC {self.npc_name} tại {self.rect.topleft}: path_history cập nhật, độ dài: {len(self.path_history)}, điểm cuối: {current_center_tuple if self.path_history else 'N/A'}")
-                # ----- KẾT THÚC DÒNG PRINT -----
         # --- KẾT THÚC GHI DẤU VẾT ---
 
         self.direction = original_entity_direction
@@ -732,26 +817,71 @@ class NPC(Entity):
         if not target_entity or not hasattr(target_entity, 'hitbox') or target_entity.hitbox is None: return False
         dist_vec = Vector2(target_entity.hitbox.center) - Vector2(self.hitbox.center)
         distance = dist_vec.length()
-        return distance <= self.sight_radius
+        if distance > self.sight_radius: return False
+        if self.sight_angle is None or distance <= self.awareness_radius or \
+                self.facing_direction.length_squared() == 0: return True
+        angle = abs((self.facing_direction.angle_to(dist_vec) + 180) % 360 - 180)  # Góc lệch so với hướng nhìn, 0..180
+        return angle <= self.sight_angle / 2
+
+    def get_visible_tiles(self):
+        """
+        Tập ô nhìn thấy được từ ô hiện tại (symmetric shadowcasting trong hình nón của góc nhìn).
+        Chỉ tính lại khi NPC đổi ô, hướng nhìn đổi sang octant khác hoặc lưới đi được thay đổi.
+        """
+        octant = facing_octant(self.facing_direction) \
+            if self.sight_angle is not None and self.facing_direction.length_squared() > 0 else None
+        key = (self.get_tile_coords(), octant, self.nav_grid.version)
+        if key != self.visible_tiles_key:
+            # Cộng một ô vì NPC và mục tiêu không đứng ở tâm ô
+            max_depth = math.ceil(self.sight_radius / TILESIZE) + 1
+            near_depth = math.ceil(self.awareness_radius / TILESIZE) + 1
+            self.visible_tiles = compute_fov(self.nav_grid, key[0], max_depth, octant, self.sight_angle, near_depth)
+            self.visible_tiles_key = key
+        return self.visible_tiles
 
     def has_line_of_sight(self, target_entity):
         if not target_entity or not hasattr(target_entity, 'hitbox') or target_entity.hitbox is None: return False
-        start_pos = Vector2(self.hitbox.center)
-        end_pos = Vector2(target_entity.hitbox.center)
-        direction_vector = end_pos - start_pos
-        distance = direction_vector.length()
-        if distance == 0: return True
-        num_steps = int(distance / (TILESIZE / 4))
-        if num_steps == 0: num_steps = 1
-        for i in range(1, num_steps + 1):
-            t = i / num_steps
-            current_point_on_line = start_pos.lerp(end_pos, t)
-            point_tile = self.get_tile_coords_from_pos(current_point_on_line)
-            if point_tile in self.obstacle_tiles:
-                target_tile = self.get_tile_coords_from_pos(end_pos)
-                if point_tile == target_tile and i == num_steps: continue
-                return False
-        return True
+        pvs = self.get_pvs()
+        if pvs is not None:
+            visible = pvs.can_see(self.hitbox.center, target_entity.hitbox.center)
+            if visible is not None:
+                return visible
+        return has_line_of_sight(self.nav_grid, self.hitbox.center, target_entity.hitbox.center)
+
+    def get_pvs(self):
+        """Bảng tầm nhìn tính sẵn của Level, nếu nó được dựng cho đúng lưới NPC đang dùng."""
+        pvs = getattr(self.level_ref, 'pvs', None)
+        return pvs if pvs is not None and pvs.grid is self.nav_grid else None
+
+    def filter_line_of_sight(self, target_entities):
+        """
+        Các thực thể (đã có hitbox) mà NPC nhìn thấy, giữ nguyên thứ tự.
+        Tra bảng tầm nhìn tính sẵn (PVS) trước, một bit cho mỗi mục tiêu; mục tiêu bảng cho là thấy được còn phải nằm
+        trong bán kính/góc nhìn (is_in_fov). Mục tiêu bảng không trả lời được (ngoài cửa sổ, lưới vừa đổi gần đó,
+        không có bảng) thì dùng trường nhìn shadowcasting (NPC_FOV_ENABLED) hoặc duyệt tia cả nhóm trong một lần gọi.
+        """
+        if not target_entities: return []
+        pvs = self.get_pvs()
+        center = self.hitbox.center
+        sight = []
+        unknown = []
+        for entity in target_entities:
+            visible = pvs.can_see(center, entity.hitbox.center) if pvs is not None else None
+            if visible is not False and not self.is_in_fov(entity):
+                visible = False
+            if visible is None:
+                unknown.append(len(sight))
+            sight.append(visible)
+        if unknown:
+            if NPC_FOV_ENABLED:
+                visible_tiles = self.get_visible_tiles()
+                for i in unknown:
+                    sight[i] = self.get_tile_coords(target_entities[i].hitbox.center) in visible_tiles
+            else:
+                traced = lines_of_sight(self.nav_grid, center, [target_entities[i].hitbox.center for i in unknown])
+                for i, visible in zip(unknown, traced):
+                    sight[i] = visible
+        return [entity for entity, visible in zip(target_entities, sight) if visible]
 
     def can_see_target(self, target_entity):
         if not self.level_ref or not self.level_ref.partial_observability_enabled:
@@ -759,9 +889,8 @@ class NPC(Entity):
             dist_vec = Vector2(target_entity.hitbox.center) - Vector2(self.hitbox.center)
             return dist_vec.length() <= self.notice_radius
 
-        if not self.is_in_fov(target_entity): return False
-        if not self.has_line_of_sight(target_entity): return False
-        return True
+        if not target_entity or not hasattr(target_entity, 'hitbox') or target_entity.hitbox is None: return False
+        return bool(self.filter_line_of_sight([target_entity]))
 
     def update_lkp(self, target_entity):
         if not target_entity or not hasattr(target_entity, 'hitbox'): return
@@ -912,13 +1041,7 @@ class NPC(Entity):
                 self.recalculation_needed = True
                 return
 
-            lkp_target_id = self.pursuing_lkp_info['target_id']
-            lkp_target_instance = None
-            if lkp_target_id == 'player':
-                lkp_target_instance = self.player
-            elif self.level_ref and hasattr(self.level_ref, 'attackable_sprites'):
-                lkp_target_instance = next(
-                    (s for s in self.level_ref.attackable_sprites if self.get_target_id(s) == lkp_target_id), None)
+            lkp_target_instance = self.find_target_by_id(self.pursuing_lkp_info['target_id'])
 
             if lkp_target_instance and self.can_see_target(lkp_target_instance):
                 self.current_target_entity = lkp_target_instance
@@ -939,7 +1062,9 @@ class NPC(Entity):
                     offset = self.lkp_search_pattern_points[self.current_lkp_search_index]
                     potential_sub_tile = (self.original_lkp_search_tile[0] + offset[0],
                                           self.original_lkp_search_tile[1] + offset[1])
-                    if self.is_walkable(potential_sub_tile):
+                    # Ô đang nằm trong trường nhìn mà không thấy mục tiêu thì không cần tới tận nơi
+                    if self.is_walkable(potential_sub_tile) and \
+                            not (NPC_FOV_ENABLED and potential_sub_tile in self.get_visible_tiles()):
                         self.next_lkp_search_sub_tile = potential_sub_tile
                     self.current_lkp_search_index += 1
                     self.path.clear()
@@ -1050,6 +1175,20 @@ class NPC(Entity):
                                  )
                                 )
 
+            if needs_recalc_now and self.uses_path_jobs() and \
+                    not self.check_target_tile_on_obstacle(pathfinding_target_tile):
+                # Tìm ở tiến trình con hoặc tìm dần qua nhiều frame; NPC vẫn đi theo đường cũ cho tới khi có đường mới
+                needs_recalc_now = False
+                if self.path_job is None or self.path_job.goal != pathfinding_target_tile:
+                    if self.path_job is not None:
+                        self.path_job.cancel()
+                    self.last_target_tile_for_path = pathfinding_target_tile
+                    self.recalculation_needed = False
+                    self.last_path_time = current_time
+                    self.path_job = self.start_path_job(pathfinding_target_tile)
+            if self.path_job is not None:
+                self.advance_path_job()
+
             if needs_recalc_now:
                 self.last_target_tile_for_path = pathfinding_target_tile
                 target_tile_on_obstacle = self.check_target_tile_on_obstacle(pathfinding_target_tile)
@@ -1065,20 +1204,19 @@ class NPC(Entity):
                     algo_display_name = self.current_algorithm_name_str
                     is_complex_algo_for_timing = algo_display_name in ['Backtracking', 'Forward Checking BS']
 
-                    time_before_pf_action = pygame.time.get_ticks()
+                    search_stats = SearchStats()
                     try:
                         func_name_for_call = getattr(self.pathfinding_func, '__name__', 'unknown')
-                        if func_name_for_call in ['bfs_pathfinding',
-                                                  'dfs_pathfinding',
-                                                  'ucs_pathfinding',
-                                                  'backtracking_pathfinding',
-                                                  'forward_checking_backtracking_pathfinding'
-                                                  ]:
+                        if self.path_planner is not None:
+                            calculated_path = self.path_planner.plan(start_tile, pathfinding_target_tile,
+                                                                     stats=search_stats)
+                        elif func_name_for_call in PATHFINDING_FUNCS_WITHOUT_HEURISTIC:
                             calculated_path = self.pathfinding_func(start_tile, pathfinding_target_tile,
-                                                                    self.is_walkable)
+                                                                    self.nav_grid, stats=search_stats)
                         else:
                             calculated_path = self.pathfinding_func(start_tile, pathfinding_target_tile,
-                                                                    self.is_walkable, heuristic_func=self.heuristic)
+                                                                    self.nav_grid, heuristic_func=self.heuristic,
+                                                                    stats=search_stats)
 
                         if calculated_path and isinstance(calculated_path, deque):
                             self.path = calculated_path
@@ -1095,8 +1233,8 @@ class NPC(Entity):
                         if self.pursuing_lkp_info:
                             self.pursuing_lkp_info = None
 
-                    time_after_pf_action = pygame.time.get_ticks()
-                    self.last_path_calc_duration_ms = time_after_pf_action - time_before_pf_action
+                    self.last_path_calc_duration_ms = round(search_stats.duration_ms)
+                    PATHFINDING_PROFILER.record(self.npc_name, algo_display_name, search_stats)
 
                     if (is_complex_algo_for_timing and
                             (self.last_path_calc_duration_ms > PERFORMANCE_LIMIT_MS or
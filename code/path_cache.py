@@ -0,0 +1,127 @@
+# path_cache.py
+# Bộ đệm LRU cho kết quả tìm đường, tự xoá khi lưới đi được (NavGrid) thay đổi.
+from collections import OrderedDict
+from copy import copy
+import functools
+import inspect
+
+from settings import PATH_CACHE_SIZE
+from nav_grid import NavGrid
+from grid_components import get_components
+
+MISSING = object()  # get() trả về giá trị này khi không có mục (None là kết quả hợp lệ: không có đường)
+
+
+class PathCache:
+    """
+    Lưu đường đi theo khoá (tên thuật toán, ô bắt đầu, ô đích, tham số thêm), giới hạn số mục theo LRU.
+    Chỉ dùng cho thuật toán tất định và tìm trọn vẹn: kết quả phụ thuộc ngân sách thời gian hay số ngẫu nhiên thì không lưu.
+    Toàn bộ mục bị xoá khi (id lưới, NavGrid.version) khác lần trước, nên không bao giờ trả về đường đi qua vật cản mới.
+    Kết quả None (không có đường) cũng được lưu vì đó thường là lần tìm tốn kém nhất.
+    """
+
+    def __init__(self, max_entries=PATH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.grid_token = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def sync(self, grid):
+        """Xoá bộ đệm nếu lưới hoặc phiên bản lưới đã đổi."""
+        token = (id(grid), grid.version)
+        if token != self.grid_token:
+            if self.entries:
+                self.entries.clear()
+                self.invalidations += 1
+            self.grid_token = token
+
+    def get(self, key):
+        path = self.entries.get(key, MISSING)
+        if path is MISSING:
+            self.misses += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return copy(path)  # Người gọi popleft() trên đường đi nên luôn trả bản sao
+
+    def put(self, key, path):
+        self.entries[key] = copy(path)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.grid_token = None
+
+    @staticmethod
+    def make_key(name, signature, start_node, end_node, is_walkable_func, args=(), kwargs=None, ignored=('stats',)):
+        """
+        Khoá của một lần gọi: mọi tham số thêm đều thuộc khoá (trừ stats, chỉ dùng để đo). Tham số được gắn theo chữ ký
+        của hàm, kể cả giá trị mặc định, nên truyền theo vị trí hay theo tên, ghi rõ hay bỏ trống giá trị mặc định đều
+        cho cùng một khoá. Tham số trong ignored (mặc định chỉ stats) không thuộc khoá. None nếu lời gọi không hợp chữ ký hoặc có tham số không băm được - khi đó không dùng bộ đệm.
+        """
+        try:
+            bound = signature.bind(start_node, end_node, is_walkable_func, *args, **(kwargs or {}))
+        except TypeError:
+            return None
+        bound.apply_defaults()
+        options = tuple((param, value) for param, value in list(bound.arguments.items())[3:] if param not in ignored)
+        key = (name, start_node, end_node, options)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def cached(self, name, func, ignored=('stats',)):
+        """
+        Bọc một hàm tìm đường. Chỉ lưu khi is_walkable_func là NavGrid (có version để biết lúc nào hết hạn).
+        Với NavGrid, ô bắt đầu và ô đích ở hai vùng liên thông khác nhau thì trả về None ngay, không tìm và không lưu.
+        Lần gọi trúng bộ đệm cộng stats.cache_hits (nếu có stats=) thay vì số nút mở rộng.
+        wrapper.cache_key(start_node, end_node, is_walkable_func, ...) trả về khoá mà lời gọi tương ứng dùng, để PathJob
+        và PathService tra/lưu cùng một mục.
+        """
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(start_node, end_node, is_walkable_func, *args, **kwargs):
+            if isinstance(is_walkable_func, NavGrid) and \
+                    not get_components(is_walkable_func).connected(start_node, end_node):
+                return None
+            if not isinstance(is_walkable_func, NavGrid) or self.max_entries <= 0:
+                return func(start_node, end_node, is_walkable_func, *args, **kwargs)
+            key = self.make_key(name, signature, start_node, end_node, is_walkable_func, args, kwargs, ignored)
+            if key is None:
+                return func(start_node, end_node, is_walkable_func, *args, **kwargs)
+            self.sync(is_walkable_func)
+            path = self.get(key)
+            if path is MISSING:
+                path = func(start_node, end_node, is_walkable_func, *args, **kwargs)
+                self.put(key, path)
+            elif kwargs.get('stats') is not None:
+                kwargs['stats'].cache_hits += 1
+            return path
+
+        def cache_key(start_node, end_node, is_walkable_func, *args, **kwargs):
+            return self.make_key(name, signature, start_node, end_node, is_walkable_func, args, kwargs, ignored)
+
+        wrapper.cache_key = cache_key
+        wrapper.signature = signature
+        return wrapper
+
+    # --- THỐNG KÊ ---
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
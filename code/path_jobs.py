@@ -0,0 +1,90 @@
+# path_jobs.py
+# Tìm đường chạy dần qua nhiều frame: mỗi tick chỉ mở rộng một số nút cố định rồi dừng, tick sau chạy tiếp.
+import time
+
+from nav_grid import NavGrid
+from path_cache import MISSING
+from grid_components import get_components
+from settings import PATHFINDING_NODE_BUDGET_PER_TICK
+from pathfinding_algorithms import RESUMABLE_SEARCHES, PATH_CACHE, SearchStats, path_cache_key
+
+
+class PathJob:
+    """
+    Một lần tìm đường bằng một thuật toán trong RESUMABLE_SEARCHES (generator *_search_steps).
+    Mỗi advance() mở rộng khoảng node_budget nút (theo stats.expansions; một bước của generator tính ít nhất một nút,
+    bước gộp nhiều nút như một lớp BFS bitboard hay một pha HPA* tính đủ số nút của nó, có thể vượt ngân sách một bước);
+    kết quả dùng chung PATH_CACHE với các lần gọi đồng bộ.
+    self.stats cộng dồn số nút và thời gian của mọi lần advance() (trúng bộ đệm thì searches = 0).
+    """
+
+    def __init__(self, algo_name, start_node, end_node, grid, heuristic_func=None):
+        self.algo_name = algo_name
+        self.start = start_node
+        self.goal = end_node
+        self.grid = grid
+        self.heuristic_func = heuristic_func
+        self.done = False
+        self.result = None
+        self.expansions = 0
+        self.ticks = 0
+        self.search_steps = None
+        self.stats = SearchStats()
+
+        search_factory = RESUMABLE_SEARCHES[algo_name]
+        # Cùng khoá với lần gọi đồng bộ có cùng tham số; None với thuật toán không dùng bộ đệm
+        self.cache_key = path_cache_key(algo_name, start_node, end_node, grid, heuristic_func)
+        if isinstance(grid, NavGrid):
+            if not get_components(grid).connected(start_node, end_node):
+                self._finish(None, store=False)  # Khác vùng liên thông: chắc chắn không có đường
+                return
+            if self.cache_key is not None:
+                PATH_CACHE.sync(grid)
+                cached_path = PATH_CACHE.get(self.cache_key)
+                if cached_path is not MISSING:
+                    self.stats.cache_hits += 1
+                    self._finish(cached_path, store=False)
+                    return
+        self.grid_version = getattr(grid, 'version', None)
+        self.stats.searches = 1
+        if heuristic_func is not None:
+            self.search_steps = search_factory(start_node, end_node, grid, heuristic_func, stats=self.stats)
+        else:  # Dùng heuristic mặc định của từng thuật toán
+            self.search_steps = search_factory(start_node, end_node, grid, stats=self.stats)
+
+    def advance(self, node_budget=PATHFINDING_NODE_BUDGET_PER_TICK):
+        """Chạy tiếp tối đa node_budget nút. Trả về True khi job đã xong (kết quả ở self.result)."""
+        if self.done:
+            return True
+        self.ticks += 1
+        started = time.perf_counter_ns()
+        stats = self.stats
+        spent = 0
+        try:
+            while spent < node_budget:
+                expansions_before = stats.expansions
+                try:
+                    next(self.search_steps)
+                except StopIteration as finished:
+                    self._finish(finished.value, store=True)
+                    return True
+                step_expansions = max(1, stats.expansions - expansions_before)
+                spent += step_expansions
+                self.expansions += step_expansions
+            return False
+        finally:
+            self.stats.duration_ns += time.perf_counter_ns() - started
+
+    def cancel(self):
+        if self.search_steps is not None:
+            self.search_steps.close()
+        self.done = True
+
+    def _finish(self, result, store):
+        self.result = result
+        self.done = True
+        # Chỉ lưu nếu lưới không đổi trong lúc job chạy dở
+        if store and self.cache_key is not None and isinstance(self.grid, NavGrid) and \
+                self.grid.version == self.grid_version:
+            PATH_CACHE.sync(self.grid)
+            PATH_CACHE.put(self.cache_key, result)
@@ -0,0 +1,254 @@
+# path_service.py
+# Dịch vụ tìm đường chạy trên một nhóm tiến trình (process pool) để luồng chính của pygame không phải trả chi phí tìm kiếm.
+# Lưới đi được nằm trong multiprocessing.shared_memory: tiến trình con đọc trực tiếp, không pickle lại tập vật cản.
+import atexit
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+
+from settings import PATH_SERVICE_ENABLED, PATH_SERVICE_WORKERS, PATH_SERVICE_WARM_UP_TIMEOUT
+from nav_grid import NavGrid
+from grid_components import get_components
+from path_cache import MISSING
+from pathfinding_algorithms import PATHFINDING_ALGORITHMS, UNCACHED_ALGORITHMS, STATEFUL_PLANNERS, PATH_CACHE, \
+    SearchStats, path_cache_key, get_search_engine
+from bitboard import get_bitboard
+
+# --- PHÍA TIẾN TRÌNH CON ---
+_worker_grid = None
+_worker_memory = None
+
+
+def _init_worker(memory_name, width, height, tilesize):
+    """Chạy một lần trong mỗi tiến trình con: gắn NavGrid vào vùng nhớ dùng chung (không sao chép)."""
+    global _worker_grid, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_grid = NavGrid(width, height, tilesize)
+    _worker_grid.blocked = _worker_memory.buf[:width * height]
+
+
+def _warm_up_worker():
+    """Việc rỗng để tiến trình con khởi động sẵn và dựng trước engine mảng/bitboard cho lưới của nó."""
+    get_search_engine(_worker_grid)
+    get_bitboard(_worker_grid)
+    return os.getpid()
+
+
+def _find_path_in_worker(algo_name, start_node, end_node, grid_version, heuristic_func):
+    """
+    Tìm đường trong tiến trình con. grid_version được gán cho lưới cục bộ để bộ đệm/bitboard/đồ thị cụm
+    của tiến trình con tự dựng lại khi lưới ở tiến trình chính đã đổi. SearchStats được gửi về cùng đường đi.
+    Chạy hàm không qua PATH_CACHE: bộ đệm nằm ở tiến trình chính (PathService.request tra trước khi gửi).
+    """
+    grid = _worker_grid
+    grid.version = grid_version
+    func = UNCACHED_ALGORITHMS[algo_name]
+    stats = SearchStats()
+    if heuristic_func is not None:
+        path = func(start_node, end_node, grid, heuristic_func=heuristic_func, stats=stats)
+    else:
+        path = func(start_node, end_node, grid, stats=stats)
+    return grid_version, path, stats
+
+
+# --- PHÍA TIẾN TRÌNH CHÍNH ---
+class PathRequest:
+    """
+    Một yêu cầu tìm đường gửi cho PathService. Có cùng giao diện với PathJob (start, goal, done, result,
+    advance(), cancel()) để NPC/Enemy dùng chung một nhánh xử lý; kết quả do PathService.poll() điền vào.
+    """
+
+    def __init__(self, service, request_id, algo_name, start_node, end_node, heuristic_func=None):
+        self.service = service
+        self.request_id = request_id
+        self.algo_name = algo_name
+        self.start = start_node
+        self.goal = end_node
+        self.heuristic_func = heuristic_func
+        self.done = False
+        self.result = None
+        self.stats = SearchStats()  # Số liệu của lần tìm cuối (ở tiến trình con hoặc trên luồng chính)
+        self.cache_key = None  # Khoá PATH_CACHE của lời gọi đồng bộ tương ứng (None: không dùng bộ đệm)
+        self.grid_version = None  # Phiên bản lưới lúc gửi đi
+
+    def advance(self, node_budget=None):
+        """Không làm gì thêm (việc tìm kiếm ở tiến trình khác). Trả về True khi đã có kết quả."""
+        return self.done
+
+    def cancel(self):
+        self.service.cancel(self.request_id)
+        self.done = True
+
+    def _finish(self, result):
+        self.result = result
+        self.done = True
+
+
+class PathService:
+    """
+    Gửi yêu cầu tìm đường cho các tiến trình con và trả kết quả về theo request id.
+    PATH_CACHE được tra trước khi gửi và nhận kết quả sau khi về, đều ở tiến trình chính: lần trúng không rời tiến trình này.
+    Mỗi yêu cầu mang theo NavGrid.version lúc gửi; kết quả tính trên phiên bản lưới cũ bị bỏ và tự gửi lại.
+    Nếu bị tắt trong settings hoặc không tạo được process pool, mọi yêu cầu được tìm ngay trên luồng chính.
+    """
+
+    def __init__(self, grid, workers=PATH_SERVICE_WORKERS, enabled=PATH_SERVICE_ENABLED):
+        self.grid = grid
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.pending = {}  # request id -> (PathRequest, Future)
+        self.request_ids = itertools.count()
+        self.synced_version = -1
+        self.memory = None
+        self.pool = None
+        self.resubmitted = 0
+        if enabled:
+            self.start()
+
+    def start(self):
+        grid = self.grid
+        try:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(1, grid.size))
+            self._sync_grid()
+            # spawn: tiến trình con không kế thừa trạng thái pygame/SDL của tiến trình chính (và chạy được trên Windows)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'),
+                                            initializer=_init_worker,
+                                            initargs=(self.memory.name, grid.width, grid.height, grid.tilesize))
+        except (OSError, ValueError, NotImplementedError) as e:
+            print(f"PathService: không tạo được process pool ({e}), tìm đường trên luồng chính.")
+            self.shutdown()
+            return
+        atexit.register(self.shutdown)
+
+    def warm_up(self, timeout=PATH_SERVICE_WARM_UP_TIMEOUT):
+        """
+        Chờ mọi tiến trình con khởi động xong (gọi lúc tải màn, ví dụ Level.create_map).
+        ProcessPoolExecutor chỉ tạo tiến trình khi có việc, nên nếu không làm vậy frame gửi yêu cầu đầu tiên sẽ phải
+        chờ khởi động cả nhóm tiến trình spawn. Gửi liền một loạt việc rỗng để mỗi tiến trình nhận một việc.
+        """
+        if not self.active:
+            return
+        try:
+            futures = [self.pool.submit(_warm_up_worker) for _ in range(self.workers)]
+        except (BrokenProcessPool, RuntimeError) as e:
+            print(f"PathService: process pool lỗi ({e}), chuyển sang tìm đường trên luồng chính.")
+            self.shutdown()
+            return
+        done, _ = wait(futures, timeout=timeout)
+        errors = [future.exception() for future in done if future.exception() is not None]
+        if errors:
+            print(f"PathService: process pool lỗi ({errors[0]}), chuyển sang tìm đường trên luồng chính.")
+            self.shutdown()
+
+    @property
+    def active(self):
+        return self.pool is not None
+
+    def supports(self, algo_name):
+        """Planner có trạng thái (D* Lite) phải ở lại tiến trình chính."""
+        return algo_name in PATHFINDING_ALGORITHMS and algo_name not in STATEFUL_PLANNERS
+
+    def _sync_grid(self):
+        """Chép lưới vào vùng nhớ dùng chung nếu đã đổi kể từ lần chép trước."""
+        if self.synced_version != self.grid.version:
+            self.memory.buf[:self.grid.size] = self.grid.blocked
+            self.synced_version = self.grid.version
+
+    # --- GỬI / NHẬN ---
+    def request(self, algo_name, start_node, end_node, heuristic_func=None):
+        request = PathRequest(self, next(self.request_ids), algo_name, start_node, end_node, heuristic_func)
+        if not get_components(self.grid).connected(start_node, end_node):
+            request._finish(None)  # Khác vùng liên thông: trả lời ngay, không gửi sang tiến trình con
+            return request
+        request.cache_key = path_cache_key(algo_name, start_node, end_node, self.grid, heuristic_func)
+        if request.cache_key is not None:
+            PATH_CACHE.sync(self.grid)
+            cached_path = PATH_CACHE.get(request.cache_key)
+            if cached_path is not MISSING:
+                request.stats.cache_hits += 1
+                request._finish(cached_path)
+                return request
+        if self.active:
+            self._submit(request)
+        else:
+            self._run_locally(request)
+        return request
+
+    def _submit(self, request):
+        self._sync_grid()
+        request.grid_version = self.grid.version
+        try:
+            future = self.pool.submit(_find_path_in_worker, request.algo_name, request.start, request.goal,
+                                      self.grid.version, request.heuristic_func)
+        except (BrokenProcessPool, RuntimeError) as e:
+            print(f"PathService: process pool lỗi ({e}), chuyển sang tìm đường trên luồng chính.")
+            self.shutdown()
+            self._run_locally(request)
+            return
+        self.pending[request.request_id] = (request, future)
+
+    def _run_locally(self, request):
+        func = UNCACHED_ALGORITHMS[request.algo_name]
+        request.grid_version = self.grid.version
+        if request.heuristic_func is not None:
+            path = func(request.start, request.goal, self.grid, heuristic_func=request.heuristic_func,
+                        stats=request.stats)
+        else:
+            path = func(request.start, request.goal, self.grid, stats=request.stats)
+        self._store(request, path)
+        request._finish(path)
+
+    def _store(self, request, path):
+        """Lưu kết quả vào PATH_CACHE nếu thuật toán dùng bộ đệm và lưới không đổi kể từ lúc tìm."""
+        if request.cache_key is not None and request.grid_version == self.grid.version:
+            PATH_CACHE.sync(self.grid)
+            PATH_CACHE.put(request.cache_key, path)
+
+    def poll(self):
+        """Gọi mỗi frame: chuyển kết quả đã xong về PathRequest tương ứng."""
+        for request_id, (request, future) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[request_id]
+            try:
+                grid_version, path, stats = future.result()
+            except BrokenProcessPool as e:
+                print(f"PathService: process pool lỗi ({e}), chuyển sang tìm đường trên luồng chính.")
+                self.shutdown()
+                self._run_locally(request)
+                continue
+            except Exception as e:
+                print(f"Lỗi pathfinding ({request.algo_name}) ở tiến trình con: {e}")
+                request._finish(None)
+                continue
+            if grid_version != self.grid.version:
+                # Lưới đã đổi trong lúc tìm: đường có thể đi qua vật cản mới, gửi lại với cùng request id
+                self.resubmitted += 1
+                if self.active:
+                    self._submit(request)
+                else:
+                    self._run_locally(request)
+                continue
+            request.stats = stats
+            self._store(request, path)
+            request._finish(path)
+
+    def cancel(self, request_id):
+        entry = self.pending.pop(request_id, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+        # Các yêu cầu còn dở được tìm nốt trên luồng chính để người gọi không chờ mãi
+        pending = list(self.pending.values())
+        self.pending.clear()
+        for request, _ in pending:
+            self._run_locally(request)
@@ -1,8 +1,17 @@
 # pathfinding_algorithms.py
 from collections import deque
+import functools
 import heapq
 import math
 import random
+import time
+import weakref
+from settings import BACKTRACKING_NODE_BUDGET, BACKTRACKING_TIME_BUDGET_MS
+from nav_grid import NavGrid
+from path_cache import PathCache
+from hpa_star import get_cluster_graph
+from bitboard import get_bitboard
+from grid_components import get_components
 
 
 # --- CÁC HÀM HEURISTIC ---
@@ -23,6 +32,57 @@ def heuristic_euclidean(a, b):
     return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2)
 
 
+# --- SỐ LIỆU TÌM KIẾM ---
+class SearchStats:
+    """
+    Số liệu của các lần tìm đường, truyền vào qua tham số stats= của các hàm tìm đường (mặc định None: không đo).
+    Hàm tìm đường cộng dồn vào đối tượng, nên có thể dùng một SearchStats cho nhiều lần gọi.
+    Lần gọi trúng PATH_CACHE không chạy tìm kiếm nên chỉ cộng cache_hits (searches vẫn bằng 0).
+    """
+
+    def __init__(self):
+        self.searches = 0  # Số lần thực sự chạy tìm kiếm
+        self.expansions = 0  # Số nút được mở rộng (lấy ra khỏi tập mở và xét các ô kề)
+        self.peak_open = 0  # Kích thước lớn nhất của tập mở (heap / hàng đợi / ngăn xếp / beam)
+        self.neighbors = 0  # Số ô kề đi được đã sinh ra
+        self.duration_ns = 0  # Tổng thời gian tìm (time.perf_counter_ns)
+        self.cache_hits = 0  # Số lần gọi được trả lời từ PATH_CACHE
+        self.measuring = False  # Đang trong một lần đo của measured(); lời gọi lồng nhau không đo lại
+
+    def expand(self, open_size, neighbor_count):
+        """Ghi nhận một nút được mở rộng khi tập mở có open_size phần tử và sinh ra neighbor_count ô kề."""
+        self.expansions += 1
+        self.neighbors += neighbor_count
+        if open_size > self.peak_open:
+            self.peak_open = open_size
+
+    @property
+    def duration_ms(self):
+        return self.duration_ns / 1_000_000
+
+
+def measured(func):
+    """
+    Bọc một hàm tìm đường: khi được gọi kèm stats= thì đo thời gian bằng perf_counter_ns và đếm một lần tìm.
+    Hàm bên trong vẫn nhận stats để tự ghi số nút; lời gọi lồng nhau (ví dụ dùng A* dự phòng) chỉ được đo một lần.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, stats=None, **kwargs):
+        if stats is None or stats.measuring:
+            return func(*args, stats=stats, **kwargs)
+        stats.measuring = True
+        stats.searches += 1
+        started = time.perf_counter_ns()
+        try:
+            return func(*args, stats=stats, **kwargs)
+        finally:
+            stats.duration_ns += time.perf_counter_ns() - started
+            stats.measuring = False
+
+    return wrapper
+
+
 # --- HÀM TIỆN ÍCH ---
 def get_neighbors(node, is_walkable_func, include_diagonals=True):
     """Lấy các ô hàng xóm hợp lệ của một ô."""
@@ -49,9 +109,32 @@ def reconstruct_path(came_from, current_node):
     return path
 
 
+def is_reachable(start_node, end_node, is_walkable_func):
+    """Có đường từ start_node tới end_node hay không (không dựng đường đi). Với NavGrid chỉ so nhãn vùng liên thông."""
+    if isinstance(is_walkable_func, NavGrid):
+        return get_components(is_walkable_func).connected(start_node, end_node)
+    return bfs_pathfinding(start_node, end_node, is_walkable_func) is not None
+
+
+def run_search_steps(search_steps):
+    """Chạy hết một generator tìm đường (các hàm *_search_steps) và trả về kết quả của nó."""
+    while True:
+        try:
+            next(search_steps)
+        except StopIteration as finished:
+            return finished.value
+
+
 # --- CÁC THUẬT TOÁN TÌM ĐƯỜNG CƠ BẢN ---
-def a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal):
+# Các hàm *_search_steps là generator: yield sau mỗi nút được mở rộng và return đường đi khi xong,
+# để PathJob (path_jobs.py) chạy dần qua nhiều frame. Hàm *_pathfinding tương ứng chạy hết trong một lần gọi.
+@measured
+def a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
     """Thuật toán A* (A-Star)."""
+    return run_search_steps(a_star_search_steps(start_node, end_node, is_walkable_func, heuristic_func, stats))
+
+
+def a_star_search_steps(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
     open_set = []  # Priority queue (min-heap)
     heapq.heappush(open_set, (heuristic_func(start_node, end_node) + 0, start_node))  # (f_cost, node)
     came_from = {start_node: None}  # Stores parent of each node in the path
@@ -63,18 +146,31 @@ def a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=he
         if current_node == end_node:
             return reconstruct_path(came_from, current_node)
 
-        for neighbor, move_cost in get_neighbors(current_node, is_walkable_func):
+        neighbors = get_neighbors(current_node, is_walkable_func)
+        if stats is not None:
+            stats.expand(len(open_set) + 1, len(neighbors))
+        for neighbor, move_cost in neighbors:
             tentative_g_cost = g_cost.get(current_node, float('inf')) + move_cost
             if tentative_g_cost < g_cost.get(neighbor, float('inf')):
                 came_from[neighbor] = current_node
                 g_cost[neighbor] = tentative_g_cost
                 f_cost_neighbor = tentative_g_cost + heuristic_func(neighbor, end_node)
                 heapq.heappush(open_set, (f_cost_neighbor, neighbor))
+        yield
     return None  # No path found
 
 
-def bfs_pathfinding(start_node, end_node, is_walkable_func):
-    """Thuật toán Breadth-First Search (BFS)."""
+@measured
+def bfs_pathfinding(start_node, end_node, is_walkable_func, stats=None):
+    """Thuật toán Breadth-First Search (BFS). Với NavGrid, mở rộng cả lớp một lúc bằng bitboard."""
+    return run_search_steps(bfs_search_steps(start_node, end_node, is_walkable_func, stats=stats))
+
+
+def bfs_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
+    """Với NavGrid, yield sau mỗi lớp BFS của bitboard; ngược lại yield sau mỗi nút như các hàm khác."""
+    if isinstance(is_walkable_func, NavGrid) and is_walkable_func.in_bounds(start_node) and \
+            is_walkable_func.in_bounds(end_node):
+        return (yield from get_bitboard(is_walkable_func).shortest_path_steps(start_node, end_node, stats))
     queue = deque([(start_node, deque([start_node]))])  # (current_node, path_to_current_node)
     visited = {start_node}
 
@@ -83,18 +179,26 @@ def bfs_pathfinding(start_node, end_node, is_walkable_func):
 
         if current_node == end_node:
             return path  # Path includes start_node
-
-        for neighbor_pos, _ in get_neighbors(current_node, is_walkable_func):
+        neighbors = get_neighbors(current_node, is_walkable_func)
+        if stats is not None:
+            stats.expand(len(queue) + 1, len(neighbors))
+        for neighbor_pos, _ in neighbors:
             if neighbor_pos not in visited:
                 visited.add(neighbor_pos)
                 new_path = path.copy()
                 new_path.append(neighbor_pos)
                 queue.append((neighbor_pos, new_path))
+        yield
     return None
 
 
-def dfs_pathfinding(start_node, end_node, is_walkable_func):
+@measured
+def dfs_pathfinding(start_node, end_node, is_walkable_func, stats=None):
     """Thuật toán Depth-First Search (DFS)."""
+    return run_search_steps(dfs_search_steps(start_node, end_node, is_walkable_func, stats=stats))
+
+
+def dfs_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
     stack = [(start_node, deque([start_node]))]  # (current_node, path_to_current_node)
     visited = {start_node}
 
@@ -105,17 +209,26 @@ def dfs_pathfinding(start_node, end_node, is_walkable_func):
             return path  # Path includes start_node
 
         # Reversed to explore in a more standard DFS order (e.g. up, left, down, right if neighbors are ordered that way)
-        for neighbor_pos, _ in reversed(get_neighbors(current_node, is_walkable_func)):
+        neighbors = get_neighbors(current_node, is_walkable_func)
+        if stats is not None:
+            stats.expand(len(stack) + 1, len(neighbors))
+        for neighbor_pos, _ in reversed(neighbors):
             if neighbor_pos not in visited:
                 visited.add(neighbor_pos)
                 new_path = path.copy()
                 new_path.append(neighbor_pos)
                 stack.append((neighbor_pos, new_path))
+        yield
     return None
 
 
-def ucs_pathfinding(start_node, end_node, is_walkable_func):
+@measured
+def ucs_pathfinding(start_node, end_node, is_walkable_func, stats=None):
     """Thuật toán Uniform Cost Search (UCS) - Tương tự Dijkstra."""
+    return run_search_steps(ucs_search_steps(start_node, end_node, is_walkable_func, stats=stats))
+
+
+def ucs_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
     open_set = []  # Priority queue (min-heap) for g_cost
     heapq.heappush(open_set, (0, start_node))  # (g_cost, node)
     came_from = {start_node: None}
@@ -131,19 +244,30 @@ def ucs_pathfinding(start_node, end_node, is_walkable_func):
         if current_g > g_cost.get(current_node, float('inf')):
             continue
 
-        for neighbor, move_cost in get_neighbors(current_node, is_walkable_func):
+        neighbors = get_neighbors(current_node, is_walkable_func)
+        if stats is not None:
+            stats.expand(len(open_set) + 1, len(neighbors))
+        for neighbor, move_cost in neighbors:
             tentative_g_cost = current_g + move_cost
             if tentative_g_cost < g_cost.get(neighbor, float('inf')):
                 came_from[neighbor] = current_node
                 g_cost[neighbor] = tentative_g_cost
                 heapq.heappush(open_set, (tentative_g_cost, neighbor))
+        yield
     return None
 
 
 # --- THUẬT TOÁN CSP: QUAY LUI (BACKTRACKING) ---
-def backtracking_pathfinding(start_node, end_node, is_walkable_func, max_depth=None):
-    """Thuật toán Quay lui (Backtracking) cho tìm đường, có giới hạn độ sâu."""
-
+def _backtracking_search_steps(start_node, end_node, is_walkable_func, max_depth, forward_checking,
+                               max_nodes, time_budget_ms, stats=None):
+    """
+    Quay lui dạng vòng lặp dùng chung cho Backtracking và Forward Checking (generator, yield sau mỗi 16 bước tiến/lùi).
+    Chỉ giữ một ngăn xếp đường đi (path/on_path) và hoàn tác khi quay lui thay vì sao chép deque/set ở mỗi nhánh.
+    Khi hết ngân sách nút hoặc thời gian, trả về đoạn đường đi tốt nhất đã gặp (gần đích nhất theo heuristic).
+    Ngân sách thời gian chỉ tính lúc generator đang chạy, nên chạy một lần hay chia qua nhiều frame đều như nhau.
+    """
+    if start_node == end_node:
+        return deque([start_node])
     if max_depth is None:
         estimated_distance = heuristic_diagonal(start_node, end_node)
         # Adjust multiplier and additive constant based on typical map sizes and complexity
@@ -151,96 +275,114 @@ def backtracking_pathfinding(start_node, end_node, is_walkable_func, max_depth=N
         # A higher additive constant gives more leeway for smaller maps.
         max_depth_calculated = int(estimated_distance * 2.5) + 30
         max_depth = max(30, min(max_depth_calculated, 750))  # Min 30 steps, Max 750 steps
-        # print(f"Backtracking: start={start_node}, end={end_node}, estimated_dist={estimated_distance:.2f}, calculated_max_depth={max_depth}")
-
-    def solve(current_node, current_path_deque, visited_on_current_branch_set):
-        if len(current_path_deque) > max_depth:
-            return None
-
-        if current_node == end_node:
-            return current_path_deque
 
+    def sorted_neighbors(node):
         # Sort neighbors by heuristic to potentially find path faster
-        sorted_neighbors = sorted(
-            get_neighbors(current_node, is_walkable_func),
-            key=lambda item: heuristic_diagonal(item[0], end_node)
-        )
-
-        for neighbor_pos, _ in sorted_neighbors:
-            if neighbor_pos not in visited_on_current_branch_set:
-                new_path_for_recursion = current_path_deque.copy()
-                new_path_for_recursion.append(neighbor_pos)
-                new_visited_for_recursion = visited_on_current_branch_set.copy()
-                new_visited_for_recursion.add(neighbor_pos)
-                found_path = solve(neighbor_pos, new_path_for_recursion, new_visited_for_recursion)
-                if found_path:
-                    return found_path
-        return None
-
-    initial_path = deque([start_node])
-    initial_visited_on_branch = {start_node}
-    if start_node == end_node: return initial_path
-    return solve(start_node, initial_path, initial_visited_on_branch)
-
-
-# --- THUẬT TOÁN CSP: QUAY LUI VỚI KIỂM TRA TIẾN (FORWARD CHECKING BACKTRACKING) ---
-def forward_checking_backtracking_pathfinding(start_node, end_node, is_walkable_func, max_depth=None):
-    """Thuật toán Quay lui với Kiểm tra Tiến, có giới hạn độ sâu."""
+        neighbors = sorted(get_neighbors(node, is_walkable_func), key=lambda item: heuristic_diagonal(item[0], end_node))
+        if stats is not None:
+            stats.expand(len(path), len(neighbors))  # Tập mở của quay lui là ngăn xếp đường đi
+        return iter(neighbors)
 
-    if max_depth is None:
-        estimated_distance = heuristic_diagonal(start_node, end_node)
-        max_depth_calculated = int(estimated_distance * 2.5) + 30
-        max_depth = max(30, min(max_depth_calculated, 750))
-    def check_forward(node_being_considered, path_if_node_is_chosen_set):
+    def check_forward(node_being_considered):
+        # node_being_considered đã nằm trong on_path (giống tập visited của nhánh nếu chọn ô này)
         if node_being_considered == end_node:
             return True
-        has_at_least_one_valid_forward_move = False
         for neighbor_of_considered, _ in get_neighbors(node_being_considered, is_walkable_func):
-            if neighbor_of_considered not in path_if_node_is_chosen_set:  # If neighbor is a valid next step
+            if neighbor_of_considered not in on_path:  # If neighbor is a valid next step
                 # Check if this neighbor itself has an escape route (not leading back to node_being_considered immediately or into path)
-                is_escape_for_neighbor = False
                 for escape_candidate, _ in get_neighbors(neighbor_of_considered, is_walkable_func):
-                    if escape_candidate != node_being_considered and escape_candidate not in path_if_node_is_chosen_set:
-                        is_escape_for_neighbor = True
-                        break
-                if is_escape_for_neighbor:
-                    has_at_least_one_valid_forward_move = True
-                    break
-        return has_at_least_one_valid_forward_move
-
-    def solve_fc(current_node, current_path_deque, visited_on_current_branch_set):
-        if len(current_path_deque) > max_depth:
-            return None
+                    if escape_candidate != node_being_considered and escape_candidate not in on_path:
+                        return True
+        return False
+
+    path = [start_node]
+    on_path = {start_node}
+    stack = [sorted_neighbors(start_node)]
+    best_path = None
+    best_distance = heuristic_diagonal(start_node, end_node)
+    time_budget = time_budget_ms / 1000 if time_budget_ms else None
+    spent = 0.0
+    resumed = time.perf_counter()
+    nodes = 0
+    iterations = 0
 
-        if current_node == end_node:
-            return current_path_deque
-
-        sorted_neighbors = sorted(
-            get_neighbors(current_node, is_walkable_func),
-            key=lambda item: heuristic_diagonal(item[0], end_node)
-        )
-
-        for neighbor_pos, _ in sorted_neighbors:
-            if neighbor_pos not in visited_on_current_branch_set:
-                path_if_neighbor_chosen_deque = current_path_deque.copy()
-                path_if_neighbor_chosen_deque.append(neighbor_pos)
-                visited_if_neighbor_chosen_set = visited_on_current_branch_set.copy()
-                visited_if_neighbor_chosen_set.add(neighbor_pos)
-
-                if check_forward(neighbor_pos, visited_if_neighbor_chosen_set):
-                    found_path = solve_fc(neighbor_pos, path_if_neighbor_chosen_deque, visited_if_neighbor_chosen_set)
-                    if found_path:
-                        return found_path
-        return None
+    while stack:
+        iterations += 1
+        if max_nodes and nodes >= max_nodes:
+            return deque(best_path) if best_path else None  # Hết ngân sách: trả về đoạn tốt nhất
+        advanced = False
+        if len(path) < max_depth:
+            for neighbor_pos, _ in stack[-1]:
+                if neighbor_pos in on_path:
+                    continue
+                on_path.add(neighbor_pos)
+                if forward_checking and not check_forward(neighbor_pos):
+                    on_path.discard(neighbor_pos)
+                    continue
+                path.append(neighbor_pos)
+                nodes += 1
+                if neighbor_pos == end_node:
+                    return deque(path)
+                distance = heuristic_diagonal(neighbor_pos, end_node)
+                if distance < best_distance:
+                    best_distance = distance
+                    best_path = list(path)
+                stack.append(sorted_neighbors(neighbor_pos))
+                advanced = True
+                break
+        if not advanced:
+            # Quay lui: hoàn tác bước cuối
+            stack.pop()
+            on_path.discard(path.pop())
+        if iterations % 16 == 0:
+            if time_budget is not None:
+                spent += time.perf_counter() - resumed
+                if spent > time_budget:
+                    return deque(best_path) if best_path else None
+            yield
+            resumed = time.perf_counter()
+    return None
 
-    initial_path = deque([start_node])
-    initial_visited = {start_node}
-    if start_node == end_node: return initial_path
-    return solve_fc(start_node, initial_path, initial_visited)
+
+@measured
+def backtracking_pathfinding(start_node, end_node, is_walkable_func, max_depth=None,
+                             max_nodes=BACKTRACKING_NODE_BUDGET, time_budget_ms=BACKTRACKING_TIME_BUDGET_MS,
+                             stats=None):
+    """Thuật toán Quay lui (Backtracking) cho tìm đường, có giới hạn độ sâu và ngân sách nút/thời gian."""
+    return run_search_steps(_backtracking_search_steps(start_node, end_node, is_walkable_func, max_depth, False,
+                                                       max_nodes, time_budget_ms, stats))
+
+
+def backtracking_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, max_depth=None,
+                              max_nodes=BACKTRACKING_NODE_BUDGET, time_budget_ms=BACKTRACKING_TIME_BUDGET_MS,
+                              stats=None):
+    """Bản generator cho PathJob, cùng ngân sách nút/thời gian với backtracking_pathfinding."""
+    return _backtracking_search_steps(start_node, end_node, is_walkable_func, max_depth, False, max_nodes,
+                                      time_budget_ms, stats)
+
+
+# --- THUẬT TOÁN CSP: QUAY LUI VỚI KIỂM TRA TIẾN (FORWARD CHECKING BACKTRACKING) ---
+@measured
+def forward_checking_backtracking_pathfinding(start_node, end_node, is_walkable_func, max_depth=None,
+                                              max_nodes=BACKTRACKING_NODE_BUDGET,
+                                              time_budget_ms=BACKTRACKING_TIME_BUDGET_MS, stats=None):
+    """Thuật toán Quay lui với Kiểm tra Tiến, có giới hạn độ sâu và ngân sách nút/thời gian."""
+    return run_search_steps(_backtracking_search_steps(start_node, end_node, is_walkable_func, max_depth, True,
+                                                       max_nodes, time_budget_ms, stats))
+
+
+def forward_checking_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, max_depth=None,
+                                  max_nodes=BACKTRACKING_NODE_BUDGET, time_budget_ms=BACKTRACKING_TIME_BUDGET_MS,
+                                  stats=None):
+    """Bản generator của Forward Checking cho PathJob, cùng ngân sách với backtracking_search_steps."""
+    return _backtracking_search_steps(start_node, end_node, is_walkable_func, max_depth, True, max_nodes,
+                                      time_budget_ms, stats)
 
 
 # --- CÁC THUẬT TOÁN TÌM KIẾM CỤC BỘ VÀ HEURISTIC KHÁC ---
-def min_conflict_like_step_search(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal):
+@measured
+def min_conflict_like_step_search(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal,
+                                  stats=None):
     """
     Thuật toán "Tìm Bước Ít Xung Đột Nhất" (Step-by-step local search).
     LƯU Ý: Đây KHÔNG phải là thuật toán Min-Conflicts CSP cổ điển.
@@ -273,6 +415,8 @@ def min_conflict_like_step_search(start_node, end_node, is_walkable_func, heuris
                 conflict_score = h_val + openness_penalty
                 candidates.append((conflict_score, neighbor_pos))
 
+        if stats is not None:
+            stats.expand(len(candidates), len(candidates))
         if not candidates: return None  # Stuck
 
         candidates.sort(key=lambda x: x[0])  # Choose the one with the best (lowest) conflict score
@@ -290,7 +434,8 @@ def min_conflict_like_step_search(start_node, end_node, is_walkable_func, heuris
     return path if current_node == end_node else None
 
 
-def hill_climbing_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal):
+@measured
+def hill_climbing_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
     """Thuật toán Hill Climbing (Leo đồi). Trả về một deque chỉ chứa (start_node, next_best_step) hoặc None."""
     if start_node == end_node: return deque([start_node])  # Already at goal
 
@@ -301,6 +446,8 @@ def hill_climbing_pathfinding(start_node, end_node, is_walkable_func, heuristic_
     for neighbor_pos, _ in get_neighbors(start_node, is_walkable_func):
         possible_steps.append({'pos': neighbor_pos, 'h_cost': heuristic_func(neighbor_pos, end_node)})
 
+    if stats is not None:
+        stats.expand(len(possible_steps), len(possible_steps))  # Chỉ xét các ô kề của ô bắt đầu
     if not possible_steps: return None  # No walkable neighbors
 
     # Sort by heuristic value (ascending for minimization)
@@ -319,8 +466,9 @@ def hill_climbing_pathfinding(start_node, end_node, is_walkable_func, heuristic_
     return None  # Stuck or no improvement
 
 
+@measured
 def rtaa_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal,
-                          max_expansion=None):
+                          max_expansion=None, stats=None):
     """Thuật toán RTAA* - Phiên bản giới hạn mở rộng, trả về đường đi đến biên giới khám phá."""
     if max_expansion is None:
         estimated_distance = heuristic_diagonal(start_node, end_node)
@@ -354,7 +502,10 @@ def rtaa_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func
         if node_curr == end_node:
             return path_curr  # Found goal within expansion limit
 
-        for neighbor_pos, move_cost in get_neighbors(node_curr, is_walkable_func):
+        neighbors = get_neighbors(node_curr, is_walkable_func)
+        if stats is not None:
+            stats.expand(len(open_list) + 1, len(neighbors))
+        for neighbor_pos, move_cost in neighbors:
             new_g = g_curr + move_cost
             if new_g < visited_this_search.get(neighbor_pos, float('inf')):
                 visited_this_search[neighbor_pos] = new_g
@@ -373,8 +524,16 @@ def rtaa_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func
     return None  # Should not happen if start_node is valid, best_leaf_info always has at least start_node
 
 
-def beam_search_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, beam_width=None):
+@measured
+def beam_search_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, beam_width=None,
+                            stats=None):
     """Thuật toán Beam Search."""
+    return run_search_steps(beam_search_steps(start_node, end_node, is_walkable_func, heuristic_func, beam_width,
+                                              stats))
+
+
+def beam_search_steps(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, beam_width=None,
+                      stats=None):
     if beam_width is None:
         beam_width = 3  # Default beam width
         # print(f"Beam Search using beam_width: {beam_width}")
@@ -396,7 +555,10 @@ def beam_search_pathfinding(start_node, end_node, is_walkable_func, heuristic_fu
             if node_curr == end_node:
                 return path_curr  # Goal found
 
-            for neighbor_pos, move_cost in get_neighbors(node_curr, is_walkable_func):
+            neighbors = get_neighbors(node_curr, is_walkable_func)
+            if stats is not None:
+                stats.expand(len(beam) + len(candidates_next_beam), len(neighbors))
+            for neighbor_pos, move_cost in neighbors:
                 # Avoid simple loops in the current path being built (unless it's the goal)
                 if neighbor_pos in path_curr and neighbor_pos != end_node:
                     continue
@@ -406,6 +568,7 @@ def beam_search_pathfinding(start_node, end_node, is_walkable_func, heuristic_fu
                 new_path = path_curr.copy()
                 new_path.append(neighbor_pos)
                 candidates_next_beam.append((new_h_cost, new_g_cost, neighbor_pos, new_path))
+            yield
 
         if not candidates_next_beam: return None  # No valid successors
 
@@ -419,8 +582,9 @@ def beam_search_pathfinding(start_node, end_node, is_walkable_func, heuristic_fu
 
 
 # --- THUẬT TOÁN CSP: MIN-CONFLICTS (ĐỂ SỬA CHỮA ĐƯỜNG ĐI HIỆN CÓ) ---
+@measured
 def min_conflicts_csp_repair_path(initial_path_deque, is_walkable_func, TILESIZE,
-                                  max_steps=None):  # TILESIZE not directly used here but kept for signature
+                                  max_steps=None, stats=None):  # TILESIZE not directly used here but kept for signature
     """
     Thuật toán Min-Conflicts cổ điển, được điều chỉnh để SỬA CHỮA một đường đi hiện có.
     """
@@ -514,6 +678,8 @@ def min_conflicts_csp_repair_path(initial_path_deque, is_walkable_func, TILESIZE
                 if is_walkable_func(neighbor_pos) and (neighbor_pos not in current_path or neighbor_pos == node_to_fix):
                     potential_alternatives_set.add(neighbor_pos)
 
+        if stats is not None:
+            stats.expand(len(conflicted_indices), len(potential_alternatives_set))
         for alt_node in potential_alternatives_set:
             original_node_at_index = current_path[var_index_to_fix]
             current_path[var_index_to_fix] = alt_node  # Try change
@@ -528,9 +694,594 @@ def min_conflicts_csp_repair_path(initial_path_deque, is_walkable_func, TILESIZE
     return deque(current_path)
 
 
+# --- ENGINE A*/UCS DÙNG MẢNG (CHỈ SỐ Ô PHẲNG, TÁI SỬ DỤNG BỘ ĐỆM) ---
+class SearchBuffers:
+    """Mảng g_cost/parent của một lần tìm trên GridSearchEngine, "xoá" bằng bộ đếm thế hệ (generation)."""
+    __slots__ = ('g_cost', 'parent', 'seen', 'generation')
+
+    def __init__(self, size):
+        self.g_cost = [0.0] * size
+        self.parent = [-1] * size
+        self.seen = [0] * size  # seen[i] == generation <=> g_cost/parent của ô i hợp lệ trong lần tìm hiện tại
+        self.generation = 0
+
+
+class GridSearchEngine:
+    """
+    A*/UCS trên chỉ số ô phẳng của một NavGrid.
+    Mảng g_cost/parent được cấp phát một lần cho mỗi lưới và "xoá" bằng bộ đếm thế hệ (generation)
+    thay vì tạo dict mới ở mỗi lần gọi. Danh sách ô kề trong bản đồ cũng được tính sẵn.
+    Mỗi lần tìm mượn một SearchBuffers rảnh và trả lại khi xong, nên các lần tìm chạy dở (PathJob) xen kẽ được nhau.
+    """
+
+    max_free_buffers = 4  # Số bộ mảng rảnh giữ lại; bộ mượn thêm lúc nhiều PathJob chạy cùng lúc được bỏ khi trả
+
+    def __init__(self, grid):
+        self.grid = grid
+        size = grid.size
+        width = grid.width
+        height = grid.height
+        self.coords = [(index % width, index // width) for index in range(size)]
+        # Ô kề trong bản đồ của từng ô: (chỉ số, chi phí). Việc kiểm tra vật cản làm lúc tìm kiếm.
+        self.neighbors = []
+        for x, y in self.coords:
+            cell_neighbors = []
+            for dx, dy, cost in ((0, 1, 1), (0, -1, 1), (1, 0, 1), (-1, 0, 1),
+                                 (1, 1, 1.414), (1, -1, 1.414), (-1, 1, 1.414), (-1, -1, 1.414)):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    cell_neighbors.append((ny * width + nx, cost))
+            self.neighbors.append(tuple(cell_neighbors))
+        self.free_buffers = [SearchBuffers(size)]
+        self.last_expansions = 0
+
+    def acquire_buffers(self):
+        buffers = self.free_buffers.pop() if self.free_buffers else SearchBuffers(len(self.coords))
+        buffers.generation += 1
+        return buffers
+
+    def release_buffers(self, buffers):
+        if len(self.free_buffers) < self.max_free_buffers:
+            self.free_buffers.append(buffers)
+
+    def reconstruct(self, index, parent):
+        path = deque()
+        coords = self.coords
+        while index != -1:
+            path.appendleft(coords[index])
+            index = parent[index]
+        return path
+
+    def search(self, start_node, end_node, heuristic_func=None, stats=None):
+        """Trả về deque các ô từ start_node đến end_node, hoặc None. heuristic_func=None => UCS."""
+        return run_search_steps(self.search_steps(start_node, end_node, heuristic_func, stats))
+
+    def search_steps(self, start_node, end_node, heuristic_func=None, stats=None):
+        """Bản generator của search() cho PathJob: yield sau mỗi nút được mở rộng."""
+        grid = self.grid
+        start = grid.index(start_node)
+        goal = grid.index(end_node)
+        self.last_expansions = 0
+        if start < 0 or goal < 0:
+            return None
+        if start == goal:
+            return deque([start_node])
+        buffers = self.acquire_buffers()
+        try:
+            return (yield from self._search_steps(buffers, start, goal, end_node, heuristic_func, stats))
+        finally:
+            self.release_buffers(buffers)
+
+    def _search_steps(self, buffers, start, goal, end_node, heuristic_func, stats):
+        generation = buffers.generation
+        g_cost = buffers.g_cost
+        parent = buffers.parent
+        seen = buffers.seen
+        blocked = self.grid.blocked
+        neighbors = self.neighbors
+        coords = self.coords
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        goal_x, goal_y = end_node
+        fast_diagonal = heuristic_func is heuristic_diagonal
+
+        def estimate(index):
+            if heuristic_func is None:
+                return 0
+            if fast_diagonal:
+                x, y = coords[index]
+                dx = x - goal_x if x > goal_x else goal_x - x
+                dy = y - goal_y if y > goal_y else goal_y - y
+                return dx if dx > dy else dy
+            return heuristic_func(coords[index], end_node)
+
+        g_cost[start] = 0.0
+        parent[start] = -1
+        seen[start] = generation
+        open_set = [(estimate(start), 0.0, start)]
+        expansions = 0
+
+        while open_set:
+            _, current_g, current = heappop(open_set)
+            if current_g > g_cost[current]:
+                continue  # Mục cũ trong heap, đã có đường ngắn hơn
+            if current == goal:
+                self.last_expansions = expansions
+                return self.reconstruct(current, parent)
+            expansions += 1
+            if stats is not None:
+                stats.expand(len(open_set) + 1, sum(1 for neighbor, _ in neighbors[current] if not blocked[neighbor]))
+            for neighbor, move_cost in neighbors[current]:
+                if blocked[neighbor]:
+                    continue
+                tentative_g = current_g + move_cost
+                if seen[neighbor] != generation or tentative_g < g_cost[neighbor]:
+                    seen[neighbor] = generation
+                    g_cost[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    if heuristic_func is None:
+                        heappush(open_set, (tentative_g, tentative_g, neighbor))
+                    else:
+                        heappush(open_set, (tentative_g + estimate(neighbor), tentative_g, neighbor))
+            yield
+        self.last_expansions = expansions
+        return None
+
+    # --- JUMP POINT SEARCH (JPS) ---
+    # Lưới 8 hướng chi phí đều, cho phép đi chéo qua góc giống get_neighbors, nên dùng luật cắt tỉa
+    # của JPS gốc (Harabor & Grastien): chỉ mở rộng các "điểm nhảy" thay vì từng ô đối xứng.
+    def _walkable(self, x, y):
+        grid = self.grid
+        return 0 <= x < grid.width and 0 <= y < grid.height and not grid.blocked[y * grid.width + x]
+
+    def _jump(self, x, y, dx, dy, goal_x, goal_y):
+        """Nhảy từ ô (x, y) theo hướng (dx, dy); trả về điểm nhảy đầu tiên hoặc None."""
+        walkable = self._walkable
+        while True:
+            if not walkable(x, y):
+                return None
+            if x == goal_x and y == goal_y:
+                return x, y
+            if dx and dy:
+                if (walkable(x - dx, y + dy) and not walkable(x - dx, y)) or \
+                        (walkable(x + dx, y - dy) and not walkable(x, y - dy)):
+                    return x, y
+                # Điểm chéo là điểm nhảy nếu một trong hai hướng thẳng từ nó tìm được điểm nhảy
+                if self._jump(x + dx, y, dx, 0, goal_x, goal_y) is not None or \
+                        self._jump(x, y + dy, 0, dy, goal_x, goal_y) is not None:
+                    return x, y
+            elif dx:
+                if (walkable(x + dx, y + 1) and not walkable(x, y + 1)) or \
+                        (walkable(x + dx, y - 1) and not walkable(x, y - 1)):
+                    return x, y
+            else:
+                if (walkable(x + 1, y + dy) and not walkable(x + 1, y)) or \
+                        (walkable(x - 1, y + dy) and not walkable(x - 1, y)):
+                    return x, y
+            x += dx
+            y += dy
+
+    def _pruned_directions(self, x, y, parent_index):
+        """Các hướng cần nhảy tiếp từ (x, y) sau khi cắt tỉa theo hướng đến từ nút cha."""
+        if parent_index == -1:
+            return ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+        walkable = self._walkable
+        px, py = self.coords[parent_index]
+        dx = (x > px) - (x < px)
+        dy = (y > py) - (y < py)
+        directions = []
+        if dx and dy:
+            if walkable(x, y + dy): directions.append((0, dy))
+            if walkable(x + dx, y): directions.append((dx, 0))
+            if walkable(x + dx, y + dy): directions.append((dx, dy))
+            if not walkable(x - dx, y): directions.append((-dx, dy))
+            if not walkable(x, y - dy): directions.append((dx, -dy))
+        elif dx == 0:
+            if walkable(x, y + dy): directions.append((0, dy))
+            if not walkable(x + 1, y): directions.append((1, dy))
+            if not walkable(x - 1, y): directions.append((-1, dy))
+        else:
+            if walkable(x + dx, y): directions.append((dx, 0))
+            if not walkable(x, y + 1): directions.append((dx, 1))
+            if not walkable(x, y - 1): directions.append((dx, -1))
+        return directions
+
+    def jump_point_search(self, start_node, end_node, heuristic_func=heuristic_diagonal, stats=None):
+        """JPS trả về đường đi đầy đủ từng ô (giống A*), hoặc None."""
+        return run_search_steps(self.jump_point_search_steps(start_node, end_node, heuristic_func, stats))
+
+    def jump_point_search_steps(self, start_node, end_node, heuristic_func=heuristic_diagonal, stats=None):
+        """Bản generator của jump_point_search() cho PathJob: yield sau mỗi điểm nhảy được mở rộng."""
+        grid = self.grid
+        start = grid.index(start_node)
+        goal = grid.index(end_node)
+        self.last_expansions = 0
+        if start < 0 or goal < 0:
+            return None
+        if start == goal:
+            return deque([start_node])
+        buffers = self.acquire_buffers()
+        try:
+            return (yield from self._jump_point_search_steps(buffers, start, goal, start_node, end_node,
+                                                             heuristic_func or heuristic_diagonal, stats))
+        finally:
+            self.release_buffers(buffers)
+
+    def _jump_point_search_steps(self, buffers, start, goal, start_node, end_node, heuristic_func, stats):
+        generation = buffers.generation
+        g_cost = buffers.g_cost
+        parent = buffers.parent
+        seen = buffers.seen
+        coords = self.coords
+        width = self.grid.width
+        goal_x, goal_y = end_node
+
+        g_cost[start] = 0.0
+        parent[start] = -1
+        seen[start] = generation
+        open_set = [(heuristic_func(start_node, end_node), 0.0, start)]
+        expansions = 0
+
+        while open_set:
+            _, current_g, current = heapq.heappop(open_set)
+            if current_g > g_cost[current]:
+                continue
+            if current == goal:
+                self.last_expansions = expansions
+                return self._expand_jump_path(current, parent)
+            expansions += 1
+            x, y = coords[current]
+            jump_points = 0
+            for dx, dy in self._pruned_directions(x, y, parent[current]):
+                jump_point = self._jump(x + dx, y + dy, dx, dy, goal_x, goal_y)
+                if jump_point is None:
+                    continue
+                jump_points += 1
+                jx, jy = jump_point
+                span_x = jx - x if jx > x else x - jx
+                span_y = jy - y if jy > y else y - jy
+                # Đoạn giữa hai điểm nhảy luôn là đường thẳng hoặc đường chéo thuần (chi phí octile)
+                diagonal_steps = min(span_x, span_y)
+                tentative_g = current_g + 1.414 * diagonal_steps + (max(span_x, span_y) - diagonal_steps)
+                neighbor = jy * width + jx
+                if seen[neighbor] != generation or tentative_g < g_cost[neighbor]:
+                    seen[neighbor] = generation
+                    g_cost[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    heapq.heappush(open_set, (tentative_g + heuristic_func(jump_point, end_node), tentative_g,
+                                              neighbor))
+            if stats is not None:
+                stats.expand(len(open_set), jump_points)  # Với JPS, ô kề là các điểm nhảy tìm được
+            yield
+        self.last_expansions = expansions
+        return None
+
+    def _expand_jump_path(self, index, parent):
+        """Nối các điểm nhảy thành đường đi từng ô để Enemy/NPC đi theo như đường của A*."""
+        jump_points = self.reconstruct(index, parent)
+        path = deque([jump_points[0]])
+        for next_x, next_y in list(jump_points)[1:]:
+            x, y = path[-1]
+            step_x = (next_x > x) - (next_x < x)
+            step_y = (next_y > y) - (next_y < y)
+            while (x, y) != (next_x, next_y):
+                x += step_x
+                y += step_y
+                path.append((x, y))
+        return path
+
+
+_SEARCH_ENGINES = weakref.WeakKeyDictionary()
+
+
+def get_search_engine(grid):
+    """Engine (và bộ đệm) dùng chung cho một NavGrid; tạo lần đầu khi cần."""
+    engine = _SEARCH_ENGINES.get(grid)
+    if engine is None or len(engine.coords) != grid.size:
+        engine = GridSearchEngine(grid)
+        _SEARCH_ENGINES[grid] = engine
+    return engine
+
+
+@measured
+def a_star_array_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
+    """A* trên mảng phẳng. Nếu is_walkable_func không phải NavGrid thì dùng a_star_pathfinding."""
+    if not isinstance(is_walkable_func, NavGrid):
+        return a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func, stats=stats)
+    return get_search_engine(is_walkable_func).search(start_node, end_node, heuristic_func or heuristic_diagonal,
+                                                      stats)
+
+
+def a_star_array_search_steps(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
+    if not isinstance(is_walkable_func, NavGrid):
+        return (yield from a_star_search_steps(start_node, end_node, is_walkable_func, heuristic_func, stats))
+    return (yield from get_search_engine(is_walkable_func).search_steps(start_node, end_node,
+                                                                        heuristic_func or heuristic_diagonal, stats))
+
+
+@measured
+def ucs_array_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
+    """UCS trên mảng phẳng (bỏ qua heuristic). Nếu is_walkable_func không phải NavGrid thì dùng ucs_pathfinding."""
+    if not isinstance(is_walkable_func, NavGrid):
+        return ucs_pathfinding(start_node, end_node, is_walkable_func, stats=stats)
+    return get_search_engine(is_walkable_func).search(start_node, end_node, None, stats)
+
+
+def ucs_array_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
+    if not isinstance(is_walkable_func, NavGrid):
+        return (yield from ucs_search_steps(start_node, end_node, is_walkable_func, stats=stats))
+    return (yield from get_search_engine(is_walkable_func).search_steps(start_node, end_node, None, stats))
+
+
+@measured
+def jps_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
+    """Jump Point Search: cùng độ dài đường đi với A* nhưng mở rộng ít nút hơn nhiều trên vùng trống."""
+    if not isinstance(is_walkable_func, NavGrid):
+        return a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func, stats=stats)
+    return get_search_engine(is_walkable_func).jump_point_search(start_node, end_node, heuristic_func, stats)
+
+
+def jps_search_steps(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, stats=None):
+    if not isinstance(is_walkable_func, NavGrid):
+        return (yield from a_star_search_steps(start_node, end_node, is_walkable_func, heuristic_func, stats))
+    return (yield from get_search_engine(is_walkable_func).jump_point_search_steps(start_node, end_node,
+                                                                                   heuristic_func, stats))
+
+
+# --- D* LITE: TÌM ĐƯỜNG TĂNG DẦN, GIỮ TRẠNG THÁI GIỮA CÁC LẦN GỌI ---
+INF = float('inf')
+
+
+class DStarLitePlanner:
+    """
+    Moving-Target D* Lite trên NavGrid, mỗi NPC giữ một planner giữa các lần tìm đường.
+    Tìm xuôi từ vị trí NPC (gốc) tới đích, lưu g/rhs và ô cha (par) của từng ô:
+    - Đích dời: chỉ cộng dồn km vào khoá, các giá trị g vẫn đúng.
+    - NPC bước sang ô nằm trong cây tìm kiếm: giữ cây con của ô đó, chỉ xoá phần còn lại rồi nối lại từ biên.
+      g của cây con lệch so với gốc mới một hằng số nên thứ tự các khoá không đổi.
+    - Ô vật cản đổi trạng thái (NavGrid.changes_since): chỉ tính lại rhs của ô đó và các ô con của nó.
+    """
+
+    # Đích nhảy xa hơn số ô này (ví dụ đổi mục tiêu từ người chơi sang LKP) thì tìm lại từ đầu sẽ rẻ hơn sửa
+    reset_distance = 8
+
+    def __init__(self, grid, heuristic_func=heuristic_diagonal):
+        self.grid = grid
+        self.heuristic_func = heuristic_func  # Phải nhất quán (consistent) với chi phí 1 / 1.414
+        self.engine = get_search_engine(grid)
+        self.last_expansions = 0
+        self.reset()
+
+    def reset(self):
+        self.g = {}
+        self.rhs = {}
+        self.par = {}
+        self.open_keys = {}  # Chỉ số ô -> khoá hiện hành; mục trong heap có khoá khác bị bỏ qua khi lấy ra
+        self.open_heap = []
+        self.km = 0.0
+        self.start = -1
+        self.goal = -1
+        self.grid_version = self.grid.version
+
+    def _key(self, index):
+        value = min(self.g.get(index, INF), self.rhs.get(index, INF))
+        coords = self.engine.coords
+        return value + self.heuristic_func(coords[index], coords[self.goal]) + self.km, value
+
+    def _refresh_open(self, index):
+        if self.g.get(index, INF) != self.rhs.get(index, INF):
+            key = self._key(index)
+            self.open_keys[index] = key
+            heapq.heappush(self.open_heap, (key, index))
+        else:
+            self.open_keys.pop(index, None)
+
+    def _update_vertex(self, index):
+        """Tính lại rhs/par của một ô từ các ô kề (chi phí vào ô bị chặn là vô cùng). Gốc giữ nguyên."""
+        if index != self.start:
+            best = INF
+            best_parent = -1
+            if not self.grid.blocked[index]:
+                g = self.g
+                for neighbor, cost in self.engine.neighbors[index]:
+                    candidate = g.get(neighbor, INF) + cost
+                    if candidate < best:
+                        best = candidate
+                        best_parent = neighbor
+            if best < INF:
+                self.rhs[index] = best
+                self.par[index] = best_parent
+            else:
+                self.rhs.pop(index, None)
+                self.par.pop(index, None)
+        self._refresh_open(index)
+
+    def _compute_shortest_path(self, stats=None):
+        open_heap = self.open_heap
+        open_keys = self.open_keys
+        g = self.g
+        rhs = self.rhs
+        par = self.par
+        blocked = self.grid.blocked
+        neighbors = self.engine.neighbors
+        goal = self.goal
+        start = self.start
+        expansions = 0
+        while open_heap:
+            top_key, index = open_heap[0]
+            if open_keys.get(index) != top_key:
+                heapq.heappop(open_heap)  # Mục cũ
+                continue
+            if not (top_key < self._key(goal) or rhs.get(goal, INF) != g.get(goal, INF)):
+                break
+            heapq.heappop(open_heap)
+            new_key = self._key(index)
+            if top_key < new_key:
+                open_keys[index] = new_key
+                heapq.heappush(open_heap, (new_key, index))
+                continue
+            del open_keys[index]
+            expansions += 1
+            if stats is not None:
+                stats.expand(len(open_keys) + 1, sum(1 for neighbor, _ in neighbors[index] if not blocked[neighbor]))
+            if g.get(index, INF) > rhs.get(index, INF):
+                current_g = rhs[index]
+                g[index] = current_g
+                for neighbor, cost in neighbors[index]:
+                    if neighbor != start and not blocked[neighbor] and current_g + cost < rhs.get(neighbor, INF):
+                        rhs[neighbor] = current_g + cost
+                        par[neighbor] = index
+                        self._refresh_open(neighbor)
+            else:
+                g.pop(index, None)
+                self._update_vertex(index)
+                for neighbor, _ in neighbors[index]:
+                    if par.get(neighbor) == index:
+                        self._update_vertex(neighbor)
+        self.last_expansions = expansions
+
+    def _move_root(self, new_start):
+        """Dời gốc sang new_start. Trả về False nếu new_start không nằm trong cây tìm kiếm (cần tìm lại từ đầu)."""
+        par = self.par
+        if new_start not in par:
+            return False
+        in_subtree = {new_start: True, self.start: False}
+        for index in par:
+            chain = []
+            current = index
+            while current not in in_subtree:
+                chain.append(current)
+                current = par.get(current, self.start)
+            result = in_subtree[current]
+            for visited in chain:
+                in_subtree[visited] = result
+        deleted = [index for index in set(self.g) | set(self.rhs) if not in_subtree.get(index, False)]
+        del par[new_start]
+        self.start = new_start
+        for index in deleted:
+            self.g.pop(index, None)
+            self.rhs.pop(index, None)
+            par.pop(index, None)
+            self.open_keys.pop(index, None)
+        for index in deleted:
+            self._update_vertex(index)
+        self._refresh_open(new_start)
+        return True
+
+    @measured
+    def plan(self, start_node, end_node, stats=None):
+        """Trả về đường đi (deque các ô, gồm cả ô bắt đầu) từ start_node tới end_node, hoặc None."""
+        grid = self.grid
+        start = grid.index(start_node)
+        goal = grid.index(end_node)
+        if start < 0 or goal < 0 or grid.blocked[goal] or not get_components(grid).connected(start_node, end_node):
+            return None
+        coords = self.engine.coords
+
+        restart = self.start < 0 or self.heuristic_func(coords[self.goal], coords[goal]) > self.reset_distance
+        if not restart and grid.version != self.grid_version:
+            changed = grid.changes_since(self.grid_version)
+            if changed is None:
+                restart = True
+            else:
+                self.grid_version = grid.version
+                for index in set(changed):
+                    # Chi phí cạnh phụ thuộc ô đến: chỉ rhs của chính ô đổi trạng thái bị ảnh hưởng trực tiếp
+                    self._update_vertex(index)
+        if not restart and start != self.start:
+            restart = not self._move_root(start)
+
+        if restart:
+            self.reset()
+            self.start = start
+            self.goal = goal
+            self.g[start] = INF
+            self.rhs[start] = 0.0
+            self._refresh_open(start)
+        elif goal != self.goal:
+            self.km += self.heuristic_func(coords[self.goal], coords[goal])
+            self.goal = goal
+
+        self._compute_shortest_path(stats)
+        return self._extract_path()
+
+    def _extract_path(self):
+        if self.rhs.get(self.goal, INF) == INF:
+            return None
+        coords = self.engine.coords
+        path = deque()
+        current = self.goal
+        for _ in range(self.grid.size):
+            path.appendleft(coords[current])
+            if current == self.start:
+                return path
+            current = self.par.get(current, -1)
+            if current < 0:
+                return None
+        return None
+
+
+@measured
+def dstar_lite_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, planner=None,
+                           stats=None):
+    """
+    D* Lite. Gọi không kèm planner thì chạy một lần (tương đương A*).
+    NPC giữ một DStarLitePlanner riêng (xem STATEFUL_PLANNERS) để các lần gọi sau chỉ sửa phần thay đổi.
+    """
+    if planner is None:
+        if not isinstance(is_walkable_func, NavGrid):
+            return a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func, stats=stats)
+        planner = DStarLitePlanner(is_walkable_func)
+    return planner.plan(start_node, end_node, stats=stats)
+
+
+@measured
+def hpa_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, full_path=False,
+                         stats=None):
+    """
+    HPA*: tìm trên đồ thị cụm tính sẵn rồi chỉ làm mịn đoạn đầu (full_path=True để làm mịn toàn bộ).
+    Đường trả về có thể chưa tới đích; người gọi tìm lại khi đi hết. Không phải NavGrid thì dùng A*.
+    """
+    if not isinstance(is_walkable_func, NavGrid):
+        return a_star_pathfinding(start_node, end_node, is_walkable_func, heuristic_func, stats=stats)
+    return get_cluster_graph(is_walkable_func).find_path(start_node, end_node, full_path, stats)
+
+
+def hpa_star_search_steps(start_node, end_node, is_walkable_func, heuristic_func=heuristic_diagonal, full_path=False,
+                          stats=None):
+    """Bản generator của HPA* cho PathJob: yield giữa các pha (cục bộ, trừu tượng, từng đoạn làm mịn)."""
+    if not isinstance(is_walkable_func, NavGrid):
+        return (yield from a_star_search_steps(start_node, end_node, is_walkable_func, heuristic_func, stats))
+    return (yield from get_cluster_graph(is_walkable_func).find_path_steps(start_node, end_node, full_path, stats))
+
+
+@measured
+def min_conflicts_repair_bfs_pathfinding(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
+    """Đường BFS rồi sửa bằng Min-Conflicts (mục 'MinConflicts Repair (BFS)' trong danh sách thuật toán)."""
+    return min_conflicts_csp_repair_path(
+        initial_path_deque=bfs_pathfinding(start_node, end_node, is_walkable_func, stats=stats),
+        is_walkable_func=is_walkable_func,
+        TILESIZE=64,
+        stats=stats,
+    )
+
+
+def min_conflicts_repair_bfs_search_steps(start_node, end_node, is_walkable_func, heuristic_func=None, stats=None):
+    """Bản generator cho PathJob: BFS chạy theo lượt, bước sửa Min-Conflicts (có giới hạn vòng lặp) chạy ở bước cuối."""
+    initial_path = yield from bfs_search_steps(start_node, end_node, is_walkable_func, stats=stats)
+    return min_conflicts_csp_repair_path(
+        initial_path_deque=initial_path,
+        is_walkable_func=is_walkable_func,
+        TILESIZE=64,
+        stats=stats,
+    )
+
+
 # --- DANH SÁCH ĐỂ ĐĂNG KÝ CÁC THUẬT TOÁN ---
 ALGORITHM_NAMES = [
     'A*', 'BFS', 'DFS', 'UCS',
+    'A* (Array)', 'UCS (Array)', 'JPS', 'D* Lite', 'HPA*',
     'Backtracking', 'Forward Checking BS',
     'Hill Climbing', 'RTAA*', 'Beam Search',
     'MinConflicts Repair (BFS)'
@@ -540,13 +1291,64 @@ PATHFINDING_ALGORITHMS = {
     'BFS': bfs_pathfinding,
     'DFS': dfs_pathfinding,
     'UCS': ucs_pathfinding,
+    'A* (Array)': a_star_array_pathfinding,
+    'UCS (Array)': ucs_array_pathfinding,
+    'JPS': jps_pathfinding,
+    'D* Lite': dstar_lite_pathfinding,
+    'HPA*': hpa_star_pathfinding,
     'Backtracking': backtracking_pathfinding,
     'Forward Checking BS': forward_checking_backtracking_pathfinding,
     'Hill Climbing': hill_climbing_pathfinding,
     'Beam Search': beam_search_pathfinding,
-    'MinConflicts Repair (BFS)': lambda start, end, is_walkable, heuristic_func=None: min_conflicts_csp_repair_path(
-        initial_path_deque=bfs_pathfinding(start, end, is_walkable),
-        is_walkable_func=is_walkable,
-        TILESIZE=64,
-    )
+    'MinConflicts Repair (BFS)': min_conflicts_repair_bfs_pathfinding
+}
+
+# Các thuật toán tất định, tìm trọn vẹn đi qua một bộ đệm LRU chung (functools.wraps giữ nguyên __name__).
+# Backtracking / Forward Checking (trả về đường tốt nhất khi hết ngân sách), Hill Climbing, MinConflicts (ngẫu nhiên),
+# DFS, Beam Search và D* Lite (có planner riêng) luôn chạy thật.
+CACHED_ALGORITHMS = ('BFS', 'UCS', 'A*', 'A* (Array)', 'UCS (Array)', 'JPS', 'HPA*')
+# Tham số hàm nhận nhưng không dùng: không thuộc khoá, để lời gọi có và không có heuristic dùng chung một mục
+CACHE_IGNORED_PARAMS = {
+    'UCS (Array)': ('stats', 'heuristic_func'),
+}
+PATH_CACHE = PathCache()
+# Các hàm gốc không qua bộ đệm: tiến trình con của PathService chạy chúng, bộ đệm chỉ nằm ở tiến trình chính
+UNCACHED_ALGORITHMS = PATHFINDING_ALGORITHMS
+PATHFINDING_ALGORITHMS = {name: PATH_CACHE.cached(name, func, CACHE_IGNORED_PARAMS.get(name, ('stats',)))
+                          if name in CACHED_ALGORITHMS else func
+                          for name, func in UNCACHED_ALGORITHMS.items()}
+
+
+def path_cache_key(algo_name, start_node, end_node, grid, heuristic_func=None):
+    """
+    Khoá PATH_CACHE của lời gọi đồng bộ PATHFINDING_ALGORITHMS[algo_name] ứng với một PathJob / yêu cầu PathService.
+    heuristic_func chỉ thuộc khoá khi hàm đó nhận tham số này (BFS, UCS... bỏ qua). None nếu thuật toán không dùng bộ đệm.
+    """
+    func = PATHFINDING_ALGORITHMS.get(algo_name)
+    cache_key = getattr(func, 'cache_key', None)
+    if cache_key is None:
+        return None
+    if heuristic_func is not None and 'heuristic_func' in func.signature.parameters:
+        return cache_key(start_node, end_node, grid, heuristic_func=heuristic_func)
+    return cache_key(start_node, end_node, grid)
+
+# Thuật toán chạy được theo lượt qua nhiều frame (generator *_search_steps), dùng bởi PathJob
+RESUMABLE_SEARCHES = {
+    'A*': a_star_search_steps,
+    'BFS': bfs_search_steps,
+    'DFS': dfs_search_steps,
+    'UCS': ucs_search_steps,
+    'A* (Array)': a_star_array_search_steps,
+    'UCS (Array)': ucs_array_search_steps,
+    'JPS': jps_search_steps,
+    'Beam Search': beam_search_steps,
+    'Backtracking': backtracking_search_steps,
+    'Forward Checking BS': forward_checking_search_steps,
+    'HPA*': hpa_star_search_steps,
+    'MinConflicts Repair (BFS)': min_conflicts_repair_bfs_search_steps,
+}
+
+# Thuật toán có trạng thái: NPC tạo một planner riêng (planner.plan(start, goal)) và giữ nó giữa các lần tìm đường
+STATEFUL_PLANNERS = {
+    'D* Lite': DStarLitePlanner,
 }
\ No newline at end of file
@@ -0,0 +1,348 @@
+# pathfinding_benchmark.py
+# Benchmark headless cho mọi thuật toán trong PATHFINDING_ALGORITHMS trên bản đồ thật (map_FloorBlocks/map_Objects):
+# thời gian, số nút mở rộng, độ dài đường so với tối ưu và tỉ lệ thất bại theo từng nhóm khoảng cách.
+# --engines: so sánh expansions/giây giữa bản gốc, engine mảng phẳng, bitboard, JPS và HPA* như trước.
+# Chạy từ thư mục code/:  python pathfinding_benchmark.py --pairs 25 --seed 1 --json benchmark.json
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import pygame
+
+from settings import TILESIZE
+from support import import_csv_layout, import_folder
+from tile import Tile
+from nav_grid import NavGrid
+from pathfinding_algorithms import (
+    a_star_pathfinding, ucs_pathfinding, bfs_pathfinding,
+    a_star_array_pathfinding, ucs_array_pathfinding, jps_pathfinding,
+    hpa_star_pathfinding, get_search_engine, heuristic_diagonal,
+    PATHFINDING_ALGORITHMS, SearchStats
+)
+from hpa_star import get_cluster_graph
+from bitboard import get_bitboard
+
+
+def load_nav_grid(map_dir='../map', objects_dir='../graphics/objects'):
+    """Dựng NavGrid từ các file CSV giống Level.create_map nhưng không cần mở cửa sổ."""
+    boundary_layout = import_csv_layout(os.path.join(map_dir, 'map_FloorBlocks.csv'))
+    object_layout = import_csv_layout(os.path.join(map_dir, 'map_Objects.csv'))
+    object_surfaces = import_folder(objects_dir, convert=False)
+    grid = NavGrid.from_csv_layout(boundary_layout)
+    obstacle_sprites = pygame.sprite.Group()
+
+    for row_index, row in enumerate(boundary_layout):
+        for col_index, col in enumerate(row):
+            if col != '-1':
+                tile = Tile((col_index * TILESIZE, row_index * TILESIZE), [obstacle_sprites], 'invisible',
+                            hitbox_inflation=(-10, None))
+                grid.add_obstacle_sprite(tile)
+    for row_index, row in enumerate(object_layout):
+        for col_index, col in enumerate(row):
+            if col != '-1':
+                tile = Tile((col_index * TILESIZE, row_index * TILESIZE), [obstacle_sprites], 'object',
+                            object_surfaces[int(col)])
+                grid.add_obstacle_sprite(tile)
+    return grid
+
+
+class CountingWalkable:
+    """Bọc một hàm is_walkable để đếm số lần gọi (get_neighbors thử 8 hướng cho mỗi lần mở rộng)."""
+
+    def __init__(self, is_walkable_func):
+        self.is_walkable_func = is_walkable_func
+        self.calls = 0
+
+    def __call__(self, tile):
+        self.calls += 1
+        return self.is_walkable_func(tile)
+
+
+def walkable_pairs(grid, count, seed):
+    rng = random.Random(seed)
+    walkable_tiles = [grid.tile(index) for index in range(grid.size) if not grid.blocked[index]]
+    return [(rng.choice(walkable_tiles), rng.choice(walkable_tiles)) for _ in range(count)]
+
+
+def compare_engines(grid, pairs):
+    """Trả về danh sách kết quả (tên, số lần mở rộng, thời gian giây, số đường tìm được)."""
+    engine = get_search_engine(grid)
+    results = []
+    for name, original_func, array_func, uses_heuristic in (
+            ('A*', a_star_pathfinding, a_star_array_pathfinding, True),
+            ('UCS', ucs_pathfinding, ucs_array_pathfinding, False)):
+        # Bản gốc: đếm mở rộng bằng wrapper riêng, đo thời gian không có wrapper
+        expansions = 0
+        for start, goal in pairs:
+            counter = CountingWalkable(grid.is_walkable)
+            if uses_heuristic:
+                original_func(start, goal, counter, heuristic_diagonal)
+            else:
+                original_func(start, goal, counter)
+            expansions += counter.calls // 8
+        found = 0
+        started = time.perf_counter()
+        for start, goal in pairs:
+            path = original_func(start, goal, grid, heuristic_diagonal) if uses_heuristic else \
+                original_func(start, goal, grid)
+            found += path is not None
+        results.append((name, expansions, time.perf_counter() - started, found))
+
+        expansions = 0
+        found = 0
+        started = time.perf_counter()
+        for start, goal in pairs:
+            path = array_func(start, goal, grid)
+            expansions += engine.last_expansions
+            found += path is not None
+        results.append((f'{name} (Array)', expansions, time.perf_counter() - started, found))
+
+    expansions = 0
+    found = 0
+    started = time.perf_counter()
+    for start, goal in pairs:
+        path = jps_pathfinding(start, goal, grid)
+        expansions += engine.last_expansions
+        found += path is not None
+    results.append(('JPS', expansions, time.perf_counter() - started, found))
+
+    # BFS: truyền grid.is_walkable (không phải NavGrid) để chạy bản deque gốc, truyền grid để chạy bitboard
+    bitboard = get_bitboard(grid)
+    for name, walkable in (('BFS', grid.is_walkable), ('BFS (Bitboard)', grid)):
+        expansions = 0
+        for start, goal in pairs:
+            if name == 'BFS':
+                counter = CountingWalkable(grid.is_walkable)
+                bfs_pathfinding(start, goal, counter)
+                expansions += counter.calls // 8
+            else:
+                expansions += sum(bin(layer).count('1') for layer in bitboard.bfs_layers(start, bitboard.bit(goal)))
+        found = 0
+        started = time.perf_counter()
+        for start, goal in pairs:
+            found += bfs_pathfinding(start, goal, walkable) is not None
+        results.append((name, expansions, time.perf_counter() - started, found))
+    return results
+
+
+def path_cost(path):
+    steps = list(path)
+    return sum(1.414 if a[0] != b[0] and a[1] != b[1] else 1 for a, b in zip(steps, steps[1:]))
+
+
+def compare_hpa(grid, pairs):
+    """
+    Trả về danh sách (tên, ms tìm trừu tượng, ms làm mịn, số lần mở rộng, tỉ lệ độ dài so với A*, số đường tìm được).
+    Chỉ tính các cặp A* tìm được đường; tỉ lệ độ dài chỉ có nghĩa khi làm mịn toàn bộ.
+    """
+    graph = get_cluster_graph(grid)
+    reachable = []
+    for start, goal in pairs:
+        path = a_star_array_pathfinding(start, goal, grid)
+        if path is not None:
+            reachable.append((start, goal, path_cost(path)))
+
+    results = []
+    for name, full_path in (('HPA* (đoạn đầu)', False), ('HPA* (toàn bộ)', True)):
+        abstract_ms = refine_ms = 0.0
+        expansions = 0
+        found = 0
+        ratios = []
+        for start, goal, optimal_cost in reachable:
+            path = hpa_star_pathfinding(start, goal, grid, full_path=full_path)
+            abstract_ms += graph.last_abstract_ms
+            refine_ms += graph.last_refine_ms
+            expansions += graph.last_abstract_expansions + graph.last_refine_expansions
+            if path is not None:
+                found += 1
+                if full_path and optimal_cost > 0:
+                    ratios.append(path_cost(path) / optimal_cost)
+        ratio = sum(ratios) / len(ratios) if ratios else None
+        results.append((name, abstract_ms, refine_ms, expansions, ratio, found))
+    return results
+
+
+# --- BỘ BENCHMARK THEO NHÓM KHOẢNG CÁCH ---
+# Nhóm theo khoảng cách Chebyshev giữa start và goal: [min, max), max None = không giới hạn
+DISTANCE_BUCKETS = ((1, 8), (8, 16), (16, 32), (32, None))
+# Tham số thêm khi benchmark: HPA* mặc định chỉ làm mịn đoạn đầu nên phải làm mịn toàn bộ mới so được độ dài
+BENCHMARK_KWARGS = {'HPA*': {'full_path': True}}
+# Mean ms của một thuật toán tăng quá tỉ lệ này so với file --baseline thì coi là chậm đi
+REGRESSION_TOLERANCE = 0.25
+
+
+def bucket_label(bucket):
+    low, high = bucket
+    return f'{low}+' if high is None else f'{low}-{high - 1}'
+
+
+def bucketed_pairs(grid, pairs_per_bucket, seed):
+    """{nhóm: [(start, goal), ...]} với đúng pairs_per_bucket cặp mỗi nhóm (ít hơn nếu bản đồ không đủ xa)."""
+    rng = random.Random(seed)
+    walkable_tiles = [grid.tile(index) for index in range(grid.size) if not grid.blocked[index]]
+    buckets = {bucket: [] for bucket in DISTANCE_BUCKETS}
+    attempts = pairs_per_bucket * len(buckets) * 200
+    while attempts > 0 and any(len(pairs) < pairs_per_bucket for pairs in buckets.values()):
+        attempts -= 1
+        start, goal = rng.choice(walkable_tiles), rng.choice(walkable_tiles)
+        distance = heuristic_diagonal(start, goal)
+        for (low, high), pairs in buckets.items():
+            if low <= distance and (high is None or distance < high) and len(pairs) < pairs_per_bucket:
+                pairs.append((start, goal))
+    return buckets
+
+
+def is_valid_path(grid, path, start, goal):
+    """Đường đi từ start tới goal, mỗi bước sang ô kề (8 hướng) đi được."""
+    if not path or path[0] != start or path[-1] != goal:
+        return False
+    steps = list(path)
+    return all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 and grid.is_walkable(b) for a, b in zip(steps, steps[1:]))
+
+
+def summarize(name, label, records):
+    """records: (ms, số nút mở rộng, tỉ lệ độ dài so với tối ưu hoặc None, thất bại True/False hoặc None nếu không có đường)."""
+    times = [record[0] for record in records]
+    ratios = [record[2] for record in records if record[2] is not None]
+    reachable = [record for record in records if record[3] is not None]
+    failures = sum(1 for record in reachable if record[3])
+    return {
+        'algorithm': name,
+        'bucket': label,
+        'pairs': len(records),
+        'reachable_pairs': len(reachable),
+        'mean_ms': sum(times) / len(times) if times else 0.0,
+        'max_ms': max(times, default=0.0),
+        'mean_expansions': sum(record[1] for record in records) / len(records) if records else 0.0,
+        'cost_ratio': sum(ratios) / len(ratios) if ratios else None,
+        'failure_rate': failures / len(reachable) if reachable else 0.0,
+    }
+
+
+def run_suite(grid, buckets, algorithm_names, seed):
+    """Chạy từng thuật toán trên mọi cặp. Trả về danh sách kết quả theo (thuật toán, nhóm), kèm một dòng 'all'."""
+    # Chi phí tối ưu (Dijkstra, cùng chi phí 1 / 1.414 với path_cost); None nếu không có đường
+    optimal_costs = {}
+    for pairs in buckets.values():
+        for start, goal in pairs:
+            path = ucs_array_pathfinding(start, goal, grid)
+            optimal_costs[(start, goal)] = path_cost(path) if path is not None else None
+
+    results = []
+    for name in algorithm_names:
+        func = getattr(PATHFINDING_ALGORITHMS[name], '__wrapped__', PATHFINDING_ALGORITHMS[name])  # Bỏ qua PATH_CACHE
+        kwargs = BENCHMARK_KWARGS.get(name, {})
+        random.seed(seed)  # Hill Climbing / MinConflicts có chọn ngẫu nhiên
+        all_records = []
+        for bucket, pairs in buckets.items():
+            records = []
+            for start, goal in pairs:
+                stats = SearchStats()
+                started = time.perf_counter()
+                path = func(start, goal, grid, stats=stats, **kwargs)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                optimal = optimal_costs[(start, goal)]
+                ratio = failed = None
+                if optimal is not None:
+                    failed = not is_valid_path(grid, path, start, goal)
+                    if not failed:
+                        ratio = path_cost(path) / optimal if optimal > 0 else 1.0
+                records.append((elapsed_ms, stats.expansions, ratio, failed))
+            results.append(summarize(name, bucket_label(bucket), records))
+            all_records.extend(records)
+        results.append(summarize(name, 'all', all_records))
+    return results
+
+
+def print_suite(results):
+    print(f"{'Thuật toán':<27}{'Khoảng cách':>12}{'TB (ms)':>10}{'Max (ms)':>10}{'Mở rộng TB':>12}"
+          f"{'Dài/tối ưu':>12}{'Thất bại':>10}")
+    previous = None
+    for result in results:
+        if previous is not None and result['algorithm'] != previous:
+            print()
+        previous = result['algorithm']
+        ratio_text = f"{result['cost_ratio']:.3f}" if result['cost_ratio'] is not None else '-'
+        print(f"{result['algorithm']:<27}{result['bucket']:>12}{result['mean_ms']:>10.2f}{result['max_ms']:>10.2f}"
+              f"{result['mean_expansions']:>12.0f}{ratio_text:>12}{result['failure_rate']:>10.0%}")
+
+
+def find_regressions(results, baseline_results, tolerance=REGRESSION_TOLERANCE):
+    """Các dòng 'all' chậm hơn baseline quá tolerance: danh sách (tên, ms baseline, ms hiện tại)."""
+    baseline_ms = {result['algorithm']: result['mean_ms'] for result in baseline_results if result['bucket'] == 'all'}
+    regressions = []
+    for result in results:
+        old_ms = baseline_ms.get(result['algorithm'])
+        if result['bucket'] == 'all' and old_ms and result['mean_ms'] > old_ms * (1 + tolerance):
+            regressions.append((result['algorithm'], old_ms, result['mean_ms']))
+    return regressions
+
+
+def print_engine_comparison(grid, pairs, seed):
+    print(f"Bản đồ {grid.width}x{grid.height}, {len(pairs)} cặp start/goal (seed={seed})")
+    print(f"{'Thuật toán':<14}{'Mở rộng':>12}{'Thời gian (ms)':>16}{'Mở rộng/giây':>16}{'Tìm thấy':>10}")
+    for name, expansions, elapsed, found in compare_engines(grid, pairs):
+        rate = expansions / elapsed if elapsed > 0 else 0
+        print(f"{name:<14}{expansions:>12}{elapsed * 1000:>16.1f}{rate:>16.0f}{found:>10}")
+
+    print(f"\nHPA*: cụm {get_cluster_graph(grid).cluster_size} ô, dựng đồ thị {get_cluster_graph(grid).build_ms:.1f} ms")
+    print(f"{'Thuật toán':<18}{'Trừu tượng (ms)':>17}{'Làm mịn (ms)':>14}{'Mở rộng':>10}{'Dài/A*':>8}{'Tìm thấy':>10}")
+    for name, abstract_ms, refine_ms, expansions, ratio, found in compare_hpa(grid, pairs):
+        ratio_text = f"{ratio:.3f}" if ratio is not None else '-'
+        print(f"{name:<18}{abstract_ms:>17.1f}{refine_ms:>14.1f}{expansions:>10}{ratio_text:>8}{found:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark headless các thuật toán trong PATHFINDING_ALGORITHMS trên bản đồ của game.')
+    parser.add_argument('--pairs', type=int, default=25, help='Số cặp (start, goal) ngẫu nhiên cho mỗi nhóm khoảng cách')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--algorithms', help='Danh sách tên thuật toán, cách nhau bởi dấu phẩy (mặc định: tất cả)')
+    parser.add_argument('--json', dest='json_path', help='Ghi kết quả ra file JSON')
+    parser.add_argument('--baseline', help='File JSON của một lần chạy trước; thoát mã 1 nếu có thuật toán chậm đi')
+    parser.add_argument('--engines', action='store_true',
+                        help='So sánh expansions/giây giữa bản gốc, engine mảng phẳng, bitboard, JPS và HPA*')
+    args = parser.parse_args()
+
+    grid = load_nav_grid()
+    if args.engines:
+        print_engine_comparison(grid, walkable_pairs(grid, args.pairs * len(DISTANCE_BUCKETS), args.seed), args.seed)
+        return
+
+    algorithm_names = [name.strip() for name in args.algorithms.split(',')] if args.algorithms \
+        else list(PATHFINDING_ALGORITHMS)
+    unknown = [name for name in algorithm_names if name not in PATHFINDING_ALGORITHMS]
+    if unknown:
+        parser.error(f"Không có thuật toán: {', '.join(unknown)}")
+    buckets = bucketed_pairs(grid, args.pairs, args.seed)
+    print(f"Bản đồ {grid.width}x{grid.height}, seed={args.seed}, số cặp mỗi nhóm: "
+          f"{', '.join(f'{bucket_label(bucket)}: {len(pairs)}' for bucket, pairs in buckets.items())}")
+    results = run_suite(grid, buckets, algorithm_names, args.seed)
+    print_suite(results)
+
+    if args.json_path:
+        report = {
+            'map': f'{grid.width}x{grid.height}',
+            'seed': args.seed,
+            'pairs_per_bucket': args.pairs,
+            'buckets': [bucket_label(bucket) for bucket in DISTANCE_BUCKETS],
+            'results': results,
+        }
+        with open(args.json_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi {args.json_path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file)['results'])
+        for name, old_ms, new_ms in regressions:
+            print(f"CHẬM ĐI: {name} {old_ms:.2f} ms -> {new_ms:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
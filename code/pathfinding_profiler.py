@@ -0,0 +1,64 @@
+# pathfinding_profiler.py
+# Gom số liệu SearchStats của các lần tìm đường trong game theo loại thực thể và theo thuật toán.
+from collections import defaultdict, deque
+
+from settings import PATHFINDING_PROFILER_WINDOW
+
+
+def percentile(sorted_values, fraction):
+    """Phân vị theo hạng gần nhất của một danh sách đã sắp xếp (không rỗng)."""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class PathfindingProfiler:
+    """
+    Giữ window lần tìm đường gần nhất cho mỗi cặp (loại thực thể, thuật toán).
+    Mỗi mẫu là (thời gian ms, số nút mở rộng, tập mở lớn nhất, số ô kề sinh ra) lấy từ một SearchStats.
+    """
+
+    def __init__(self, window=PATHFINDING_PROFILER_WINDOW):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, entity_type, algo_name, stats):
+        """Ghi một SearchStats; bỏ qua nếu không có lần tìm thật (trúng PATH_CACHE, ô đích bị chặn...)."""
+        if stats is None or stats.searches == 0:
+            return
+        self.samples[(entity_type, algo_name)].append(
+            (stats.duration_ms, stats.expansions, stats.peak_open, stats.neighbors))
+
+    def clear(self):
+        self.samples.clear()
+
+    def rows(self, group_by='entity'):
+        """
+        Tổng hợp theo 'entity' (loại thực thể) hoặc 'algorithm'. Mỗi dòng là dict gồm name, count, p50/p95/max (ms),
+        mean_expansions, mean_peak_open; sắp xếp theo p95 giảm dần để thứ tốn frame nhất nằm trên cùng.
+        """
+        key_index = 0 if group_by == 'entity' else 1
+        grouped = defaultdict(list)
+        for key, samples in self.samples.items():
+            grouped[key[key_index]].extend(samples)
+
+        rows = []
+        for name, samples in grouped.items():
+            if not samples:
+                continue
+            durations = sorted(sample[0] for sample in samples)
+            count = len(samples)
+            rows.append({
+                'name': name,
+                'count': count,
+                'p50': percentile(durations, 0.50),
+                'p95': percentile(durations, 0.95),
+                'max': durations[-1],
+                'mean_expansions': sum(sample[1] for sample in samples) / count,
+                'mean_peak_open': sum(sample[2] for sample in samples) / count,
+            })
+        rows.sort(key=lambda row: row['p95'], reverse=True)
+        return rows
+
+
+# Dùng chung cho mọi NPC/Enemy trong game
+PATHFINDING_PROFILER = PathfindingProfiler()
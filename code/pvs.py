@@ -0,0 +1,152 @@
+# pvs.py
+# Tập ô có thể nhìn thấy (potentially visible set) tính sẵn cho bản đồ tĩnh: với mỗi ô đi được, một bitset các ô trong
+# cửa sổ vuông (2R+1)x(2R+1) quanh nó mà has_line_of_sight từ tâm ô này tới tâm ô kia trả về True.
+# Lưu trong file nhị phân cạnh các file CSV của bản đồ (không nằm trong git) và đọc bằng mmap khi tải màn chơi.
+# NPC tra bảng này trước tiên khi kiểm tra tầm nhìn (NPC.filter_line_of_sight).
+# Dựng lại file từ thư mục code/:  python pvs.py
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from settings import TILESIZE, DEFAULT_SIGHT_RADIUS, PVS_FILE
+from visibility import lines_of_sight
+
+PVS_MAGIC = b'PVS1'
+# magic, rộng, cao, cạnh ô (pixel), bán kính cửa sổ (ô), crc32 của lưới đi được
+PVS_HEADER = struct.Struct('<4sHHHHI')
+# Đủ cho mọi cặp (người nhìn, mục tiêu) cách nhau tới DEFAULT_SIGHT_RADIUS, cộng một ô vì cả hai không đứng ở tâm ô
+PVS_RADIUS = math.ceil(DEFAULT_SIGHT_RADIUS / TILESIZE) + 1
+_WALKABLE_TABLE = bytes([0] + [1] * 255)  # Số vật cản -> 0/1, để checksum không phụ thuộc số vật cản chồng lên nhau
+
+
+def grid_checksum(grid):
+    return zlib.crc32(bytes(grid.blocked).translate(_WALKABLE_TABLE))
+
+
+class PotentiallyVisibleSet:
+    """
+    Tra tầm nhìn giữa hai điểm (pixel) bằng một bit của ô chứa người nhìn. can_see() trả về None khi không trả lời được:
+    mục tiêu ngoài cửa sổ, hoặc lưới đã đổi (thêm/bớt vật cản) ở gần người nhìn kể từ lúc tính - khi đó người gọi tự duyệt tia.
+    Mọi ô mà tia từ ô người nhìn tới một ô trong cửa sổ đi qua đều nằm trong cửa sổ đó, nên một ô đổi trạng thái
+    chỉ làm cũ bitset của các ô cách nó không quá R ô.
+    """
+
+    def __init__(self, grid, data, radius):
+        self.grid = grid
+        self.data = data  # Header + các bitset, có thể là mmap
+        self.radius = radius
+        self.window = 2 * radius + 1
+        self.row_bytes = (self.window * self.window + 7) // 8
+        self.version = grid.version  # Phiên bản lưới mà bitset còn đúng
+        self.stale = bytearray(grid.size)  # 1 = bitset của ô này có thể đã cũ
+        self.all_stale = False
+
+    def refresh(self):
+        grid = self.grid
+        if self.version == grid.version or self.all_stale:
+            return
+        changed = grid.changes_since(self.version)
+        if changed is None:
+            self.all_stale = True
+            return
+        radius = self.radius
+        for index in changed:
+            x, y = grid.tile(index)
+            for row in range(max(0, y - radius), min(grid.height, y + radius + 1)):
+                start = row * grid.width
+                for col in range(max(0, x - radius), min(grid.width, x + radius + 1)):
+                    self.stale[start + col] = 1
+        self.version = grid.version
+
+    def can_see(self, start, end):
+        """True/False theo bitset của ô chứa start, hoặc None nếu bitset không dùng được cho cặp điểm này."""
+        grid = self.grid
+        tilesize = grid.tilesize
+        start_x, start_y = int(start[0] // tilesize), int(start[1] // tilesize)
+        offset_x = int(end[0] // tilesize) - start_x
+        offset_y = int(end[1] // tilesize) - start_y
+        radius = self.radius
+        if not (-radius <= offset_x <= radius and -radius <= offset_y <= radius):
+            return None
+        if not (0 <= start_x < grid.width and 0 <= start_y < grid.height):
+            return None
+        index = start_y * grid.width + start_x
+        if self.version != grid.version:
+            self.refresh()
+        if self.all_stale or self.stale[index]:
+            return None
+        bit = (offset_y + radius) * self.window + offset_x + radius
+        return bool(self.data[PVS_HEADER.size + index * self.row_bytes + (bit >> 3)] & (1 << (bit & 7)))
+
+
+def build_pvs(grid, radius=PVS_RADIUS):
+    """Tính bitset cho mọi ô đi được (ô bị chặn chỉ thấy chính nó, giống has_line_of_sight). Trả về bytes của file."""
+    tilesize = grid.tilesize
+    window = 2 * radius + 1
+    row_bytes = (window * window + 7) // 8
+    offsets = [(dx, dy) for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1)]
+    self_bit = radius * window + radius
+    data = bytearray(PVS_HEADER.pack(PVS_MAGIC, grid.width, grid.height, tilesize, radius, grid_checksum(grid)))
+    data.extend(bytes(grid.size * row_bytes))
+    for index in range(grid.size):
+        row_start = PVS_HEADER.size + index * row_bytes
+        data[row_start + (self_bit >> 3)] |= 1 << (self_bit & 7)
+        if grid.blocked[index]:
+            continue
+        x, y = grid.tile(index)
+        center = (x * tilesize + tilesize // 2, y * tilesize + tilesize // 2)
+        bits = [bit for bit, (dx, dy) in enumerate(offsets) if grid.in_bounds((x + dx, y + dy))]
+        targets = [(center[0] + offsets[bit][0] * tilesize, center[1] + offsets[bit][1] * tilesize) for bit in bits]
+        for bit, visible in zip(bits, lines_of_sight(grid, center, targets)):
+            if visible:
+                data[row_start + (bit >> 3)] |= 1 << (bit & 7)
+    return bytes(data)
+
+
+def load_pvs(grid, path=PVS_FILE, radius=PVS_RADIUS, build_if_missing=True):
+    """
+    Mở file PVS bằng mmap nếu nó khớp với lưới (kích thước, bán kính, checksum ô đi được).
+    Nếu thiếu hoặc đã cũ (bản đồ bị sửa) thì tính lại, ghi đè file (tạo thư mục nếu cần) và dùng bản trong bộ nhớ.
+    """
+    expected = (PVS_MAGIC, grid.width, grid.height, grid.tilesize, radius, grid_checksum(grid))
+    if os.path.exists(path) and os.path.getsize(path) >= PVS_HEADER.size:
+        with open(path, 'rb') as pvs_file:
+            data = mmap.mmap(pvs_file.fileno(), 0, access=mmap.ACCESS_READ)
+        row_bytes = ((2 * radius + 1) ** 2 + 7) // 8
+        if PVS_HEADER.unpack_from(data) == expected and len(data) == PVS_HEADER.size + grid.size * row_bytes:
+            return PotentiallyVisibleSet(grid, data, radius)
+        data.close()  # Đóng trước khi ghi đè file
+    if not build_if_missing:
+        return None
+    print(f"PVS: {path} thiếu hoặc không khớp bản đồ, đang tính lại...")
+    data = build_pvs(grid, radius)
+    try:
+        save_pvs(data, path)
+    except OSError as error:
+        print(f"PVS: không ghi được {path}: {error}")
+    return PotentiallyVisibleSet(grid, data, radius)
+
+
+def save_pvs(data, path=PVS_FILE):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as pvs_file:
+        pvs_file.write(data)
+
+
+def main():
+    from pathfinding_benchmark import load_nav_grid
+    grid = load_nav_grid()
+    started = time.perf_counter()
+    data = build_pvs(grid)
+    save_pvs(data)
+    print(f"Đã ghi {PVS_FILE}: {len(data)} byte, bán kính {PVS_RADIUS} ô, "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
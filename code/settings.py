@@ -39,11 +39,60 @@ DEFAULT_PARTIAL_OBSERVABILITY_ENABLED = True # Trạng thái bật/tắt PO mặ
 # (Các giá trị này sẽ được dùng trong npc_data nếu NPC cụ thể không có override)
 DEFAULT_SIGHT_RADIUS = TILESIZE * 8
 DEFAULT_SIGHT_ANGLE = 120  # Góc nhìn (độ), ví dụ 120 độ. Dùng None nếu chỉ muốn hình tròn.
+DEFAULT_AWARENESS_RADIUS = TILESIZE * 3  # Trong bán kính này NPC nhận ra mục tiêu ở mọi hướng (không xét góc nhìn)
 DEFAULT_LKP_MAX_AGE = 10000  # Thời gian LKP còn hợp lệ (milliseconds)
 VERY_LARGE_RADIUS = TILESIZE * 100
 
 # --- ENEMY AGGRESSION MODE SETTING --- # MỚI
 ENEMY_AGGRESSION_MODE_ENABLED = False # Mặc định là tắt
+# Ở chế độ hung hãn mọi quái cùng đuổi người chơi, nên chúng đi theo flow field dùng chung của Level thay vì mỗi con
+# tự tìm đường. Ở chế độ thường mỗi loại quái vẫn dùng thuật toán riêng (BFS/UCS/JPS, qua PathService nếu có)
+ENEMY_FLOW_FIELD_ENABLED = True
+# Các loại quái vẫn tự tìm đường bằng thuật toán riêng cả ở chế độ hung hãn (hiện không có loại nào)
+ENEMY_FLOW_FIELD_EXCEPTIONS = ()
+# Giữ vị trí/trạng thái mọi quái trong mảng NumPy: tách bầy, kiểm tra kẹt và di chuyển tính cho cả đàn
+# (cần cài numpy; không có thì tự tắt và quái tự tính từng con)
+ENEMY_BATCH_ENABLED = True
+# Chỉ tính theo lô khi màn có ít nhất chừng này quái lúc tải; đàn nhỏ hơn thì tính từng con nhanh hơn
+ENEMY_BATCH_MIN_ENEMIES = 80
+# Số đường đi tối đa giữ trong bộ đệm LRU đặt trước các thuật toán trong PATHFINDING_ALGORITHMS (0 = tắt)
+PATH_CACHE_SIZE = 512
+# Kích thước cụm (số ô mỗi cạnh) của đồ thị HPA*
+HPA_CLUSTER_SIZE = 10
+# Ngân sách cho Backtracking / Forward Checking: quá số nút hoặc số ms này thì trả về đoạn đường đi tốt nhất đã gặp
+BACKTRACKING_NODE_BUDGET = 20000
+BACKTRACKING_TIME_BUDGET_MS = 8
+# Số nút mỗi job tìm đường (PathJob) được mở rộng trong một frame trước khi nhường cho frame sau
+PATHFINDING_NODE_BUDGET_PER_TICK = 300
+# Thuật toán tìm đường mặc định của NPC (tên trong PATHFINDING_ALGORITHMS). JPS: đường tối ưu, không thất bại cặp nào
+# và nhanh nhất trong các thuật toán như vậy theo pathfinding_benchmark.py --pairs 10 (Forward Checking BS thất bại 53%)
+DEFAULT_NPC_ALGORITHM = 'JPS'
+# Tìm đường trên các tiến trình con (PathService); tắt thì mọi lần tìm chạy trên luồng chính như cũ
+PATH_SERVICE_ENABLED = True
+# Số tiến trình con của PathService (0 = số lõi CPU - 1)
+PATH_SERVICE_WORKERS = 0
+# Số giây tối đa chờ các tiến trình con khởi động lúc tải màn (PathService.warm_up)
+PATH_SERVICE_WARM_UP_TIMEOUT = 10
+# Số lần tìm đường gần nhất được giữ cho mỗi (loại thực thể, thuật toán) trong bảng thống kê (phím F3)
+PATHFINDING_PROFILER_WINDOW = 240
+# Cạnh ô lưới (pixel) của chỉ mục băm không gian cho vật cản (SpatialHashGroup)
+SPATIAL_HASH_CELL_SIZE = TILESIZE * 2
+# Khoảng nới thêm (pixel) khi tra lưới quái dựng đầu frame, bù cho quãng quái đã đi kể từ lúc dựng
+SPATIAL_GRID_PADDING = TILESIZE // 4
+# Bề rộng (pixel) mỗi khối cột khi xếp sẵn tile tĩnh theo hàng để vẽ (YSortCameraGroup)
+RENDER_BUCKET_WIDTH = TILESIZE * 4
+# Cạnh (pixel) của mỗi mảnh nền: sàn và vật tĩnh không che ai được gộp sẵn vào các mảnh này, mỗi frame chỉ vẽ mảnh trong màn hình
+FLOOR_CHUNK_SIZE = 512
+# Từ số mục tiêu này trở lên, kiểm tra tầm nhìn của một NPC tới nhiều mục tiêu được tính cùng lúc bằng NumPy (nếu có)
+LOS_BATCH_MIN_TARGETS = 64
+# Bảng tầm nhìn giữa các ô tính sẵn (pvs.py): bước kiểm tra đầu tiên khi NPC xét có thấy mục tiêu hay không (tắt bảng thì
+# dùng trường nhìn / duyệt tia như dưới). Tính lần đầu khi tải màn chơi rồi lưu cạnh các file CSV của bản đồ
+# (không nằm trong git vì là file sinh ra), lần sau đọc bằng mmap
+PVS_ENABLED = True
+PVS_FILE = '../map/map_PVS.bin'
+# Với mục tiêu bảng PVS không trả lời được: bật thì dùng trường nhìn theo ô (shadowcasting, theo góc nhìn) tính một lần
+# mỗi khi NPC đổi ô/hướng rồi tra tập; tắt thì duyệt tia tới từng mục tiêu
+NPC_FOV_ENABLED = True
 
 # weapons
 weapon_data = {
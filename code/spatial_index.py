@@ -0,0 +1,194 @@
+# spatial_index.py
+# Băm không gian theo lưới đều (uniform grid): mỗi ô lưới giữ các sprite có hitbox phủ lên nó (vật cản)
+# hoặc có tâm nằm trong nó (quái), để chỉ xét vài ô lân cận thay vì duyệt toàn bộ nhóm sprite.
+import itertools
+
+import pygame
+
+from settings import SPATIAL_HASH_CELL_SIZE, SPATIAL_GRID_PADDING
+
+
+class SpatialHashGroup(pygame.sprite.Group):
+    """
+    pygame.sprite.Group có thêm chỉ mục băm không gian theo hitbox, dùng cho các vật cản đứng yên.
+    Sprite mới thêm được đánh chỉ mục ở lần query() kế tiếp (Tile chỉ có hitbox sau khi đã vào nhóm),
+    và tự bị gỡ khi kill()/remove(), nên không cần dựng lại. Hitbox không được đổi sau khi đã đánh chỉ mục.
+    Sprite không có hitbox vẫn ở trong nhóm nhưng không bao giờ được query() trả về.
+    """
+
+    def __init__(self, *sprites, cell_size=SPATIAL_HASH_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cột, hàng) -> danh sách sprite
+        self.sprite_cells = {}  # sprite -> các ô lưới đang chứa nó
+        self.order = {}  # sprite -> thứ tự thêm vào, để query() trả về theo đúng thứ tự duyệt nhóm
+        self.insert_counter = itertools.count()
+        self.unindexed = []  # Sprite đã vào nhóm nhưng chưa được đưa vào các ô lưới
+        self.version = 0  # Tăng mỗi khi có sprite vào/ra nhóm, để nơi khác biết lúc nào phải dựng lại dữ liệu suy ra
+        super().__init__(*sprites)
+
+    def cell_range(self, rect):
+        """Các ô lưới (cột, hàng) mà một hình chữ nhật (pixel) phủ lên."""
+        size = self.cell_size
+        cols = range(rect.left // size, (rect.right - 1) // size + 1)
+        rows = range(rect.top // size, (rect.bottom - 1) // size + 1)
+        return [(col, row) for row in rows for col in cols]
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        if sprite not in self.order:
+            self.order[sprite] = next(self.insert_counter)
+            self.unindexed.append(sprite)
+            self.version += 1
+
+    def _index_pending(self):
+        for sprite in self.unindexed:
+            hitbox = getattr(sprite, 'hitbox', None)
+            if hitbox is None or sprite not in self.order or sprite in self.sprite_cells:  # Không có hitbox, đã bị gỡ hoặc đã có chỉ mục
+                continue
+            keys = self.cell_range(hitbox)
+            for key in keys:
+                self.cells.setdefault(key, []).append(sprite)
+            self.sprite_cells[sprite] = keys
+        self.unindexed.clear()
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if self.order.pop(sprite, None) is not None:
+            self.version += 1
+        keys = self.sprite_cells.pop(sprite, None)
+        if keys is None:
+            return
+        for key in keys:
+            bucket = self.cells[key]
+            bucket.remove(sprite)
+            if not bucket:
+                del self.cells[key]
+
+    def query(self, rect):
+        """Các sprite có hitbox nằm trong những ô lưới mà rect phủ lên (chưa kiểm tra va chạm thật)."""
+        if self.unindexed:
+            self._index_pending()
+        cells = self.cells
+        found = set()
+        for key in self.cell_range(rect):
+            bucket = cells.get(key)
+            if bucket:
+                found.update(bucket)
+        return sorted(found, key=self.order.__getitem__)
+
+
+class SpatialGrid:
+    """
+    Lưới băm cho các sprite di chuyển (quái): dựng lại mỗi frame từ tâm hitbox bằng rebuild(), chi phí O(n).
+    Sprite vẫn di chuyển sau khi dựng nên query_radius() nới bán kính thêm padding; người gọi vẫn phải tự
+    kiểm tra khoảng cách thật bằng vị trí hiện tại. nearest() thì tự tính bằng vị trí hiện tại.
+    Duyệt trực tiếp (for sprite in grid) cho tất cả sprite đã dựng; get(id(sprite)) tra sprite theo id.
+    """
+
+    def __init__(self, cell_size=SPATIAL_HASH_CELL_SIZE, padding=SPATIAL_GRID_PADDING):
+        self.cell_size = cell_size
+        self.padding = padding
+        self.cells = {}  # (cột, hàng) -> danh sách sprite
+        self.sprites = []
+        self.order = {}  # sprite -> vị trí trong danh sách lúc dựng (để kết quả hoà nhau theo đúng thứ tự danh sách)
+        self.by_id = {}  # id(sprite) -> sprite
+        self.bounds = None  # (cột nhỏ nhất, hàng nhỏ nhất, cột lớn nhất, hàng lớn nhất) của các ô có sprite
+
+    def rebuild(self, sprites):
+        size = self.cell_size
+        cells = {}
+        self.sprites = list(sprites)
+        for sprite in self.sprites:
+            x, y = sprite.hitbox.center
+            key = (x // size, y // size)
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [sprite]
+            else:
+                bucket.append(sprite)
+        self.cells = cells
+        self.order = {sprite: index for index, sprite in enumerate(self.sprites)}
+        self.by_id = {id(sprite): sprite for sprite in self.sprites}
+        if cells:
+            cols = [col for col, _ in cells]
+            rows = [row for _, row in cells]
+            self.bounds = (min(cols), min(rows), max(cols), max(rows))
+        else:
+            self.bounds = None
+
+    def get(self, sprite_id):
+        return self.by_id.get(sprite_id)
+
+    def __iter__(self):
+        return iter(self.sprites)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def query_radius(self, center, radius):
+        """Các sprite có tâm (lúc dựng) nằm trong những ô lưới giao với hình vuông bao quanh vòng tròn."""
+        size = self.cell_size
+        reach = radius + self.padding
+        x, y = center
+        cells = self.cells
+        for row in range(int((y - reach) // size), int((y + reach) // size) + 1):
+            for col in range(int((x - reach) // size), int((x + reach) // size) + 1):
+                bucket = cells.get((col, row))
+                if bucket:
+                    yield from bucket
+
+    def query_rect(self, rect):
+        """Các sprite có tâm (lúc dựng) nằm trong những ô lưới giao với rect nới thêm padding."""
+        size = self.cell_size
+        padding = self.padding
+        cells = self.cells
+        for row in range((rect.top - padding) // size, (rect.bottom + padding) // size + 1):
+            for col in range((rect.left - padding) // size, (rect.right + padding) // size + 1):
+                bucket = cells.get((col, row))
+                if bucket:
+                    yield from bucket
+
+    def nearest(self, point, k=1, predicate=None):
+        """
+        Tối đa k sprite gần point nhất (theo tâm hitbox hiện tại), gần trước xa sau, chỉ lấy sprite thoả predicate.
+        Xét các vòng ô lưới từ ô chứa point ra ngoài và dừng khi vòng kế tiếp chắc chắn xa hơn sprite thứ k.
+        """
+        if not self.cells or k <= 0:
+            return []
+        size = self.cell_size
+        x, y = point
+        col, row = int(x // size), int(y // size)
+        min_col, min_row, max_col, max_row = self.bounds
+        last_ring = max(abs(col - min_col), abs(col - max_col), abs(row - min_row), abs(row - max_row))
+        cells = self.cells
+        order = self.order
+        found = []  # (khoảng cách bình phương, thứ tự trong danh sách, sprite)
+        for ring in range(last_ring + 1):
+            if (2 * ring + 1) ** 2 > len(self.sprites):
+                # Lưới thưa: duyệt thẳng danh sách rẻ hơn đi tiếp qua các vòng ô trống
+                found = []
+                for sprite in self.sprites:
+                    if predicate is None or predicate(sprite):
+                        sprite_x, sprite_y = sprite.hitbox.center
+                        found.append(((sprite_x - x) ** 2 + (sprite_y - y) ** 2, order[sprite], sprite))
+                break
+            for d_row in range(-ring, ring + 1):
+                d_cols = range(-ring, ring + 1) if abs(d_row) == ring else (-ring, ring)
+                for d_col in d_cols:
+                    bucket = cells.get((col + d_col, row + d_row))
+                    if not bucket:
+                        continue
+                    for sprite in bucket:
+                        if predicate is not None and not predicate(sprite):
+                            continue
+                        sprite_x, sprite_y = sprite.hitbox.center
+                        found.append(((sprite_x - x) ** 2 + (sprite_y - y) ** 2, order[sprite], sprite))
+            if len(found) >= k:
+                found.sort(key=lambda item: item[:2])
+                del found[k:]
+                # Mọi sprite ở các vòng sau cách point ít nhất ring * size (trừ quãng đã đi kể từ lúc dựng)
+                next_ring_distance = ring * size - self.padding
+                if next_ring_distance > 0 and next_ring_distance ** 2 > found[-1][0]:
+                    break
+        found.sort(key=lambda item: item[:2])
+        return [sprite for _, _, sprite in found[:k]]
@@ -10,13 +10,16 @@ def import_csv_layout(path):
 			terrain_map.append(list(row))
 		return terrain_map
 
-def import_folder(path):
+def import_folder(path, convert=True):
+	# convert=False: không gọi convert_alpha(), dùng khi chưa có cửa sổ (công cụ chạy headless)
 	surface_list = []
 
 	for _,__,img_files in walk(path):
 		for image in img_files:
 			full_path = path + '/' + image
-			image_surf = pygame.image.load(full_path).convert_alpha()
+			image_surf = pygame.image.load(full_path)
+			if convert:
+				image_surf = image_surf.convert_alpha()
 			surface_list.append(image_surf)
 
 	return surface_list
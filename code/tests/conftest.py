@@ -0,0 +1,21 @@
+# conftest.py
+# Các module của game được import theo tên từ thư mục code/ (giống khi chạy main.py từ đó).
+import os
+import sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CODE_DIR not in sys.path:
+    sys.path.insert(0, CODE_DIR)
+
+import pytest
+
+from nav_grid import NavGrid
+
+
+@pytest.fixture
+def grid():
+    """Lưới 30x30 có một bức tường dọc ở cột 15, chừa lối đi ở hàng 28."""
+    nav_grid = NavGrid(30, 30)
+    for y in range(28):
+        nav_grid.add_blocker((15, y))
+    return nav_grid
@@ -0,0 +1,123 @@
+import random
+from collections import deque
+
+import pygame
+import pytest
+from pygame.math import Vector2
+
+pytest.importorskip('numpy')
+
+from enemy import Enemy
+from enemy_batch import EnemyBatch
+from entity import Entity
+from settings import TILESIZE
+from spatial_index import SpatialHashGroup
+from tile import Tile
+
+
+class Walker(Entity):
+    """Quái tối giản: đủ thuộc tính mà EnemyBatch và Enemy.apply_steering đọc."""
+
+    def __init__(self, pos, direction, obstacle_sprites, monster_name='squid', size=(48, 48)):
+        self.obstacle_sprites = obstacle_sprites
+        super().__init__(())
+        self.hitbox = pygame.Rect(pos, size)
+        self.rect = self.hitbox.copy()
+        self.direction = Vector2(direction)
+        self.monster_name = monster_name
+        self.status = 'move'
+        self.speed = 3
+        self.resistance = 3
+        self.health = 10
+        self.vulnerable = True
+        self.is_stuck = False
+        self.path = deque()
+        self.next_step = (0, 0)
+        self.recalculation_needed = False
+        self.last_path_time = 0
+        self.last_stuck_check_time = 0
+        self.stuck_check_interval = 300
+        self.last_pos_stuck_check = None
+        self.stuck_move_threshold_sq = (self.speed * 0.2) ** 2
+        self.apply_separation = True
+        self.separation_strength = 0.8
+
+
+@pytest.fixture
+def obstacles():
+    """Khung tường bao quanh vùng 12x12 ô, thêm một cột đá ở giữa."""
+    group = SpatialHashGroup()
+    for i in range(12):
+        for tile in ((i, 0), (i, 11), (0, i), (11, i)):
+            Tile((tile[0] * TILESIZE, tile[1] * TILESIZE), [group], 'invisible')
+    for y in range(4, 8):
+        Tile((6 * TILESIZE, y * TILESIZE), [group], 'invisible')
+    return group
+
+
+def make_walkers(obstacles, count, seed):
+    rng = random.Random(seed)
+    walkers = []
+    for _ in range(count):
+        pos = (rng.randrange(TILESIZE - 20, 11 * TILESIZE - 30), rng.randrange(TILESIZE - 20, 11 * TILESIZE - 30))
+        walkers.append(Walker(pos, (rng.uniform(-1, 1), rng.uniform(-1, 1)), obstacles))
+    return walkers
+
+
+def test_batched_movement_matches_entity_move(obstacles):
+    batch = EnemyBatch(enabled=True)
+    batched = make_walkers(obstacles, 60, seed=3)
+    plain = make_walkers(obstacles, 60, seed=3)
+    for walker in batched:
+        walker.add(batch)
+    batch.sync_obstacles(obstacles)
+    collisions = 0
+    for _ in range(40):
+        batch.move(obstacles, 0)
+        for walker in plain:
+            start = walker.hitbox.copy()
+            Enemy.check_stuck_and_move(walker)  # Đường đi từng con của Enemy.update
+            if walker.direction.length_squared() > 0:
+                collisions += walker.hitbox != start.move(walker.direction * walker.speed)
+        for walker, expected in zip(batched, plain):
+            assert walker.hitbox == expected.hitbox
+            assert walker.rect.center == expected.rect.center
+            assert (walker.direction.x, walker.direction.y) == (expected.direction.x, expected.direction.y)
+            assert tuple(batch.positions[batch.rows[walker]]) == walker.hitbox.topleft
+    assert collisions  # Có quái phải đi qua Entity.move để xử lý va chạm, không chỉ dời thẳng trong mảng
+
+
+def test_steer_matches_enemy_update_blend(obstacles):
+    batch = EnemyBatch(enabled=True)
+    walkers = make_walkers(obstacles, 20, seed=7)
+    for i, walker in enumerate(walkers):
+        walker.hitbox.topleft = (200 + i % 5 * 30, 200 + i // 5 * 30)  # Đứng sát nhau để có lực tách bầy
+        walker.monster_name = 'squid' if i % 3 else 'bamboo'
+        walker.add(batch)
+    walkers[0].direction = Vector2()  # Không có hướng: đi theo lực tách bầy
+    batch.record(walkers[0])
+    batch.steer()
+    for walker in walkers:
+        steering = Enemy.apply_steering(walker, walkers)
+        expected = walker.direction.copy()
+        if walker.direction.length_squared() > 0:
+            expected = (walker.direction.normalize() * 0.7 + steering * 0.3).normalize()
+        elif steering.length_squared() > 0:
+            expected = steering.normalize()
+        assert Vector2(batch.directions[batch.rows[walker]].tolist()).distance_to(expected) < 1e-9
+
+
+def test_rows_persist_and_are_reused(obstacles):
+    batch = EnemyBatch(enabled=True, capacity=2)
+    walkers = make_walkers(obstacles, 3, seed=1)
+    for walker in walkers:
+        walker.add(batch)
+    assert batch.capacity == 4 and sorted(batch.rows.values()) == [0, 1, 2]
+    row = batch.rows[walkers[1]]
+    walkers[1].kill()
+    assert not batch.handles(walkers[1]) and not batch.used[row]
+    newcomer = make_walkers(obstacles, 1, seed=2)[0]
+    newcomer.add(batch)
+    assert batch.rows[newcomer] == row
+    assert tuple(batch.positions[row]) == newcomer.hitbox.topleft
+    assert tuple(batch.positions[batch.rows[walkers[2]]]) == walkers[2].hitbox.topleft
@@ -0,0 +1,66 @@
+import pytest
+
+from path_jobs import PathJob
+from pathfinding_algorithms import PATHFINDING_ALGORITHMS, UNCACHED_ALGORITHMS, PATH_CACHE, SearchStats, \
+    heuristic_diagonal
+
+
+def test_job_result_is_cache_hit_for_matching_sync_call(grid):
+    PATH_CACHE.clear()
+    for algo_name in ('BFS', 'UCS', 'A*', 'UCS (Array)', 'JPS', 'HPA*'):
+        job = PathJob(algo_name, (2, 2), (27, 3), grid, heuristic_diagonal)
+        while not job.advance():
+            pass
+        stats = SearchStats()
+        path = PATHFINDING_ALGORITHMS[algo_name]((2, 2), (27, 3), grid, stats=stats)
+        assert stats.cache_hits == 1, algo_name
+        assert stats.searches == 0, algo_name
+        assert list(path) == list(job.result)
+
+
+def test_sync_call_is_cache_hit_for_matching_job(grid):
+    PATH_CACHE.clear()
+    PATHFINDING_ALGORITHMS['A*']((2, 2), (27, 3), grid, heuristic_diagonal)
+    job = PathJob('A*', (2, 2), (27, 3), grid, heuristic_diagonal)
+    assert job.done
+    assert job.stats.cache_hits == 1
+
+
+def test_cache_key_ignores_how_arguments_are_passed(grid):
+    cache_key = PATHFINDING_ALGORITHMS['A*'].cache_key
+    positional = cache_key((1, 1), (5, 5), grid, heuristic_diagonal)
+    keyword = cache_key((1, 1), (5, 5), grid, heuristic_func=heuristic_diagonal, stats=SearchStats())
+    default = cache_key((1, 1), (5, 5), grid)
+    assert positional == keyword == default
+
+
+@pytest.mark.parametrize('algo_name', ['A* (Array)', 'UCS (Array)', 'JPS', 'BFS', 'MinConflicts Repair (BFS)'])
+def test_job_spreads_over_several_frames_within_node_budget(grid, algo_name):
+    PATH_CACHE.clear()
+    node_budget = 5
+    job = PathJob(algo_name, (2, 2), (27, 3), grid, heuristic_diagonal)
+    per_tick = []
+    while True:
+        expansions_before = job.expansions
+        done = job.advance(node_budget)
+        per_tick.append(job.expansions - expansions_before)
+        if done:
+            break
+    assert len(per_tick) > 1
+    # Một bước gộp nhiều nút (lớp BFS bitboard) chỉ được vượt ngân sách ở chính bước đó
+    single_node_steps = algo_name not in ('BFS', 'MinConflicts Repair (BFS)')
+    if single_node_steps:
+        assert max(per_tick) <= node_budget
+    reference = UNCACHED_ALGORITHMS[algo_name]((2, 2), (27, 3), grid)
+    assert list(job.result) == list(reference)
+
+
+def test_interleaved_array_jobs_do_not_share_search_buffers(grid):
+    PATH_CACHE.clear()
+    pairs = [((2, 2), (27, 3)), ((27, 27), (1, 20)), ((5, 25), (20, 2))]
+    jobs = [PathJob('A* (Array)', start, goal, grid, heuristic_diagonal) for start, goal in pairs]
+    while not all(job.done for job in jobs):
+        for job in jobs:
+            job.advance(3)
+    for job, (start, goal) in zip(jobs, pairs):
+        assert list(job.result) == list(UNCACHED_ALGORITHMS['A* (Array)'](start, goal, grid))
@@ -0,0 +1,33 @@
+import time
+
+import pytest
+
+from path_service import PathService
+from pathfinding_algorithms import PATH_CACHE
+
+
+def wait_for(service, request, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not request.done:
+        assert time.monotonic() < deadline, 'PathService không trả kết quả'
+        service.poll()
+        time.sleep(0.005)
+    return request.result
+
+
+@pytest.mark.parametrize('enabled', [True, False], ids=['process_pool', 'main_thread'])
+def test_repeated_request_is_cache_hit_in_main_process(grid, enabled):
+    PATH_CACHE.clear()
+    service = PathService(grid, workers=1, enabled=enabled)
+    try:
+        hits_before = PATH_CACHE.hits
+        first = service.request('JPS', (2, 2), (27, 3))
+        first_path = wait_for(service, first)
+        assert first_path and first.stats.cache_hits == 0
+        second = service.request('JPS', (2, 2), (27, 3))
+        assert second.done  # Trúng bộ đệm: trả lời ngay, không gửi sang tiến trình con
+        assert second.stats.cache_hits == 1
+        assert PATH_CACHE.hits == hits_before + 1
+        assert list(second.result) == list(first_path)
+    finally:
+        service.shutdown()
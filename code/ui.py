@@ -1,7 +1,7 @@
 import pygame
 from settings import *
 from pathfinding_algorithms import ALGORITHM_NAMES, \
-    PATHFINDING_ALGORITHMS
+    PATHFINDING_ALGORITHMS, PATH_CACHE
 from npc import NPC  # Cần thiết nếu UI tương tác trực tiếp với kiểu NPC
 
 
@@ -190,6 +190,37 @@ class UI:
             self.show_algo_menu = True
             self.show_algo_menu_due_to_error = False  # Reset cờ sau khi mở menu
 
+    def display_pathfinding_profiler(self, profiler, max_rows_per_group=6):
+        """Bảng bán trong suốt: thời gian tìm đường p50/p95/max (ms) theo loại thực thể và theo thuật toán."""
+        lines = [("Pathfinding (F3)    n     p50     p95     max   nodes   open", UI_BORDER_COLOR_ACTIVE)]
+        for title, group_by in (("Theo thuc the", 'entity'), ("Theo thuat toan", 'algorithm')):
+            lines.append((title, UI_BORDER_COLOR_ACTIVE))
+            rows = profiler.rows(group_by)
+            if not rows:
+                lines.append(("  (chua co lan tim nao)", TEXT_COLOR))
+            for row in rows[:max_rows_per_group]:
+                lines.append((f"  {row['name'][:16]:<16}{row['count']:>4}{row['p50']:>8.2f}{row['p95']:>8.2f}"
+                              f"{row['max']:>8.2f}{row['mean_expansions']:>8.0f}{row['mean_peak_open']:>7.0f}",
+                              TEXT_COLOR))
+        cache = PATH_CACHE.stats()
+        lines.append((f"Cache {cache['entries']} muc  {cache['hits']} hit / {cache['misses']} miss "
+                      f"({cache['hit_rate']:.0%})  {cache['evictions']} evict  {cache['invalidations']} xoa",
+                      UI_BORDER_COLOR_ACTIVE))
+
+        text_surfs = [self.small_font.render(text, False, color) for text, color in lines]
+        padding = 8
+        line_h = self.small_font.get_linesize()
+        panel_w = max(surf.get_width() for surf in text_surfs) + padding * 2
+        panel_h = line_h * len(text_surfs) + padding * 2
+
+        panel = pygame.Surface((panel_w, panel_h), pygame.SRCALPHA)
+        panel.fill((20, 20, 20, 190))
+        for index, surf in enumerate(text_surfs):
+            panel.blit(surf, (padding, padding + index * line_h))
+        panel_rect = panel.get_rect(topleft=(10, self.energy_bar_rect.bottom + 10))
+        self.display_surface.blit(panel, panel_rect)
+        pygame.draw.rect(self.display_surface, UI_BORDER_COLOR, panel_rect, 2)
+
     # --- THÊM PHƯƠNG THỨC HIỂN THỊ THÔNG BÁO CHIẾN THẮNG ---
     def display_victory_notification(self, message_text="Tất cả quái đã bị tiêu diệt!"):
         if self._current_victory_text != message_text or self._victory_message_surf is None:
@@ -317,10 +348,7 @@ class UI:
                             self.selected_algo_index = selected_index
                             for sprite in level_instance_ref.visible_sprites:
                                 if isinstance(sprite, NPC):
-                                    sprite.pathfinding_func = level_instance_ref.selected_npc_algorithm_func
-                                    sprite.recalculation_needed = True
-                                    sprite.path.clear()
-                                    sprite.next_step = None
+                                    sprite.set_pathfinding_algorithm(level_instance_ref.selected_npc_algorithm_name)
                         self.show_algo_menu = False  # Đóng menu sau khi chọn
                         self.show_algo_menu_due_to_error = False
                         if level_instance_ref.active_pathfinding_alert_npc_id is not None:
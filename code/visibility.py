@@ -0,0 +1,201 @@
+# visibility.py
+# Kiểm tra tầm nhìn thẳng (line of sight) trên NavGrid bằng cách duyệt đúng các ô mà đoạn thẳng đi qua
+# (grid traversal kiểu Amanatides-Woo / DDA): chi phí tỉ lệ với số ô đi qua, không phải số pixel.
+# Toạ độ đầu vào là pixel; mọi phép so sánh dùng nhân chéo nên chính xác với toạ độ nguyên (tâm hitbox).
+# Cuối file: trường nhìn (field of view) theo ô bằng symmetric shadowcasting, có giới hạn góc nhìn.
+import math
+
+from settings import LOS_BATCH_MIN_TARGETS
+
+try:
+    import numpy as np
+except ImportError:  # NumPy là phụ thuộc tuỳ chọn
+    np = None
+
+
+def _is_opaque(grid, tile_x, tile_y):
+    """Ô chắn tầm nhìn: có vật cản hoặc nằm ngoài bản đồ (giống NavGrid.is_blocked)."""
+    if 0 <= tile_x < grid.width and 0 <= tile_y < grid.height:
+        return grid.blocked[tile_y * grid.width + tile_x] != 0
+    return True
+
+
+def has_line_of_sight(grid, start, end):
+    """
+    True nếu mọi ô mà đoạn start -> end đi qua đều không bị chặn, trừ ô chứa end (mục tiêu có thể đứng lấn lên vật cản).
+    Khi đoạn thẳng đi đúng qua góc chung của bốn ô thì cả hai ô hai bên góc đều phải trống.
+    """
+    tilesize = grid.tilesize
+    x0, y0 = start
+    x1, y1 = end
+    tile_x, tile_y = int(x0 // tilesize), int(y0 // tilesize)
+    end_x, end_y = int(x1 // tilesize), int(y1 // tilesize)
+    if tile_x == end_x and tile_y == end_y:
+        return True
+    dx, dy = x1 - x0, y1 - y0
+    step_x = 1 if dx >= 0 else -1
+    step_y = 1 if dy >= 0 else -1
+    abs_dx, abs_dy = abs(dx), abs(dy)
+    # Quãng (pixel, theo từng trục) từ start tới biên ô kế tiếp; tia chạm biên x trước nếu next_x / |dx| < next_y / |dy|
+    next_x = (tile_x + 1) * tilesize - x0 if step_x > 0 else x0 - tile_x * tilesize
+    next_y = (tile_y + 1) * tilesize - y0 if step_y > 0 else y0 - tile_y * tilesize
+
+    while tile_x != end_x or tile_y != end_y:
+        if _is_opaque(grid, tile_x, tile_y):
+            return False
+        if tile_x == end_x:  # Trục x đã tới cột đích, chỉ còn bước theo y
+            tile_y += step_y
+            next_y += tilesize
+            continue
+        if tile_y == end_y:
+            tile_x += step_x
+            next_x += tilesize
+            continue
+        cross_x = next_x * abs_dy
+        cross_y = next_y * abs_dx
+        if cross_x < cross_y:
+            tile_x += step_x
+            next_x += tilesize
+        elif cross_y < cross_x:
+            tile_y += step_y
+            next_y += tilesize
+        else:  # Đi đúng qua góc ô
+            if _is_opaque(grid, tile_x + step_x, tile_y) or _is_opaque(grid, tile_x, tile_y + step_y):
+                return False
+            tile_x += step_x
+            tile_y += step_y
+            next_x += tilesize
+            next_y += tilesize
+    return True
+
+
+def lines_of_sight(grid, start, ends):
+    """
+    has_line_of_sight cho một người quan sát và nhiều mục tiêu, trả về list bool cùng thứ tự với ends.
+    Từ LOS_BATCH_MIN_TARGETS mục tiêu trở lên (và có NumPy) mọi tia được xét cùng lúc bằng phép toán mảng, không có
+    vòng lặp theo từng bước: mỗi lần tia cắt biên cột thứ k, hàng hiện tại bằng số lần đã cắt biên hàng trước đó
+    (đếm được bằng một phép chia), và ngược lại. Số phép toán mảng không phụ thuộc số mục tiêu hay độ dài tia.
+    """
+    ends = list(ends)
+    if np is None or len(ends) < LOS_BATCH_MIN_TARGETS:
+        return [has_line_of_sight(grid, start, end) for end in ends]
+
+    tilesize = grid.tilesize
+    width, height = grid.width, grid.height
+    x0, y0 = start
+    start_x, start_y = int(x0 // tilesize), int(y0 // tilesize)
+    end_points = np.asarray(ends, dtype=np.float64)  # float64 vẫn chính xác với toạ độ nguyên
+    end_x = np.floor_divide(end_points[:, 0], tilesize).astype(np.int64)
+    end_y = np.floor_divide(end_points[:, 1], tilesize).astype(np.int64)
+    dx, dy = end_points[:, 0] - x0, end_points[:, 1] - y0
+    step_x = np.where(dx >= 0, 1, -1)
+    step_y = np.where(dy >= 0, 1, -1)
+    abs_dx, abs_dy = np.abs(dx), np.abs(dy)
+    next_x = np.where(step_x > 0, (start_x + 1) * tilesize - x0, x0 - start_x * tilesize)
+    next_y = np.where(step_y > 0, (start_y + 1) * tilesize - y0, y0 - start_y * tilesize)
+    count_x = np.abs(end_x - start_x)  # Số lần cắt biên cột trước khi tới ô đích
+    count_y = np.abs(end_y - start_y)
+
+    def crossings(counts, next_main, abs_main, abs_other, next_other, count_other):
+        """
+        Mỗi lần cắt biên theo một trục: (tia, số thứ tự k, số lần cắt biên trục kia xảy ra trước, ... không muộn hơn).
+        Hai số đếm chỉ khác nhau khi tia đi đúng qua góc ô, lúc đó ô bên cạnh góc và ô chéo đều được xét.
+        """
+        rays = np.repeat(np.arange(len(counts)), counts)
+        k = np.arange(len(rays)) - np.repeat(np.cumsum(counts) - counts, counts)
+        # Biên thứ j của trục kia bị cắt trước biên thứ k của trục này khi (next_other + j*T) * |d_main| < (next_main + k*T) * |d_other|
+        ratio = ((next_main[rays] + k * tilesize) * abs_other[rays] - next_other[rays] * abs_main[rays]) / \
+                (tilesize * abs_main[rays])
+        before = np.clip(np.ceil(ratio), 0, count_other[rays]).astype(np.int64)
+        not_after = np.clip(np.floor(ratio) + 1, 0, count_other[rays]).astype(np.int64)
+        return rays, k, before, not_after
+
+    rays_x, k_x, before_x, not_after_x = crossings(count_x, next_x, abs_dx, abs_dy, next_y, count_y)
+    rays_y, k_y, before_y, not_after_y = crossings(count_y, next_y, abs_dy, abs_dx, next_x, count_x)
+    moving = np.flatnonzero((count_x > 0) | (count_y > 0))
+    column_x = start_x + step_x[rays_x] * (k_x + 1)
+    row_y = start_y + step_y[rays_y] * (k_y + 1)
+    rays = np.concatenate((moving, rays_x, rays_x, rays_y, rays_y))
+    tiles_x = np.concatenate((np.full(len(moving), start_x), column_x, column_x,
+                              start_x + step_x[rays_y] * before_y, start_x + step_x[rays_y] * not_after_y))
+    tiles_y = np.concatenate((np.full(len(moving), start_y),
+                              start_y + step_y[rays_x] * before_x, start_y + step_y[rays_x] * not_after_x, row_y, row_y))
+
+    # Ô chứa mục tiêu không chắn; ô ngoài bản đồ luôn chắn
+    checked = (tiles_x != end_x[rays]) | (tiles_y != end_y[rays])
+    rays, tiles_x, tiles_y = rays[checked], tiles_x[checked], tiles_y[checked]
+    inside = (tiles_x >= 0) & (tiles_x < width) & (tiles_y >= 0) & (tiles_y < height)
+    opaque = ~inside
+    blocked = np.frombuffer(grid.blocked, dtype=np.uint8)  # Dùng chung bộ nhớ với NavGrid, luôn cập nhật
+    opaque[inside] = blocked[tiles_y[inside] * width + tiles_x[inside]] != 0
+    return (np.bincount(rays[opaque], minlength=len(ends)) == 0).tolist()
+
+
+# --- TRƯỜNG NHÌN (SHADOWCASTING) ---
+# Bốn góc phần tư quanh ô gốc: (độ sâu, cột) -> (dx, dy)
+QUADRANT_TRANSFORMS = (
+    lambda depth, col: (col, -depth),  # Bắc
+    lambda depth, col: (depth, col),  # Đông
+    lambda depth, col: (col, depth),  # Nam
+    lambda depth, col: (-depth, col),  # Tây
+)
+QUADRANT_DIRECTIONS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+OCTANT_ANGLE = math.pi / 4
+
+
+def facing_octant(direction):
+    """Hướng nhìn được làm tròn về một trong 8 hướng (0 = phải, tăng theo chiều kim đồng hồ vì trục y hướng xuống)."""
+    return round(math.atan2(direction[1], direction[0]) / OCTANT_ANGLE) % 8
+
+
+def compute_fov(grid, origin, max_depth, octant=None, sight_angle=None, near_depth=0):
+    """
+    Tập ô (x, y) nhìn thấy được từ ô origin bằng symmetric shadowcasting, tới max_depth ô theo mỗi trục.
+    Đối xứng: ô sàn B thấy được từ A khi và chỉ khi A thấy được từ B; ô tường chỉ cần được chiếu sáng một phần.
+    Với octant và sight_angle, ngoài near_depth ô quanh origin chỉ giữ các ô trong hình nón quanh hướng của octant,
+    nới thêm nửa octant mỗi bên để tập này đúng cho mọi hướng nhìn được làm tròn về cùng octant;
+    người gọi tự kiểm tra góc chính xác. Độ dốc là phân số (tử, mẫu) nguyên nên không có sai số làm tròn.
+    """
+    origin_x, origin_y = origin
+    visible = {origin}
+    cone = None
+    if octant is not None and sight_angle is not None and sight_angle < 360:
+        half_angle = math.radians(sight_angle) / 2 + OCTANT_ANGLE / 2
+        if half_angle < math.pi:
+            facing_angle = octant * OCTANT_ANGLE
+            cone = (math.cos(facing_angle), math.sin(facing_angle), math.cos(half_angle), half_angle)
+
+    for transform, (quadrant_x, quadrant_y) in zip(QUADRANT_TRANSFORMS, QUADRANT_DIRECTIONS):
+        # Góc phần tư phủ ±45° quanh hướng của nó; bỏ qua nếu nằm hẳn ngoài hình nón
+        quadrant_depth = max_depth
+        if cone is not None and quadrant_x * cone[0] + quadrant_y * cone[1] < math.cos(cone[3] + math.pi / 4):
+            quadrant_depth = near_depth
+        rows = [(1, -1, 1, 1, 1)]  # (độ sâu, tử/mẫu độ dốc đầu, tử/mẫu độ dốc cuối)
+        while rows:
+            depth, start_num, start_den, end_num, end_den = rows.pop()
+            if depth > quadrant_depth:
+                continue
+            # Cột đầu = round_ties_up(depth * start), cột cuối = round_ties_down(depth * end)
+            min_col = (2 * depth * start_num + start_den) // (2 * start_den)
+            max_col = -((-(2 * depth * end_num - end_den)) // (2 * end_den))
+            previous_wall = None
+            for col in range(min_col, max_col + 1):
+                dx, dy = transform(depth, col)
+                x, y = origin_x + dx, origin_y + dy
+                wall = _is_opaque(grid, x, y)
+                if wall or (col * start_den >= depth * start_num and col * end_den <= depth * end_num):
+                    visible.add((x, y))
+                if previous_wall and not wall:
+                    start_num, start_den = 2 * col - 1, 2 * depth
+                elif previous_wall is False and wall:
+                    rows.append((depth + 1, start_num, start_den, 2 * col - 1, 2 * depth))
+                previous_wall = wall
+            if previous_wall is False:
+                rows.append((depth + 1, start_num, start_den, end_num, end_den))
+
+    if cone is not None:
+        facing_x, facing_y, min_cos, _ = cone
+        visible = {(x, y) for x, y in visible
+                   if max(abs(x - origin_x), abs(y - origin_y)) <= near_depth or
+                   (x - origin_x) * facing_x + (y - origin_y) * facing_y >= min_cos * math.hypot(x - origin_x, y - origin_y)}
+    return frozenset(visible)